@@ -1,16 +1,42 @@
 import io
-import numpy as np
 import pandas as pd
 import streamlit as st
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
+from st_aggrid import AgGrid, GridUpdateMode
 
 
 # ag-grid внутри table_editor/aggrid_config
-from core.cleaning import clean_excel_table
-from core.utils import safe_equals
+from core.cache import (
+    clean_excel_table_cached,
+    load_snapshot_cached,
+    column_hashes_cached,
+    canonical_column_cached,
+    column_profiles_cached,
+    get_ingestion_cache,
+    get_journal,
+)
+from core.column_profile import suggest_mapping, best_mapping
+from core.mapping import NO_MATCH, suggested_option, build_column_change_log
+from core.mapping_profiles import (
+    load_mapping_profile,
+    save_mapping_profile,
+    export_mapping_profiles,
+    import_mapping_profiles,
+)
+from core.snapshots import (
+    list_snapshots,
+    has_snapshot,
+    save_snapshot,
+    apply_retention,
+)
+from core.incremental import IncrementalComparer
+from core.rekey import find_rekeyed_pairs
 from core.undo_redo import (
     init_undo_redo,
-    push_undo_state,
+    undoable,
+    add_checkpoint,
+    clear_history,
+    history_report,
+    journal_synced,
     undo as undo_state,
     redo as redo_state,
 )
@@ -20,8 +46,14 @@ from core.logging import (
     log_delete_row,
     get_logs_df,
 )
-from core.table_editor import render_editable_table
-from core.editing import apply_row_deletions, apply_cell_edits
+from core.pipeline import Pipeline
+from core import copy_stats
+from core.journal import session_key, replay as replay_journal, patch_to_ids
+from core.table_editor import render_editable_table, PAGE_SIZE
+from core.query import TableQuery, CHANGED_COL
+from core.aggrid_config import build_grid_options
+from core.editing import EditOverlay
+from core.merge_compare import OLD_KEY, NEW_KEY
 
 
 # ------------------------------------------------------------
@@ -41,6 +73,15 @@ if "merged_df" not in st.session_state:
 init_logs(st.session_state)
 init_undo_redo(st.session_state)
 
+# таблицы между этапами передаются без копий (copy-on-write);
+# сколько байт всё же скопировано за rerun — в «Этапах обработки»
+copy_stats.enable_copy_on_write()
+copy_stats.reset()
+
+# этапы страницы мемоизируются по токенам входов (core.pipeline):
+# rerun пересчитывает только то, что стоит ниже изменившегося этапа
+pipeline = Pipeline(st.session_state.setdefault("pipeline_cache", {}))
+
 
 # ------------------------------------------------------------
 # ВВОД ДАННЫХ МЕНЕДЖЕРА
@@ -52,25 +93,68 @@ provider_name = "ajman"
 # ------------------------------------------------------------
 # ЗАГРУЗКА ФАЙЛОВ
 # ------------------------------------------------------------
+# старую версию можно взять из локального хранилища снапшотов,
+# чтобы не загружать и не разбирать xlsx заново
+snapshot_listing = list_snapshots(provider_name)
+
+old_source = "file"
+if not snapshot_listing.empty:
+    old_source = st.radio(
+        "Источник старой версии",
+        options=["snapshot", "file"],
+        format_func=lambda x: {
+            "snapshot": "Из хранилища версий",
+            "file": "Загрузить файл",
+        }[x],
+        horizontal=True,
+    )
+
 col1, col2 = st.columns(2)
 with col1:
-    old_file = st.file_uploader("Загрузите старый файл (df_raw_v1)", type=["xlsx"])
+    if old_source == "snapshot":
+        last_version = st.selectbox(
+            "Старая версия (из хранилища)",
+            options=snapshot_listing["version"].tolist(),
+        )
+        old_file = None
+    else:
+        old_file = st.file_uploader("Загрузите старый файл (df_raw_v1)", type=["xlsx"])
+        last_version = old_file.name if old_file else None
 with col2:
     new_file = st.file_uploader("Загрузите новый файл (df_raw_v2)", type=["xlsx"])
 
-if not old_file or not new_file:
+if last_version is None or not new_file:
     st.info("Загрузите оба файла, чтобы продолжить.")
     st.stop()
 
-last_version = old_file.name
 st.success("Файлы загружены! Идёт обработка...")
 
 
 # ------------------------------------------------------------
 # ОЧИСТКА ФАЙЛОВ
 # ------------------------------------------------------------
-df_old = clean_excel_table(old_file)
-df_new = clean_excel_table(new_file)
+# разбор кэшируется по хэшу содержимого: повторные rerun'ы не читают xlsx заново
+if old_file is not None:
+    df_old = pipeline.source("clean_old", lambda: clean_excel_table_cached(old_file))
+else:
+    df_old = pipeline.source(
+        "clean_old", lambda: load_snapshot_cached(provider_name, last_version)
+    )
+df_new = pipeline.source("clean_new", lambda: clean_excel_table_cached(new_file))
+
+# каждая очищенная версия сохраняется в хранилище один раз; другой
+# файл под тем же именем (другое содержимое) перезаписывает снапшот
+saved_versions = False
+uploaded_versions = [(new_file.name, df_new)]
+if old_file is not None:
+    uploaded_versions.insert(0, (last_version, df_old))
+for version_name, df_version in uploaded_versions:
+    source_key = df_version.attrs.get("ingest_key")
+    if not has_snapshot(provider_name, version_name, source_key=source_key):
+        save_snapshot(df_version, provider_name, version_name, overwrite=True)
+        saved_versions = True
+if saved_versions:
+    apply_retention(provider_name, protect=(last_version, new_file.name))
 
 old_cols = list(df_old.columns)
 new_cols = list(df_new.columns)
@@ -79,6 +163,12 @@ st.write("### Очищенные таблицы загружены:")
 st.write(f"Старая таблица: {df_old.shape[0]} строк, {df_old.shape[1]} колонок")
 st.write(f"Новая таблица: {df_new.shape[0]} строк, {df_new.shape[1]} колонок")
 
+cache_stats = get_ingestion_cache().stats()
+st.caption(
+    f"Кэш очистки: {cache_stats['entries']}/{cache_stats['max_entries']} файлов, "
+    f"попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}"
+)
+
 
 # ------------------------------------------------------------
 # СОПОСТАВЛЕНИЕ СТОЛБЦОВ (UI)
@@ -90,14 +180,62 @@ st.markdown(
     "из **новой** таблицы. Если соответствия нет — оставьте «Нет соответствия»."
 )
 
-mapping = {}
-for col in old_cols:
-    choice = st.selectbox(
-        f"Старый столбец: **{col}**",
-        options=["— Нет соответствия —"] + new_cols,
-        key=f"map_{col}",
+# для уже встречавшейся пары схем берём сохранённое сопоставление
+# и не рисуем selectbox'ы вовсе
+saved_mapping = load_mapping_profile(provider_name, old_cols, new_cols)
+use_saved_mapping = saved_mapping is not None and st.checkbox(
+    "Применить сохранённое сопоставление для этой схемы", value=True
+)
+
+if use_saved_mapping:
+    mapping = saved_mapping
+    n_renamed = sum(1 for o, n in mapping.items() if n is not None and n != o)
+    n_dropped = sum(1 for n in mapping.values() if n is None)
+    st.caption(
+        f"Сохранённое сопоставление применено: переименовано {n_renamed}, "
+        f"без соответствия {n_dropped}."
+    )
+else:
+    # подсказки: профили столбцов (значения, пустые, типы) + похожесть названий;
+    # профили кэшируются по файлу, поэтому считаются один раз
+    suggestions = pipeline.run(
+        "suggest_mapping",
+        lambda: best_mapping(
+            suggest_mapping(column_profiles_cached(df_old), column_profiles_cached(df_new))
+        ),
+        deps=("clean_old", "clean_new"),
+    )
+
+    mapping_options = [NO_MATCH] + new_cols
+    mapping = {}
+    for col in old_cols:
+        index, label = suggested_option(col, mapping_options, suggestions)
+        choice = st.selectbox(
+            label,
+            options=mapping_options,
+            index=index,
+            key=f"map_{col}",
+        )
+        mapping[col] = choice if choice != NO_MATCH else None
+
+    if st.button("💾 Сохранить сопоставление для этой схемы"):
+        save_mapping_profile(provider_name, old_cols, new_cols, mapping)
+        st.success("Сопоставление сохранено — для этой схемы оно будет применяться автоматически.")
+
+with st.expander("Профили сопоставления (экспорт / импорт)"):
+    st.download_button(
+        "⬇️ Экспортировать профили",
+        data=export_mapping_profiles(provider_name),
+        file_name=f"mapping_profiles_{provider_name}.json",
+        mime="application/json",
     )
-    mapping[col] = choice if choice != "— Нет соответствия —" else None
+    profiles_file = st.file_uploader("Файл профилей (.json)", type=["json"], key="mapping_profiles_file")
+    if profiles_file is not None and st.button("⬆️ Импортировать профили"):
+        try:
+            n_imported = import_mapping_profiles(provider_name, profiles_file.getvalue())
+            st.success(f"Импортировано профилей: {n_imported}")
+        except ValueError as e:
+            st.error(f"Не удалось импортировать профили: {e}")
 
 st.success("Сопоставление столбцов завершено.")
 
@@ -107,54 +245,12 @@ st.success("Сопоставление столбцов завершено.")
 # ------------------------------------------------------------
 st.header("Логирование изменений столбцов (log_schema)")
 
-log_rows = []
-current_date = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-used_new_cols = set()
-
-# 1) renamed / deleted
-for old_col, new_col in mapping.items():
-    if new_col is None:
-        log_rows.append(
-            {
-                "date": current_date,
-                "provider": provider_name,
-                "last_version": last_version,
-                "event": "deleted",
-                "old_column": old_col,
-                "new_column": None,
-            }
-        )
-    else:
-        used_new_cols.add(new_col)
-        if new_col == old_col:
-            # не логируем "без изменений"
-            continue
-        log_rows.append(
-            {
-                "date": current_date,
-                "provider": provider_name,
-                "last_version": last_version,
-                "event": "renamed",
-                "old_column": old_col,
-                "new_column": new_col,
-            }
-        )
-
-# 2) added
-for col in new_cols:
-    if col not in used_new_cols and col not in old_cols:
-        log_rows.append(
-            {
-                "date": current_date,
-                "provider": provider_name,
-                "last_version": last_version,
-                "event": "added",
-                "old_column": None,
-                "new_column": col,
-            }
-        )
-
-df_log_schema = pd.DataFrame(log_rows)
+df_log_schema = pipeline.run(
+    "log_schema",
+    lambda: build_column_change_log(mapping, df_old, df_new, provider_name, last_version),
+    deps=("clean_old", "clean_new"),
+    params={"mapping": mapping, "provider": provider_name, "last_version": last_version},
+)
 st.subheader("log_schema")
 st.dataframe(df_log_schema, use_container_width=True)
 
@@ -169,84 +265,163 @@ def download_log_schema(df: pd.DataFrame):
 
 st.download_button(
     "⬇ Скачать log_schema.xlsx",
-    data=download_log_schema(df_log_schema),
+    data=pipeline.run(
+        "log_schema_xlsx",
+        lambda: download_log_schema(df_log_schema).getvalue(),
+        deps=("log_schema",),
+    ),
     file_name="log_schema.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 )
 
 
-# ------------------------------------------------------------
-# ПРИМЕНЯЕМ ПЕРЕИМЕНОВАНИЕ К СТАРОЙ ТАБЛИЦЕ
-# ------------------------------------------------------------
-df_old_renamed = df_old.copy()
-for old_col, new_col in mapping.items():
-    if new_col is not None:
-        df_old_renamed.rename(columns={old_col: new_col}, inplace=True)
-
-df_old_pref = df_old_renamed.add_prefix("old_")
-df_new_pref = df_new.add_prefix("new_")
-
-
 # ------------------------------------------------------------
 # MERGE + СТАТУСЫ + ИЗМЕНЁННЫЕ СТОЛБЦЫ
 # ------------------------------------------------------------
 st.header("Объединение строк по Activity Master Number")
 
-merged_df = df_old_pref.merge(
-    df_new_pref,
-    left_on="old_Activity Master Number",
-    right_on="new_Activity Master Number",
-    how="outer",
-    indicator=True,
-)
-
-
-def detect_row_changes(row, common_columns):
-    """возвращает (status, changed_columns_str)"""
-    if row["_merge"] == "left_only":
-        return "deleted", None
-    if row["_merge"] == "right_only":
-        return "new", None
-
-    changed_cols = []
-    for col in common_columns:
-        old_val = row.get(f"old_{col}", np.nan)
-        new_val = row.get(f"new_{col}", np.nan)
-        if not safe_equals(old_val, new_val):
-            changed_cols.append(col)
-
-    if changed_cols:
-        return "changed", ", ".join(changed_cols)
-    return "not_changed", None
-
-
-common_cols = [
-    c.replace("old_", "")
-    for c in df_old_pref.columns
-    if c.replace("old_", "") in [x.replace("new_", "") for x in df_new_pref.columns]
-]
+# правила сравнения по столбцам (core.normalize): по умолчанию — str(x).strip()
+with st.expander("Правила сравнения значений"):
+    casefold_cols = st.multiselect("Без учёта регистра", new_cols, key="rule_casefold")
+    whitespace_cols = st.multiselect(
+        "Схлопывать переносы строк и пробелы", new_cols, key="rule_whitespace"
+    )
+    date_cols = st.multiselect("Сравнивать как даты", new_cols, key="rule_dates")
+    numeric_cols = st.multiselect("Сравнивать как числа", new_cols, key="rule_numeric")
+    numeric_tolerance = st.number_input(
+        "Допуск для чисел", min_value=0.0, value=0.0, format="%.6f", key="rule_tolerance"
+    )
 
-statuses = []
-changed_cols_list = []
-for _, r in merged_df.iterrows():
-    s, ch = detect_row_changes(r, common_cols)
-    statuses.append(s)
-    changed_cols_list.append(ch)
+compare_rules = {}
+for rule_name, rule_cols, rule_value in (
+    ("casefold", casefold_cols, True),
+    ("fold_whitespace", whitespace_cols, True),
+    ("dates", date_cols, True),
+    ("numeric_tolerance", numeric_cols, numeric_tolerance),
+):
+    for c in rule_cols:
+        compare_rules.setdefault(c, {})[rule_name] = rule_value
+
+# переименование старой таблицы по mapping, join и сравнение делает
+# IncrementalComparer: он помнит прошлый результат, и смена одного
+# сопоставления пересчитывает только затронутую пару столбцов.
+# Хэши ячеек берутся из кэша (или из снапшота старой версии).
+if "incremental_comparer" not in st.session_state:
+    st.session_state["incremental_comparer"] = IncrementalComparer()
+comparer = st.session_state["incremental_comparer"]
+
+merged_df, change_set = pipeline.run(
+    "compare",
+    lambda: comparer.compare(
+        df_old,
+        df_new,
+        mapping,
+        old_hashes=column_hashes_cached(df_old),
+        new_hashes=column_hashes_cached(df_new),
+        rules=compare_rules,
+        canonical=canonical_column_cached,
+    ),
+    deps=("clean_old", "clean_new"),
+    params={"mapping": mapping, "rules": compare_rules},
+)
+st.session_state["change_set"] = change_set
+
+# дубли и пустые Activity Master Number: join один-к-одному, но сообщаем
+key_report = comparer.key_report or {}
+for side, side_label in (("old", "старой"), ("new", "новой")):
+    rep = key_report.get(side)
+    if rep and (rep["duplicate_keys"] or rep["null_keys"]):
+        st.warning(
+            f"В {side_label} таблице повторяющихся ключей: {rep['duplicate_keys']} "
+            f"({rep['duplicate_rows']} строк), пустых ключей: {rep['null_keys']}. "
+            "Дубли сопоставлены один-к-одному по порядку строк, "
+            "строки без ключа не сопоставлялись."
+        )
 
-merged_df["status"] = statuses
-merged_df["changed columns"] = changed_cols_list
+change_counts = change_set.column_change_counts()
+change_counts = change_counts[change_counts > 0].sort_values(ascending=False)
+with st.expander(f"Изменённые ячейки по столбцам ({len(change_set)} строк)"):
+    st.caption(
+        f"Пересчитано пар столбцов: {comparer.last_stats['pairs_recomputed']}"
+        f" из {comparer.last_stats['pairs_total']}, "
+        f"обновлено строк: {comparer.last_stats['rows_patched']}"
+    )
+    if change_counts.empty:
+        st.info("Изменённых ячеек нет.")
+    else:
+        st.dataframe(
+            change_counts.rename("строк изменено").to_frame(),
+            use_container_width=True,
+        )
 
-# переносим служебные колонки в начало
-status_col = merged_df.pop("status")
-changed_col = merged_df.pop("changed columns")
-merge_col = merged_df.pop("_merge")
+# deleted + new с похожим названием/описанием — вероятно, сменился номер
+rekeyed_pairs = pipeline.run(
+    "rekey", lambda: find_rekeyed_pairs(merged_df), deps=("compare",)
+)
+if not rekeyed_pairs.empty:
+    with st.expander(f"Возможно перенумерованные активности ({len(rekeyed_pairs)})"):
+        st.caption(
+            "Пары строк «deleted ↔ new» с похожими названием и описанием: "
+            "скорее всего, это та же активность под новым Activity Master Number."
+        )
+        st.dataframe(
+            rekeyed_pairs[["old_key", "new_key", "score"]],
+            use_container_width=True,
+        )
 
-merged_df.insert(0, "changed columns", changed_col)
-merged_df.insert(0, "status", status_col)
-merged_df.insert(1, "_merge", merge_col)
+# правки пишутся в журнал (core.journal) под ключом менеджера и сравнения:
+# тот же менеджер, файлы, сопоставление и правила — тот же ключ и после перезапуска
+journal = get_journal()
+journal_key = session_key(
+    manager_id,
+    provider_name,
+    df_old.attrs.get("ingest_key"),
+    df_new.attrs.get("ingest_key"),
+    mapping,
+    compare_rules,
+)
+st.session_state["journal"] = journal
+
+# правки менеджера живут в overlay (core.editing) поверх результата
+# сравнения; при новом сравнении переносятся по стабильным row id
+if st.session_state.get("merged_from") != pipeline.token("compare"):
+    overlay = st.session_state.get("edit_overlay")
+    if overlay is None:
+        overlay = EditOverlay(merged_df)
+        # новая сессия (обновили страницу, перезапустили сервер):
+        # восстанавливаем правки, повторяя журнал на результате сравнения
+        n_replayed = replay_journal(
+            journal.operations(journal_key), overlay, st.session_state["log_actions"]
+        )
+        if n_replayed:
+            st.info(f"Сессия восстановлена из журнала: {n_replayed} действий.")
+    else:
+        overlay = overlay.rebase(merged_df)
+        # старые шаги undo относятся к прошлому результату сравнения
+        clear_history(st.session_state)
+        # журнал нового сравнения начинается со снимка перенесённых правок
+        journal.snapshot(
+            journal_key,
+            patch_to_ids(overlay.state_patch(), overlay.index.ids),
+            list(st.session_state["log_actions"]),
+        )
+    journal_synced(st.session_state)
+    st.session_state["edit_overlay"] = overlay
+    st.session_state["journal_key"] = journal_key
+    st.session_state["merged_from"] = pipeline.token("compare")
+elif st.session_state.get("journal_key") != journal_key:
+    # сменился Manager ID: его журнал начинается со снимка текущих правок
+    overlay = st.session_state["edit_overlay"]
+    journal.snapshot(
+        journal_key,
+        patch_to_ids(overlay.state_patch(), overlay.index.ids),
+        list(st.session_state["log_actions"]),
+    )
+    journal_synced(st.session_state)
+    st.session_state["journal_key"] = journal_key
 
-# сохраняем в session_state как "текущая версия"
-st.session_state["merged_df"] = merged_df.copy()
+# "текущая версия" — собранная из overlay таблица (кэшируется до новой правки)
+st.session_state["merged_df"] = st.session_state["edit_overlay"].materialize()
 
 
 # ------------------------------------------------------------
@@ -254,17 +429,35 @@ st.session_state["merged_df"] = merged_df.copy()
 # ------------------------------------------------------------
 st.header("Фильтр по статусу")
 
-status_filter = st.selectbox(
+base_df = pipeline.source("current", lambda: st.session_state["merged_df"])
+
+# индексы по текущей таблице (core.query): строки по статусам,
+# inverted index по "changed columns", ранги для сортировки —
+# строятся один раз на версию таблицы, фильтры таблицу не копируют
+table_query = pipeline.run(
+    "query",
+    lambda: TableQuery(base_df, changed_columns=st.session_state["change_set"].columns),
+    deps=("current",),
+)
+
+col_status, col_changed = st.columns(2)
+status_filter = col_status.selectbox(
     "Выберите статус",
     ["all", "changed", "not_changed", "new", "deleted"],
 )
+changed_filter = col_changed.multiselect(
+    "Изменён столбец (любой из выбранных)",
+    table_query.values(CHANGED_COL),
+)
 
-base_df = st.session_state["merged_df"]
-
-if status_filter == "all":
-    filtered_df = base_df.copy()
-else:
-    filtered_df = base_df[base_df["status"] == status_filter].copy()
+filtered_view = pipeline.run(
+    "filter",
+    lambda: table_query.select(status=status_filter, changed_in=changed_filter),
+    deps=("query",),
+    params={"status": status_filter, "changed_in": changed_filter},
+)
+status_counts = ", ".join(f"{s} — {n}" for s, n in table_query.status_counts().items())
+st.caption(f"Строк по статусам: {status_counts or 'нет'} · в выборке: {len(filtered_view)}")
 
 
 # ------------------------------------------------------------
@@ -273,17 +466,20 @@ else:
 with st.sidebar:
     st.subheader("Видимость столбцов")
     visible_cols = []
-    for c in filtered_df.columns:
+    for c in base_df.columns:
         vis = st.checkbox(c, value=True, key=f"vis_{c}")
         if vis:
             visible_cols.append(c)
     if not visible_cols:
         st.warning("Не выбрано ни одного столбца — таблица будет пустой.")
 
-if visible_cols:
-    view_df = filtered_df[visible_cols]
-else:
-    view_df = filtered_df.iloc[:, :0]
+# выборка строк + видимые столбцы; строки страницы собирает грид
+view_rows = pipeline.run(
+    "view",
+    lambda: filtered_view.with_columns(visible_cols),
+    deps=("filter",),
+    params=visible_cols,
+)
 
 
 # ------------------------------------------------------------
@@ -297,6 +493,7 @@ if col_undo.button("↩ Отменить последнее действие"):
     if res is None:
         st.warning("Нет действий для отмены.")
     else:
+        st.session_state["merged_df"] = st.session_state["edit_overlay"].materialize()
         st.success("Последнее действие отменено.")
 
 if col_redo.button("↪ Повторить (redo)"):
@@ -304,14 +501,59 @@ if col_redo.button("↪ Повторить (redo)"):
     if res is None:
         st.warning("Нет действий для повтора.")
     else:
+        st.session_state["merged_df"] = st.session_state["edit_overlay"].materialize()
         st.success("Действие повторено.")
 
 
+# память истории: шаги undo/redo + сжатые чекпоинты таблицы
+history = history_report(st.session_state)
+st.caption(
+    f"История: {history['undo_entries']} шагов undo, {history['redo_entries']} redo "
+    f"({history['undo_bytes'] / 1024:.1f} КБ); чекпоинтов {history['checkpoint_checkpoints']} "
+    f"({history['checkpoint_full']} полных, {history['checkpoint_records']} шагов undo), в памяти "
+    f"{history['checkpoint_bytes_in_memory'] / 1024:.1f} КБ, "
+    f"на диске {history['checkpoint_bytes_on_disk'] / 1024:.1f} КБ"
+)
+
+with st.expander("Версии таблицы (чекпоинты)"):
+    version_label = st.text_input("Подпись версии", key="checkpoint_label")
+    if st.button("💾 Сохранить версию"):
+        add_checkpoint(st.session_state, label=version_label or None)
+        st.success("Версия сохранена.")
+
+    checkpoint_listing = st.session_state["checkpoints"].listing()
+    # сжатые шаги undo хранятся там же, но выгрузить их как таблицу нельзя
+    checkpoint_listing = checkpoint_listing[checkpoint_listing["kind"] != "record"]
+    st.dataframe(checkpoint_listing, use_container_width=True)
+    if not checkpoint_listing.empty:
+        checkpoint_id = st.selectbox(
+            "Версия для выгрузки",
+            options=checkpoint_listing["id"].tolist()[::-1],
+            format_func=lambda cid: "#{} — {}".format(
+                cid, checkpoint_listing.set_index("id").at[cid, "label"] or ""
+            ),
+            key="checkpoint_id",
+        )
+        if st.button("Подготовить выгрузку версии"):
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+                st.session_state["checkpoints"].get(checkpoint_id).to_excel(
+                    writer, index=False, sheet_name="merged"
+                )
+            st.download_button(
+                "Скачать версию",
+                data=buffer.getvalue(),
+                file_name=f"merged_checkpoint_{checkpoint_id}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+
 # ------------------------------------------------------------
 # РЕНДЕР РЕДАКТИРУЕМОЙ ТАБЛИЦЫ (AG-GRID)
 # ------------------------------------------------------------
 # здесь всё управление гридом вынесено в core.table_editor
-result = render_editable_table(view_df, grid_key="main_grid", height=650)
+# постранично: в браузер уходит только текущая страница, поиск,
+# сортировка и выделение считаются на сервере по всей таблице
+result = render_editable_table(view_rows, grid_key="main_grid", height=650, page_size=PAGE_SIZE)
 
 df_after_grid = result["df_after"]
 selected_orig_indices = result["selected_orig_indices"]
@@ -326,36 +568,28 @@ if st.button("Удалить выбранные строки"):
     if not selected_orig_indices:
         st.warning("Нет выделенных строк для удаления.")
     else:
-        merged_df_current = st.session_state["merged_df"].copy()
-
-        # сохраняем состояние для undo
-        push_undo_state(
-            st.session_state,
-            merged_df_current,
-            st.session_state["log_actions"],
-        )
+        overlay = st.session_state["edit_overlay"]
 
-        # применяем удаление
-        new_df, row_events = apply_row_deletions(
-            merged_df_current,
-            indices_to_drop=selected_orig_indices,
-        )
+        # всё до конца блока — одно действие для undo (хранится как патч)
+        with undoable(st.session_state, label="удаление строк"):
+            # применяем удаление (строки помечаются в overlay, таблица не копируется)
+            row_events = overlay.delete_rows(selected_orig_indices)
 
-        # логируем каждую удалённую строку
-        for ev in row_events:
-            row_dict = ev["row_data"]
-            row_id_val = (
-                row_dict.get("old_Activity Master Number")
-                or row_dict.get("new_Activity Master Number")
-            )
-            log_delete_row(
-                st.session_state,
-                manager_id=manager_id,
-                row_id=row_id_val,
-                old_row_dict=row_dict,
-            )
+            # логируем каждую удалённую строку
+            for ev in row_events:
+                row_dict = ev["row_data"]
+                row_id_val = (
+                    row_dict.get("old_Activity Master Number")
+                    or row_dict.get("new_Activity Master Number")
+                )
+                log_delete_row(
+                    st.session_state,
+                    manager_id=manager_id,
+                    row_id=row_id_val,
+                    old_row_dict=row_dict,
+                )
 
-        st.session_state["merged_df"] = new_df
+        st.session_state["merged_df"] = overlay.materialize()
         st.success(f"Удалено строк: {len(row_events)}")
 
 # ------------------------------------------------------------
@@ -380,38 +614,32 @@ if delete_cols_clicked:
     if not cols_to_delete:
         st.warning("Не выбрано ни одного столбца для удаления.")
     else:
-        merged_df_current = st.session_state["merged_df"].copy()
-
-        # сохраняем состояние для undo
-        push_undo_state(
-            st.session_state,
-            merged_df_current,
-            st.session_state["log_actions"],
-        )
-
-        # логируем и удаляем по очереди
-        for col_name in cols_to_delete:
-            if col_name not in merged_df_current.columns:
-                continue
-
-            # логируем само действие удаления столбца
-            st.session_state["log_actions"].append({
-                "date": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "provider": provider_name,
-                "last_version": last_version,
-                "row_id": None,
-                "action": "delete_column",
-                "column_name": col_name,
-                "old_value": f"column_deleted",
-                "new_value": None,
-                "manager_id": manager_id,
-            })
-
-        # физическое удаление столбцов
-        merged_df_current.drop(columns=cols_to_delete, inplace=True, errors="ignore")
-        merged_df_current.reset_index(drop=True, inplace=True)
-        st.session_state["merged_df"] = merged_df_current
-
+        overlay = st.session_state["edit_overlay"]
+
+        # всё до конца блока — одно действие для undo (хранится как патч)
+        with undoable(st.session_state, label="удаление столбцов"):
+            # логируем и удаляем по очереди
+            for col_name in cols_to_delete:
+                if col_name not in current_df.columns:
+                    continue
+
+                # логируем само действие удаления столбца
+                st.session_state["log_actions"].append({
+                    "date": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "provider": provider_name,
+                    "last_version": last_version,
+                    "row_id": None,
+                    "action": "delete_column",
+                    "column_name": col_name,
+                    "old_value": f"column_deleted",
+                    "new_value": None,
+                    "manager_id": manager_id,
+                })
+
+            # удаление столбцов — в overlay
+            overlay.drop_columns(cols_to_delete)
+
+        st.session_state["merged_df"] = overlay.materialize()
         st.success(f"Удалено столбцов: {len(cols_to_delete)}")
 
 # ------------------------------------------------------------
@@ -423,48 +651,39 @@ if st.button("Сохранить изменения"):
     if not cell_changes:
         st.info("Нет изменений ячеек для сохранения.")
     else:
-        merged_df_before = st.session_state["merged_df"].copy()
-
-        # сохраняем состояние для undo
-        push_undo_state(
-            st.session_state,
-            merged_df_before,
-            st.session_state["log_actions"],
-        )
-
-        # применяем изменения ячеек
-        new_df, cell_events = apply_cell_edits(
-            merged_df_before,
-            cell_changes=cell_changes,
-        )
-
-        # логируем
-        for ch in cell_events:
-            idx = ch["orig_index"]
-            col = ch["column"]
-            old_val = ch["old_value"]
-            new_val = ch["new_value"]
-
-            # row_id берём по старому df (индекс ещё есть)
-            if idx in merged_df_before.index:
-                row_data_before = merged_df_before.loc[idx]
-                row_id_val = (
-                    row_data_before.get("old_Activity Master Number")
-                    or row_data_before.get("new_Activity Master Number")
+        overlay = st.session_state["edit_overlay"]
+
+        # ключ активности для логов — по row id до применения правок
+        row_keys = {
+            ch["orig_index"]: overlay.get(ch["orig_index"], OLD_KEY)
+            or overlay.get(ch["orig_index"], NEW_KEY)
+            for ch in cell_changes
+        }
+
+        # всё до конца блока — одно действие для undo (хранится как патч)
+        with undoable(st.session_state, label="правка ячеек"):
+            # применяем изменения ячеек (патчи по столбцам в overlay)
+            cell_events = overlay.edit_cells(cell_changes)
+
+            # логируем
+            for ch in cell_events:
+                idx = ch["orig_index"]
+                col = ch["column"]
+                old_val = ch["old_value"]
+                new_val = ch["new_value"]
+
+                row_id_val = row_keys.get(idx)
+
+                log_edit_cell(
+                    st.session_state,
+                    manager_id=manager_id,
+                    row_id=row_id_val,
+                    column_name=col,
+                    old_value=old_val,
+                    new_value=new_val,
                 )
-            else:
-                row_id_val = None
-
-            log_edit_cell(
-                st.session_state,
-                manager_id=manager_id,
-                row_id=row_id_val,
-                column_name=col,
-                old_value=old_val,
-                new_value=new_val,
-            )
 
-        st.session_state["merged_df"] = new_df
+        st.session_state["merged_df"] = overlay.materialize()
         st.success("Все изменения сохранены и зафиксированы в логах.")
 
 
@@ -479,9 +698,15 @@ def download_merged(df: pd.DataFrame):
     return buffer
 
 
+# выгрузка строится заново, только если текущая таблица изменилась
+pipeline.source("export_base", lambda: st.session_state["merged_df"])
 st.download_button(
     "Скачать объединённую таблицу (merged_status.xlsx)",
-    data=download_merged(st.session_state["merged_df"]),
+    data=pipeline.run(
+        "export_merged",
+        lambda: download_merged(st.session_state["merged_df"]).getvalue(),
+        deps=("export_base",),
+    ),
     file_name="merged_status.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 )
@@ -510,12 +735,36 @@ def download_log_actions(df: pd.DataFrame):
 
 st.download_button(
     "Скачать log_edit.xlsx",
-    data=download_log_actions(df_log_actions),
+    data=pipeline.run(
+        "export_log_edit",
+        lambda: download_log_actions(df_log_actions).getvalue(),
+        deps=("export_base",),
+        # токен по содержимому лога: после undo и новой правки длина
+        # может совпасть с прошлой, а записи — уже другие
+        params=st.session_state["log_actions"],
+    ),
     file_name="log_edit.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
 )
 
 
+with st.expander("Этапы обработки (время и кэш)"):
+    stage_report = pipeline.report()
+    st.caption(
+        f"Пересчитано этапов: {int((~stage_report['cache_hit']).sum())} из {len(stage_report)}, "
+        f"время: {stage_report['seconds'].sum():.3f} с"
+    )
+    st.dataframe(stage_report, use_container_width=True)
+
+    copy_report = copy_stats.report()
+    st.caption(f"Скопировано данных за этот rerun: {copy_stats.total() / 1024:.1f} КБ")
+    if not copy_report.empty:
+        st.dataframe(copy_report, use_container_width=True)
+
+# всё, что накопилось в журнале за этот rerun, — на диск
+journal.flush()
+
+
 # ------------------------------------------------------------
 # БЛОК: Загрузка переводов и добавление столбцов
 # ------------------------------------------------------------
@@ -568,29 +817,23 @@ if translated_file:
     # --------------------------------------------------------
     # Настройка AG-Grid (разрешено перетаскивание столбцов)
     # --------------------------------------------------------
-    gb2 = GridOptionsBuilder.from_dataframe(df_translated)
-
-    gb2.configure_default_column(
-        editable=True,
-        filter=True,
-        sortable=True,
-        resizable=True,
-        wrapText=True,
-        autoHeight=True
-    )
-
-    gb2.configure_grid_options(
-        enableRangeSelection=True,
-        enableColResize=True,
-        enableSorting=True,
-        enableFilter=True,
-        rowSelection="multiple",
-        suppressRowClickSelection=False,
-        suppressMovableColumns=False  # ← разрешаем перетаскивать колонки
+    # gridOptions кэшируются по схеме таблицы (core.aggrid_config)
+    grid_options_2 = build_grid_options(
+        df_translated,
+        checkbox_selection=False,
+        enable_sidebar=False,
+        hidden_cols=(),
+        grid_options=dict(
+            enableRangeSelection=True,
+            enableColResize=True,
+            enableSorting=True,
+            enableFilter=True,
+            rowSelection="multiple",
+            suppressRowClickSelection=False,
+            suppressMovableColumns=False,  # ← разрешаем перетаскивать колонки
+        ),
     )
 
-    grid_options_2 = gb2.build()
-
     grid_response_2 = AgGrid(
         df_translated,
         gridOptions=grid_options_2,
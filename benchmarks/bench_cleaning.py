@@ -0,0 +1,71 @@
+# benchmarks/bench_cleaning.py
+"""
+Сравнение двух режимов clean_excel_table:
+    - two_pass — два вызова pd.read_excel
+    - stream   — один проход openpyxl read-only
+
+Запуск:
+    python -m benchmarks.bench_cleaning --rows 100000 --cols 30
+"""
+
+import argparse
+import io
+import time
+
+import pandas as pd
+from openpyxl import Workbook
+
+from core.cleaning import clean_excel_table
+
+
+def build_workbook(n_rows: int, n_cols: int, preamble_rows: int = 3) -> bytes:
+    """Синтетический «грязный» файл: шапка из нескольких строк, затем таблица."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+
+    for i in range(preamble_rows):
+        ws.append([f"Registry export, line {i}"])
+    ws.append([])
+
+    header = ["Activity Master Number"] + [f"Column {j}" for j in range(1, n_cols)]
+    ws.append(header)
+
+    for i in range(n_rows):
+        ws.append([f"AMN-{i:07d}"] + [f"value {i} / {j}" for j in range(1, n_cols)])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def run(mode: str, data: bytes, repeats: int):
+    timings = []
+    df = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df = clean_excel_table(io.BytesIO(data), mode=mode)
+        timings.append(time.perf_counter() - start)
+    return min(timings), df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cols", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    data = build_workbook(args.rows, args.cols)
+    print(f"workbook: {args.rows} rows × {args.cols} cols, {len(data) / 1e6:.1f} MB")
+
+    t_two, df_two = run("two_pass", data, args.repeats)
+    t_stream, df_stream = run("stream", data, args.repeats)
+
+    pd.testing.assert_frame_equal(df_two, df_stream)
+
+    print(f"two_pass: {t_two:8.3f} s")
+    print(f"stream:   {t_stream:8.3f} s  (x{t_two / t_stream:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_grid_payload.py
+"""
+Сколько байт уходит в браузер для редактируемого грида и сколько
+стоит построение gridOptions:
+    - проекция — те же строки до и после: таблица с _orig_index / _rid
+      и индексом vs видимые столбцы + _rid;
+    - пагинация — отдельно: одна страница проекции вместо всех строк;
+    - gridOptions — GridOptionsBuilder на каждый rerun vs кэш по схеме.
+
+Запуск:
+    python -m benchmarks.bench_grid_payload --rows 20000 --cols 15
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from st_aggrid import GridOptionsBuilder
+
+from core.aggrid_config import build_grid_options, payload_nbytes
+from core.table_editor import PAGE_SIZE
+
+
+def build_frame(n_rows: int, n_cols: int) -> pd.DataFrame:
+    """Синтетический результат сравнения: индекс — 53-битные row id."""
+    rng = np.random.default_rng(0)
+    data = {"old_Activity Master Number": [f"AMN-{i:07d}" for i in range(n_rows)]}
+    for j in range(1, n_cols):
+        data[f"old_Column {j}"] = [f"value {i} / {j}" for i in range(n_rows)]
+    df = pd.DataFrame(data, dtype=object)
+    df.index = rng.integers(0, 2**53, n_rows)
+    return df
+
+
+def before_payload(df: pd.DataFrame) -> pd.DataFrame:
+    view = df.copy()
+    view["_orig_index"] = view.index
+    view["_rid"] = view["_orig_index"].astype(str)
+    return view
+
+
+def after_payload(df: pd.DataFrame) -> pd.DataFrame:
+    view = df.copy()
+    view["_rid"] = view.index.astype(str)
+    return view.reset_index(drop=True)
+
+
+def timed(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cols", type=int, default=15)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows, args.cols)
+    print(f"table: {args.rows} rows × {args.cols} cols")
+
+    before = before_payload(df)
+    after = after_payload(df.iloc[: args.page_size])
+
+    b_json, b_arrow = payload_nbytes(before, as_json=True), payload_nbytes(before)
+    a_json, a_arrow = payload_nbytes(after, as_json=True), payload_nbytes(after)
+    full_arrow = payload_nbytes(after_payload(df))
+
+    print("projection (same rows):")
+    print(f"  before (JSON):   {b_json / 1e6:8.2f} MB")
+    print(f"  before (Arrow):  {b_arrow / 1e6:8.2f} MB")
+    print(f"  after  (Arrow):  {full_arrow / 1e6:8.2f} MB  (-{(1 - full_arrow / b_arrow) * 100:.1f}%)")
+    print(f"paging ({args.page_size} of {args.rows} rows, projected):")
+    print(f"  page   (JSON):   {a_json / 1e6:8.2f} MB")
+    print(f"  page   (Arrow):  {a_arrow / 1e6:8.2f} MB  (x{full_arrow / a_arrow:.1f} vs all rows)")
+
+    t_builder = timed(lambda: GridOptionsBuilder.from_dataframe(after).build(), args.repeats)
+    build_grid_options(after, enable_sidebar=False, row_id_col="_rid")
+    t_cached = timed(
+        lambda: build_grid_options(after, enable_sidebar=False, row_id_col="_rid"), args.repeats
+    )
+    print(f"gridOptions builder:  {t_builder * 1e3:8.2f} ms")
+    print(f"gridOptions cached:   {t_cached * 1e3:8.2f} ms  (x{t_builder / t_cached:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_parallel_compare.py
+"""
+Ускорение parallel_merge_and_compare относительно merge_and_compare
+в зависимости от размера входа — чтобы выбрать PARALLEL_MIN_ROWS.
+
+Запуск:
+    python -m benchmarks.bench_parallel_compare --sizes 10000 50000 200000 --workers 8
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.merge_compare import merge_and_compare
+from core.parallel_compare import parallel_merge_and_compare
+
+
+def build_pair(n_rows: int, n_cols: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    data = {
+        f"Column {j}": rng.integers(0, 50, n_rows).astype(str).astype(object)
+        for j in range(n_cols)
+    }
+    old = pd.DataFrame({"Activity Master Number": np.arange(n_rows).astype(object), **data})
+
+    new = old.copy()
+    # ~10% строк изменено, 2% удалено, 2% добавлено
+    changed = rng.random(n_rows) < 0.10
+    new.loc[changed, "Column 0"] = "changed"
+    new = new[rng.random(n_rows) >= 0.02]
+    extra = old.sample(frac=0.02, random_state=seed).assign(
+        **{"Activity Master Number": lambda d: (d["Activity Master Number"] + n_rows).astype(object)}
+    )
+    new = pd.concat([new, extra], ignore_index=True)
+
+    return old.add_prefix("old_"), new.add_prefix("new_")
+
+
+def timed(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000, 100000])
+    parser.add_argument("--cols", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'serial, s':>10} {'parallel, s':>12} {'speedup':>8}")
+    for n_rows in args.sizes:
+        df_old, df_new = build_pair(n_rows, args.cols)
+
+        t_serial = timed(lambda: merge_and_compare(df_old, df_new), args.repeats)
+        t_parallel = timed(
+            lambda: parallel_merge_and_compare(df_old, df_new, workers=args.workers, min_rows=0),
+            args.repeats,
+        )
+        print(f"{n_rows:>10} {t_serial:>10.3f} {t_parallel:>12.3f} {t_serial / t_parallel:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,40 @@
 # core/aggrid_config.py
 
+import copy
+import hashlib
+import json
+
 from st_aggrid import GridOptionsBuilder
+from st_aggrid.shared import JsCode
+from streamlit.dataframe_util import convert_pandas_df_to_arrow_bytes
 from typing import Iterable
 import pandas as pd
 
+from core.cache import IngestionCache
+
+
+# gridOptions зависят только от схемы таблицы (имена и типы столбцов)
+# и настроек, поэтому строятся один раз на схему, а не на каждый rerun
+_GRID_OPTIONS_CACHE = IngestionCache(max_entries=32)
+
+
+def _jsonable(value):
+    return value.js_code if isinstance(value, JsCode) else str(value)
+
+
+def schema_key(df: pd.DataFrame, **options) -> str:
+    """Хэш схемы таблицы (имена и dtype столбцов) вместе с настройками грида."""
+    raw = json.dumps(
+        {
+            "columns": [[str(c), str(t)] for c, t in df.dtypes.items()],
+            "options": options,
+        },
+        sort_keys=True,
+        default=_jsonable,
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
 
 def build_grid_options(
     df: pd.DataFrame,
@@ -11,6 +42,8 @@ def build_grid_options(
     checkbox_selection: bool = True,
     enable_sidebar: bool = True,
     hidden_cols: Iterable[str] = ("_orig_index", "_rowid"),
+    row_id_col: str = None,
+    grid_options: dict = None,
 ) -> dict:
     """
     Создаёт gridOptions для AgGrid с максимально типичным поведением
@@ -21,12 +54,34 @@ def build_grid_options(
     - мультивыделение строк с чекбоксами
     - master checkbox в заголовке (select all по фильтру)
     - опциональный sidebar для показа/скрытия столбцов.
+
+    row_id_col — столбец со стабильным ID строки (getRowId),
+    grid_options — дополнительные опции грида (можно с JsCode).
+
+    Результат кэшируется по схеме таблицы (schema_key); возвращается
+    копия — её можно менять (AgGrid, например, подменяет JsCode строками).
     """
 
-    if df.empty:
-        gb = GridOptionsBuilder.from_dataframe(df)
-    else:
-        gb = GridOptionsBuilder.from_dataframe(df)
+    hidden_cols = tuple(hidden_cols)
+    key = schema_key(
+        df,
+        checkbox_selection=checkbox_selection,
+        enable_sidebar=enable_sidebar,
+        hidden_cols=hidden_cols,
+        row_id_col=row_id_col,
+        grid_options=grid_options,
+    )
+    cached = _GRID_OPTIONS_CACHE.get(key)
+    if cached is None:
+        cached = _build_grid_options(
+            df, checkbox_selection, enable_sidebar, hidden_cols, row_id_col, grid_options
+        )
+        _GRID_OPTIONS_CACHE.put(key, cached)
+    return copy.deepcopy(cached)
+
+
+def _build_grid_options(df, checkbox_selection, enable_sidebar, hidden_cols, row_id_col, grid_options):
+    gb = GridOptionsBuilder.from_dataframe(df)
 
     # базовые настройки столбцов
     gb.configure_default_column(
@@ -69,6 +124,32 @@ def build_grid_options(
     if enable_sidebar:
         gb.configure_side_bar()
 
-    grid_options = gb.build()
-    return grid_options
+    if grid_options:
+        gb.configure_grid_options(**grid_options)
+
+    built = gb.build()
 
+    # getRowId — стабильный ID строки для AG Grid
+    if row_id_col is not None:
+        built["getRowId"] = JsCode(
+            f"""
+            function(params) {{
+                return params.data[{json.dumps(row_id_col)}];
+            }}
+            """
+        )
+    return built
+
+
+# ===================================================================
+# РАЗМЕР ДАННЫХ ДЛЯ БРАУЗЕРА
+# ===================================================================
+
+def payload_nbytes(df: pd.DataFrame, as_json: bool = False) -> int:
+    """
+    Сколько байт уйдёт в браузер: Arrow IPC (так st_aggrid передаёт
+    DataFrame по умолчанию) или JSON records (use_json_serialization=True).
+    """
+    if as_json:
+        return len(df.to_json(orient="records").encode("utf-8"))
+    return len(convert_pandas_df_to_arrow_bytes(df))
@@ -0,0 +1,251 @@
+# core/cache.py
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from core.cleaning import clean_excel_table
+from core.column_profile import profile_table
+from core.fingerprint import column_hashes
+from core.journal import Journal
+from core.normalize import canonicalize_column, rule_key
+from core.snapshots import load_snapshot, load_snapshot_hashes, snapshot_path
+
+
+# ===================================================================
+# LRU-КЭШ ОЧИЩЕННЫХ ТАБЛИЦ
+# ===================================================================
+
+class IngestionCache:
+    """
+    Потокобезопасный LRU-кэш: ключ → очищенный DataFrame.
+    Ключ строится по хэшу содержимого файла и параметрам очистки,
+    поэтому один и тот же файл разбирается один раз на процесс.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_ingestion_cache() -> IngestionCache:
+    """Один экземпляр кэша на процесс — общий для всех сессий."""
+    return IngestionCache()
+
+
+@st.cache_resource
+def get_column_cache() -> IngestionCache:
+    """
+    Отдельный кэш для производных данных по столбцам (канонические формы),
+    чтобы десятки мелких записей не вытесняли сами таблицы.
+    """
+    return IngestionCache(max_entries=1024)
+
+
+@st.cache_resource
+def get_journal() -> Journal:
+    """Журнал правок (core.journal) — одно соединение SQLite на процесс."""
+    return Journal()
+
+
+# ===================================================================
+# КЛЮЧ ПО СОДЕРЖИМОМУ ФАЙЛА
+# ===================================================================
+
+def file_bytes(uploaded_file) -> bytes:
+    """Байты файла: UploadedFile / BytesIO / путь на диске."""
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    if hasattr(uploaded_file, "read"):
+        uploaded_file.seek(0)
+        return uploaded_file.read()
+    with open(uploaded_file, "rb") as f:
+        return f.read()
+
+
+def ingestion_key(data: bytes, **params) -> str:
+    h = hashlib.blake2b(data, digest_size=16)
+    for name in sorted(params):
+        h.update(f"|{name}={params[name]!r}".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ===================================================================
+# КЭШИРОВАННАЯ ОЧИСТКА
+# ===================================================================
+
+def clean_excel_table_cached(uploaded_file, cache: IngestionCache = None, **params):
+    """
+    То же, что clean_excel_table, но результат берётся из кэша,
+    если этот файл с этими параметрами уже разбирался.
+
+    Возвращаемый DataFrame общий для всех сессий — его нельзя
+    изменять на месте (только через .copy() / новые объекты).
+    """
+
+    if cache is None:
+        cache = get_ingestion_cache()
+
+    data = file_bytes(uploaded_file)
+    key = ingestion_key(data, **params)
+
+    df = cache.get(key)
+    if df is None:
+        df = clean_excel_table(io.BytesIO(data), **params)
+        df.attrs["ingest_key"] = key
+        cache.put(key, df)
+
+    return df
+
+
+# ===================================================================
+# КЭШИРОВАННАЯ ЗАГРУЗКА СНАПШОТА
+# ===================================================================
+
+def load_snapshot_cached(provider: str, version: str, cache: IngestionCache = None, **params):
+    """
+    Загружает снапшот из core.snapshots через тот же LRU-кэш.
+    В ключ входит время изменения файла, чтобы перезапись снапшота
+    не отдавала устаревшую таблицу.
+    """
+
+    if cache is None:
+        cache = get_ingestion_cache()
+
+    path = snapshot_path(provider, version, **params)
+    key = f"snapshot|{path}|{os.path.getmtime(path)}"
+
+    df = cache.get(key)
+    if df is None:
+        df = load_snapshot(provider, version, **params)
+        df.attrs["ingest_key"] = key
+        cache.put(key, df)
+
+        # хэши ячеек, сохранённые вместе со снапшотом, кладём в кэш сразу
+        hashes = load_snapshot_hashes(provider, version, **params)
+        if hashes is not None and list(hashes.columns) == list(df.columns):
+            cache.put(_hashes_key(key), hashes)
+
+    return df
+
+
+# ===================================================================
+# КЭШИРОВАННЫЕ ХЭШИ ЯЧЕЕК (core.fingerprint)
+# ===================================================================
+
+def _hashes_key(ingest_key: str) -> str:
+    return f"hashes|{ingest_key}"
+
+
+def column_hashes_cached(df, cache: IngestionCache = None):
+    """
+    Хэши ячеек таблицы, полученной через clean_excel_table_cached
+    или load_snapshot_cached. Не зависят от сопоставления столбцов,
+    поэтому считаются один раз на файл.
+    """
+
+    key = df.attrs.get("ingest_key")
+    if key is None:
+        return column_hashes(df)
+
+    if cache is None:
+        cache = get_ingestion_cache()
+
+    hashes = cache.get(_hashes_key(key))
+    if hashes is None:
+        hashes = column_hashes(df)
+        cache.put(_hashes_key(key), hashes)
+
+    return hashes
+
+
+# ===================================================================
+# КЭШИРОВАННЫЕ КАНОНИЧЕСКИЕ СТОЛБЦЫ (core.normalize)
+# ===================================================================
+
+def canonical_column_cached(df, col, rule: dict, cache: IngestionCache = None) -> dict:
+    """
+    Каноническая форма столбца очищенной таблицы по правилу rule.
+    Хранится рядом с самой таблицей в кэше: ключ — файл, столбец, правило.
+    """
+
+    key = df.attrs.get("ingest_key")
+    if key is None:
+        return canonicalize_column(df[col], rule)
+
+    if cache is None:
+        cache = get_column_cache()
+
+    canon_key = f"canon|{key}|{col}|{rule_key(rule)}"
+    canon = cache.get(canon_key)
+    if canon is None:
+        canon = canonicalize_column(df[col], rule)
+        cache.put(canon_key, canon)
+
+    return canon
+
+
+# ===================================================================
+# КЭШИРОВАННЫЕ ПРОФИЛИ СТОЛБЦОВ (core.column_profile)
+# ===================================================================
+
+def column_profiles_cached(df, cache: IngestionCache = None) -> dict:
+    """
+    Профили столбцов таблицы для подсказок сопоставления.
+    Считаются один раз на файл (по его ingest_key).
+    """
+
+    key = df.attrs.get("ingest_key")
+    if key is None:
+        return profile_table(df)
+
+    if cache is None:
+        cache = get_column_cache()
+
+    profiles_key = f"profiles|{key}"
+    profiles = cache.get(profiles_key)
+    if profiles is None:
+        profiles = profile_table(df)
+        cache.put(profiles_key, profiles)
+
+    return profiles
@@ -0,0 +1,121 @@
+# core/changeset.py
+
+import numpy as np
+import pandas as pd
+
+
+# ===================================================================
+# КОМПАКТНАЯ МАТРИЦА ИЗМЕНЕНИЙ (строка → битовая маска столбцов)
+# ===================================================================
+
+class ChangeSet:
+    """
+    Результат сравнения на уровне ячеек.
+
+    Хранятся только изменённые строки:
+        row_ids — позиции строк в merged_df (по возрастанию)
+        bits    — битовые маски по common_cols (np.packbits, 1 бит на ячейку)
+
+    Для 50k строк × 60 столбцов это ~8 байт на изменённую строку
+    вместо строки 'changed columns' и копий значений.
+    """
+
+    def __init__(self, row_ids: np.ndarray, bits: np.ndarray, columns, n_rows: int):
+        self.row_ids = row_ids
+        self.bits = bits
+        self.columns = list(columns)
+        self.n_rows = n_rows
+        self._col_pos = {col: j for j, col in enumerate(self.columns)}
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, columns) -> "ChangeSet":
+        row_ids = np.flatnonzero(matrix.any(axis=1))
+        bits = np.packbits(matrix[row_ids], axis=1)
+        return cls(row_ids, bits, columns, matrix.shape[0])
+
+    @classmethod
+    def concat(cls, parts) -> "ChangeSet":
+        """
+        Склеивает ChangeSet'ы частей, идущих подряд (как pd.concat строк).
+        Столбцы у всех частей должны совпадать.
+        """
+        parts = list(parts)
+        if not parts:
+            return cls.empty()
+
+        row_ids, offset = [], 0
+        for part in parts:
+            row_ids.append(part.row_ids + offset)
+            offset += part.n_rows
+
+        return cls(
+            np.concatenate(row_ids),
+            np.concatenate([part.bits for part in parts]),
+            parts[0].columns,
+            offset,
+        )
+
+    @classmethod
+    def empty(cls, columns=(), n_rows: int = 0) -> "ChangeSet":
+        return cls.from_matrix(np.zeros((n_rows, len(columns)), dtype=bool), columns)
+
+    # ---------------------------------------------------------------
+    # служебное
+    # ---------------------------------------------------------------
+    def _column_bits(self, col) -> np.ndarray:
+        """Булев вектор по изменённым строкам: менялся ли столбец col."""
+        j = self._col_pos[col]
+        return ((self.bits[:, j >> 3] >> (7 - (j & 7))) & 1).astype(bool)
+
+    def _row_slot(self, row_id: int):
+        slot = np.searchsorted(self.row_ids, row_id)
+        if slot < len(self.row_ids) and self.row_ids[slot] == row_id:
+            return slot
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.row_ids.nbytes + self.bits.nbytes)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    # ---------------------------------------------------------------
+    # запросы
+    # ---------------------------------------------------------------
+    def rows_changed_in(self, col) -> np.ndarray:
+        """Позиции строк, где изменился столбец col."""
+        if col not in self._col_pos:
+            return np.zeros(0, dtype=np.int64)
+        return self.row_ids[self._column_bits(col)]
+
+    def column_change_counts(self) -> pd.Series:
+        """Сколько строк изменилось по каждому столбцу."""
+        counts = np.unpackbits(self.bits, axis=1, count=len(self.columns)).sum(axis=0)
+        return pd.Series(counts, index=self.columns, dtype=np.int64)
+
+    def changed_columns(self, row_id: int) -> list:
+        """Список изменённых столбцов строки (пустой, если строка не менялась)."""
+        slot = self._row_slot(row_id)
+        if slot is None:
+            return []
+        mask = np.unpackbits(self.bits[slot], count=len(self.columns)).astype(bool)
+        return [col for col, m in zip(self.columns, mask) if m]
+
+    def value_pair(self, merged_df: pd.DataFrame, row_id: int, col):
+        """(старое, новое) значение ячейки строки row_id."""
+        row = merged_df.iloc[row_id]
+        return row.get(f"old_{col}"), row.get(f"new_{col}")
+
+    def value_pairs(self, merged_df: pd.DataFrame, row_id: int) -> dict:
+        """{столбец: (старое, новое)} по всем изменённым столбцам строки."""
+        return {
+            col: self.value_pair(merged_df, row_id, col)
+            for col in self.changed_columns(row_id)
+        }
+
+    def to_matrix(self) -> np.ndarray:
+        """Плотная булева матрица (строки × столбцы)."""
+        matrix = np.zeros((self.n_rows, len(self.columns)), dtype=bool)
+        matrix[self.row_ids] = np.unpackbits(self.bits, axis=1, count=len(self.columns)).astype(bool)
+        return matrix
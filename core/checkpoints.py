@@ -0,0 +1,324 @@
+# core/checkpoints.py
+
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core import copy_stats
+from core.snapshots import dataframe_to_arrow, arrow_to_dataframe, read_arrow_meta
+
+
+# ===================================================================
+# НАСТРОЙКИ
+# ===================================================================
+
+# сколько байт чекпоинтов держим в памяти сессии; остальное — на диск
+CHECKPOINT_BUDGET_BYTES = 64 * 1024 * 1024
+
+# на диске — не больше этого; сверх него старые чекпоинты удаляются
+CHECKPOINT_DISK_BUDGET_BYTES = 512 * 1024 * 1024
+
+# каждый N-й чекпоинт — полный, между ними — дельты к последнему полному
+FULL_EVERY = 10
+
+# если дельта затрагивает большую долю строк — пишем полный чекпоинт
+DELTA_MAX_FRACTION = 0.5
+
+_COMPRESSION = "zstd" if pa.Codec.is_available("zstd") else None
+_RECORD_CODEC = pa.Codec(_COMPRESSION or "gzip")
+
+_ROW_ID = "__row_id__"
+
+
+# ===================================================================
+# СЕРИАЛИЗАЦИЯ (сжатый Arrow IPC)
+# ===================================================================
+
+def _to_bytes(df: pd.DataFrame, meta: dict) -> bytes:
+    """DataFrame (вместе с индексом) → сжатые байты Arrow IPC."""
+    frame = df.reset_index(names=_ROW_ID)
+    frame.columns = [str(c) for c in frame.columns]
+    table = copy_stats.record("checkpoint: таблица → Arrow", dataframe_to_arrow(frame, meta=meta))
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=_COMPRESSION)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return copy_stats.record("checkpoint: сжатые байты", sink.getvalue().to_pybytes())
+
+
+def _from_bytes(data: bytes):
+    """Обратно: (DataFrame с исходным индексом, meta)."""
+    table = pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+    df = copy_stats.record("checkpoint: Arrow → таблица", arrow_to_dataframe(table))
+    return df.set_index(_ROW_ID).rename_axis(None), read_arrow_meta(table)
+
+
+def _changed_rows(ref: pd.DataFrame, df: pd.DataFrame) -> np.ndarray:
+    """Маска строк df, которых нет в ref или в которых отличается хоть одна ячейка."""
+    common = [c for c in df.columns if c in ref.columns]
+    in_ref = df.index.isin(ref.index)
+
+    changed = ~in_ref
+    if common and in_ref.any():
+        a = df.loc[in_ref, common].astype(object)
+        b = ref.loc[df.index[in_ref], common].astype(object)
+        same = (a.to_numpy() == b.to_numpy()) | (a.isna().to_numpy() & b.isna().to_numpy())
+        changed[in_ref] = ~same.all(axis=1)
+
+    # у добавленных столбцов «изменены» все строки, где есть значение
+    added = [c for c in df.columns if c not in ref.columns]
+    if added:
+        changed |= df[added].notna().any(axis=1).to_numpy()
+    return changed
+
+
+# ===================================================================
+# ХРАНИЛИЩЕ ЧЕКПОИНТОВ
+# ===================================================================
+
+class CheckpointStore:
+    """
+    Чекпоинты таблицы в сжатом виде (Arrow IPC + zstd):
+      - каждый FULL_EVERY-й — полный снимок;
+      - между ними — дельта к последнему полному: удалённые строки,
+        порядок столбцов и изменённые / новые строки целиком.
+
+    Индекс таблицы должен быть уникальным (row id из core.row_index).
+    Байты держатся в памяти в пределах budget_bytes, старые
+    переносятся во временную папку (spill=True) или удаляются.
+    Полный чекпоинт удаляется только вместе со своими дельтами.
+    Опорный полный снимок для дельт тоже хранится только байтами.
+
+    Кроме таблиц, хранит сжатые записи (add_record) — например,
+    undo-записи массовых действий (core.undo_redo): в том же бюджете.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = CHECKPOINT_BUDGET_BYTES,
+        disk_budget_bytes: int = CHECKPOINT_DISK_BUDGET_BYTES,
+        full_every: int = FULL_EVERY,
+        spill: bool = True,
+    ):
+        self.budget_bytes = budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.full_every = full_every
+        self.spill = spill
+
+        self._entries = {}       # id → запись (по порядку добавления)
+        self._ids = itertools.count(1)
+        self._since_full = 0
+        self._last_full = None   # id опорного полного снимка для дельт
+        self._spill_dir = None
+        self.evicted = 0
+
+    # ---------------------------------------------------------
+    # запись
+    # ---------------------------------------------------------
+    def add(self, df: pd.DataFrame, label: str = None) -> int:
+        cid = next(self._ids)
+        entry = {
+            "id": cid,
+            "label": label,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "rows": int(df.shape[0]),
+            "blob": None,
+            "path": None,
+        }
+
+        delta = self._delta_for(df)
+        if delta is None:
+            entry["kind"], entry["base"] = "full", cid
+            entry["blob"] = _to_bytes(df, {"kind": "full"})
+            self._last_full = cid
+            self._since_full = 0
+        else:
+            entry["kind"], entry["base"] = "delta", self._last_full
+            entry["blob"] = delta
+            self._since_full += 1
+
+        entry["nbytes"] = len(entry["blob"])
+        self._entries[cid] = entry
+        self._enforce_budget()
+        return cid
+
+    def _delta_for(self, df: pd.DataFrame):
+        """Байты дельты к последнему полному чекпоинту или None (нужен полный)."""
+        if self._last_full is None or self._since_full + 1 >= self.full_every:
+            return None
+        base_id = self._last_full
+        if base_id not in self._entries or not df.index.is_unique:
+            return None
+        # опорная таблица живёт только байтами — разворачиваем на время дельты
+        ref, _ = _from_bytes(self._blob(self._entries[base_id]))
+
+        removed = ref.index[~ref.index.isin(df.index)]
+        # дельта описывает только «опорные строки минус удалённые, плюс новые в конце»
+        kept = ref.index[ref.index.isin(df.index)]
+        if not df.index[: len(kept)].equals(kept):
+            return None
+
+        changed = _changed_rows(ref, df)
+        if changed.sum() + len(removed) > DELTA_MAX_FRACTION * max(len(df), 1):
+            return None
+
+        meta = {
+            "kind": "delta",
+            "columns": [str(c) for c in df.columns],
+            "removed": [v.item() if hasattr(v, "item") else v for v in removed],
+        }
+        return _to_bytes(df[changed], meta)
+
+    def add_record(self, obj, label: str = None) -> int:
+        """Сжатая запись произвольного объекта (pickle + zstd); возвращает id."""
+        raw = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        cid = next(self._ids)
+        copy_stats.record("checkpoint: запись (pickle)", raw)
+        blob = copy_stats.record("checkpoint: сжатые байты", _RECORD_CODEC.compress(raw, asbytes=True))
+        self._entries[cid] = {
+            "id": cid,
+            "label": label,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "kind": "record",
+            "base": cid,
+            "rows": 0,
+            "raw_nbytes": len(raw),
+            "blob": blob,
+            "path": None,
+            "nbytes": len(blob),
+        }
+        self._enforce_budget()
+        return cid
+
+    def get_record(self, cid: int):
+        """Объект записи add_record (KeyError, если запись вытеснена)."""
+        entry = self._entries[cid]
+        raw = _RECORD_CODEC.decompress(
+            self._blob(entry), decompressed_size=entry["raw_nbytes"], asbytes=True
+        )
+        return pickle.loads(raw)
+
+    def discard(self, cid: int):
+        """Удаляет запись add_record (например, вытесненный шаг undo)."""
+        entry = self._entries.get(cid)
+        if entry is None or entry["kind"] != "record":
+            return
+        del self._entries[cid]
+        if entry["path"] and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+
+    # ---------------------------------------------------------
+    # чтение
+    # ---------------------------------------------------------
+    def _blob(self, entry) -> bytes:
+        if entry["blob"] is not None:
+            return entry["blob"]
+        with open(entry["path"], "rb") as f:
+            return f.read()
+
+    def __contains__(self, cid) -> bool:
+        return cid in self._entries
+
+    def get(self, cid: int) -> pd.DataFrame:
+        """Восстанавливает таблицу чекпоинта."""
+        entry = self._entries[cid]
+        if entry["kind"] == "record":
+            raise KeyError(f"{cid} — запись, а не чекпоинт таблицы (см. get_record)")
+        full, _ = _from_bytes(self._blob(self._entries[entry["base"]]))
+        if entry["kind"] == "full":
+            return full
+
+        rows, meta = _from_bytes(self._blob(entry))
+        columns = meta["columns"]
+
+        result = full.drop(index=meta["removed"], errors="ignore")
+        result = result.reindex(columns=columns)
+
+        existing = rows.index.isin(result.index)
+        if existing.any():
+            result.loc[rows.index[existing], columns] = rows.loc[existing, columns]
+        if (~existing).any():
+            result = pd.concat([result, rows.loc[~existing, columns]])
+        return result
+
+    def listing(self) -> pd.DataFrame:
+        columns = ["id", "label", "created", "kind", "rows", "nbytes", "where"]
+        records = [
+            {
+                **{k: e[k] for k in ("id", "label", "created", "kind", "rows", "nbytes")},
+                "where": "memory" if e["blob"] is not None else "disk",
+            }
+            for e in self._entries.values()
+        ]
+        return pd.DataFrame(records, columns=columns)
+
+    # ---------------------------------------------------------
+    # память / диск
+    # ---------------------------------------------------------
+    def report(self) -> dict:
+        in_memory = sum(e["nbytes"] for e in self._entries.values() if e["blob"] is not None)
+        on_disk = sum(e["nbytes"] for e in self._entries.values() if e["blob"] is None)
+        return {
+            "checkpoints": len(self._entries),
+            "full": sum(1 for e in self._entries.values() if e["kind"] == "full"),
+            "deltas": sum(1 for e in self._entries.values() if e["kind"] == "delta"),
+            "records": sum(1 for e in self._entries.values() if e["kind"] == "record"),
+            "bytes_in_memory": in_memory,
+            "bytes_on_disk": on_disk,
+            "budget_bytes": self.budget_bytes,
+            "evicted": self.evicted,
+        }
+
+    def _spill_path(self, cid: int) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="ajman_checkpoints_")
+        return os.path.join(self._spill_dir, f"{cid}.arrows")
+
+    def _drop_group(self, base_id: int):
+        """Удаляет полный чекпоинт вместе с его дельтами."""
+        for cid in [c for c, e in self._entries.items() if e["base"] == base_id]:
+            entry = self._entries.pop(cid)
+            if entry["path"] and os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+            self.evicted += 1
+        if self._last_full == base_id:
+            self._last_full = None
+
+    def _enforce_budget(self):
+        # 1) лишнее из памяти — на диск (самые старые первыми);
+        #    без spill — удаляем самые старые группы целиком
+        if not self.spill:
+            while self._entries and self.report()["bytes_in_memory"] > self.budget_bytes:
+                self._drop_group(next(iter(self._entries.values()))["base"])
+        else:
+            over = self.report()["bytes_in_memory"] - self.budget_bytes
+            for entry in self._entries.values():
+                if over <= 0:
+                    break
+                if entry["blob"] is None:
+                    continue
+                entry["path"] = self._spill_path(entry["id"])
+                with open(entry["path"], "wb") as f:
+                    f.write(entry["blob"])
+                entry["blob"] = None
+                over -= entry["nbytes"]
+
+        # 2) диск тоже ограничен — удаляем самые старые группы
+        while self._entries and self.report()["bytes_on_disk"] > self.disk_budget_bytes:
+            self._drop_group(next(iter(self._entries.values()))["base"])
+
+    def clear(self):
+        self._entries.clear()
+        self._last_full = None
+        self._since_full = 0
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
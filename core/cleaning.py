@@ -1,45 +1,161 @@
 # core/cleaning.py
 
+from collections import defaultdict
+
+import numpy as np
 import pandas as pd
 import streamlit as st
+from openpyxl import load_workbook
+
+
+HEADER_MARKER = "Activity Master Number"
+
+# сколько первых строк листа просматриваем в поисках заголовка
+HEADER_SCAN_ROWS = 100
 
+# строки, которые pd.read_excel по умолчанию читает как пустые (na_values)
+NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+})
 
-def clean_excel_table(uploaded_file):
+
+def clean_excel_table(uploaded_file, mode="stream", header_scan_rows=HEADER_SCAN_ROWS):
     """
     Универсальная функция очистки входного Excel-файла.
     Находит строку, содержащую 'Activity Master Number', делает её заголовком,
     удаляет пустые строки и пустые столбцы.
 
     Работает и для «грязных» файлов, и для нормальных Excel.
+
+    mode:
+        - "stream"   — один проход по листу через read-only reader openpyxl,
+                       заголовок ищется только в первых header_scan_rows строках
+        - "two_pass" — старый путь: два вызова pd.read_excel
     """
 
+    if mode == "stream":
+        df = _read_excel_stream(uploaded_file, header_scan_rows)
+    elif mode == "two_pass":
+        df = _read_excel_two_pass(uploaded_file)
+    else:
+        raise ValueError(f"Неизвестный режим чтения: {mode}")
+
+    if df is None:
+        st.error("❌ Ошибка: в файле нет строки с заголовком 'Activity Master Number'")
+        st.stop()
+
+    # удаляем полностью пустые строки
+    df = df.dropna(how="all")
+
+    # удаляем полностью пустые столбцы
+    df = df.dropna(axis=1, how="all")
+
+    # сброс индексов
+    df = df.reset_index(drop=True)
+
+    return df
+
+
+# ===================================================================
+# ЧТЕНИЕ В ДВА ПРОХОДА (pd.read_excel)
+# ===================================================================
+
+def _read_excel_two_pass(uploaded_file):
     # читаем файл без заголовков
     df_all = pd.read_excel(uploaded_file, header=None, dtype=object)
 
     # ищем строку, которая содержит название столбца
     header_row_idx = None
     for i, row in df_all.iterrows():
-        if row.astype(str).str.contains("Activity Master Number", case=False, na=False).any():
+        if row.astype(str).str.contains(HEADER_MARKER, case=False, na=False).any():
             header_row_idx = i
             break
 
     if header_row_idx is None:
-        st.error("❌ Ошибка: в файле нет строки с заголовком 'Activity Master Number'")
-        st.stop()
+        return None
 
     # читаем снова, но уже с найденной строкой в качестве заголовка
     if header_row_idx == 0:
-        df = pd.read_excel(uploaded_file, dtype=object)
-    else:
-        df = pd.read_excel(uploaded_file, header=header_row_idx, dtype=object)
+        return pd.read_excel(uploaded_file, dtype=object)
+    return pd.read_excel(uploaded_file, header=header_row_idx, dtype=object)
 
-    # удаляем полностью пустые строки
-    df = df.dropna(how="all")
 
-    # удаляем полностью пустые столбцы
-    df = df.dropna(axis=1, how="all")
+# ===================================================================
+# ПОТОКОВОЕ ЧТЕНИЕ В ОДИН ПРОХОД (openpyxl read-only)
+# ===================================================================
 
-    # сброс индексов
-    df = df.reset_index(drop=True)
+def _read_excel_stream(uploaded_file, header_scan_rows):
+    """
+    Читает первый лист один раз. Значения приводятся так же,
+    как это делает pd.read_excel(dtype=object): целые float → int,
+    пустые строки и стандартные NA-строки → NaN.
+    """
 
-    return df
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows_iter = ws.iter_rows(values_only=True)
+
+        # ищем заголовок только в первых header_scan_rows строках
+        header = None
+        for i, raw in enumerate(rows_iter):
+            if i >= header_scan_rows:
+                break
+            if _is_header_row(raw):
+                header = list(raw)
+                break
+
+        if header is None:
+            return None
+
+        # оставшиеся строки уже идут за заголовком — разбираем их сразу
+        rows = [[_convert_cell(v) for v in raw] for raw in rows_iter]
+    finally:
+        wb.close()
+
+    # read-only reader может отдавать строки разной длины
+    width = max([len(header)] + [len(r) for r in rows])
+    header = header + [None] * (width - len(header))
+    rows = [r + [np.nan] * (width - len(r)) if len(r) < width else r for r in rows]
+
+    return pd.DataFrame(rows, columns=_build_column_names(header), dtype=object)
+
+
+def _is_header_row(values):
+    marker = HEADER_MARKER.lower()
+    return any(v is not None and marker in str(v).lower() for v in values)
+
+
+def _convert_cell(value):
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        return np.nan if value in NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _build_column_names(header):
+    """Имена столбцов как у pandas: пустые → 'Unnamed: i', дубли → 'name.1'."""
+    names = [
+        f"Unnamed: {i}" if pd.isna(name) else name
+        for i, name in enumerate(_convert_cell(v) for v in header)
+    ]
+
+    counts = defaultdict(int)
+    for i, col in enumerate(names):
+        cur_count = counts[col]
+        while cur_count > 0:
+            counts[col] = cur_count + 1
+            col = f"{col}.{cur_count}"
+            cur_count = counts[col]
+        names[i] = col
+        counts[col] = cur_count + 1
+
+    return names
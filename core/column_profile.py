@@ -0,0 +1,172 @@
+# core/column_profile.py
+
+import re
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from core.utils import normalize_compare_column
+
+
+# длина MinHash-подписи столбца
+NUM_PERM = 64
+
+# по сколько значений хэшируем за раз (память: блок × NUM_PERM × 8 байт)
+MINHASH_CHUNK = 8192
+
+# вес каждой составляющей итоговой оценки
+SCORE_WEIGHTS = {
+    "name": 0.45,
+    "values": 0.35,
+    "nulls": 0.10,
+    "types": 0.10,
+}
+
+_rng = np.random.default_rng(20240101)
+_PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+TYPE_KINDS = ("int", "float", "str", "date", "bool", "other")
+
+
+# ===================================================================
+# ПРОФИЛЬ СТОЛБЦА (один проход по значениям)
+# ===================================================================
+
+def _kind(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, np.integer)):
+        return "int"
+    if isinstance(value, (float, np.floating)):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (pd.Timestamp, np.datetime64)) or hasattr(value, "isoformat"):
+        return "date"
+    return "other"
+
+
+def minhash(values: np.ndarray) -> np.ndarray:
+    """
+    MinHash-подпись множества строк (NUM_PERM значений uint64).
+    В подпись входят все значения; минимум копится блоками по MINHASH_CHUNK.
+    """
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    if len(values) == 0:
+        return signature
+
+    hashes = pd.util.hash_array(values.astype(object), categorize=False)
+    for start in range(0, len(hashes), MINHASH_CHUNK):
+        chunk = hashes[start:start + MINHASH_CHUNK]
+        # (a * h + b) mod 2^64 для каждой перестановки — переполнение uint64 ожидаемо
+        permuted = chunk[:, None] * _PERM_A[None, :] + _PERM_B[None, :]
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature
+
+
+def profile_column(values: pd.Series) -> dict:
+    """
+    Небольшой профиль столбца:
+        minhash    — подпись множества нормализованных значений
+        null_ratio — доля пустых
+        types      — доля значений каждого типа (TYPE_KINDS)
+    """
+
+    text, isna = normalize_compare_column(values)
+    n = len(values)
+
+    distinct = pd.unique(text[~isna])
+
+    kinds = pd.Series(values[~isna].map(_kind).to_numpy(dtype=object)).value_counts()
+    non_null = max(int((~isna).sum()), 1)
+
+    return {
+        "minhash": minhash(distinct),
+        "null_ratio": float(isna.mean()) if n else 1.0,
+        "types": np.array([kinds.get(k, 0) / non_null for k in TYPE_KINDS]),
+    }
+
+
+def profile_table(df: pd.DataFrame) -> dict:
+    """{столбец: профиль} по всем столбцам таблицы."""
+    return {col: profile_column(df[col]) for col in df.columns}
+
+
+# ===================================================================
+# СХОДСТВО
+# ===================================================================
+
+def name_similarity(a, b) -> float:
+    """Похожесть названий столбцов: максимум из посимвольной и по словам."""
+    a, b = str(a).casefold().strip(), str(b).casefold().strip()
+    if a == b:
+        return 1.0
+
+    chars = SequenceMatcher(None, a, b).ratio()
+    ta, tb = set(_TOKEN_RE.findall(a)), set(_TOKEN_RE.findall(b))
+    words = len(ta & tb) / len(ta | tb) if ta | tb else 0.0
+    return max(chars, words)
+
+
+def column_similarity(name_old, prof_old: dict, name_new, prof_new: dict) -> float:
+    values = float((prof_old["minhash"] == prof_new["minhash"]).mean())
+    nulls = 1.0 - abs(prof_old["null_ratio"] - prof_new["null_ratio"])
+    types = 1.0 - float(np.abs(prof_old["types"] - prof_new["types"]).sum()) / 2
+
+    return (
+        SCORE_WEIGHTS["name"] * name_similarity(name_old, name_new)
+        + SCORE_WEIGHTS["values"] * values
+        + SCORE_WEIGHTS["nulls"] * nulls
+        + SCORE_WEIGHTS["types"] * types
+    )
+
+
+# ===================================================================
+# ПРЕДЛОЖЕНИЯ ДЛЯ СОПОСТАВЛЕНИЯ
+# ===================================================================
+
+def suggest_mapping(old_profiles: dict, new_profiles: dict, top_k: int = 3) -> dict:
+    """
+    Для каждого старого столбца — top_k кандидатов из новой таблицы:
+        {old_col: [(new_col, score), ...]}  (по убыванию score)
+    """
+
+    suggestions = {}
+    for old_col, prof_old in old_profiles.items():
+        scored = [
+            (new_col, column_similarity(old_col, prof_old, new_col, prof_new))
+            for new_col, prof_new in new_profiles.items()
+        ]
+        scored.sort(key=lambda kv: -kv[1])
+        suggestions[old_col] = scored[:top_k]
+    return suggestions
+
+
+def best_mapping(suggestions: dict, min_score: float = 0.5) -> dict:
+    """
+    Жадно выбирает один новый столбец на старый (без повторов):
+        {old_col: (new_col, score) or None}
+    """
+
+    candidates = sorted(
+        (
+            (score, old_col, new_col)
+            for old_col, ranked in suggestions.items()
+            for new_col, score in ranked
+            if score >= min_score
+        ),
+        key=lambda t: -t[0],
+    )
+
+    chosen, used_new = {}, set()
+    for score, old_col, new_col in candidates:
+        if old_col in chosen or new_col in used_new:
+            continue
+        chosen[old_col] = (new_col, score)
+        used_new.add(new_col)
+
+    return {old_col: chosen.get(old_col) for old_col in suggestions}
@@ -0,0 +1,83 @@
+# core/copy_stats.py
+
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# ===================================================================
+# COPY-ON-WRITE
+# ===================================================================
+
+def enable_copy_on_write():
+    """
+    Включает copy-on-write в pandas 2.x (в pandas 3 он всегда включён,
+    а опция устарела и выдаёт предупреждение — её не трогаем):
+    выборки столбцов, set_axis, reset_index и т.п. не копируют данные,
+    копия делается только при записи в общий блок.
+    """
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return
+    if not pd.get_option("mode.copy_on_write"):
+        pd.set_option("mode.copy_on_write", True)
+
+
+# ===================================================================
+# СЧЁТЧИК СКОПИРОВАННЫХ БАЙТ ЗА RERUN
+# ===================================================================
+# Каждая сессия Streamlit выполняет скрипт в своём потоке, поэтому
+# счётчик — на поток: reset() в начале rerun, report() в конце.
+
+_local = threading.local()
+
+
+def _records() -> list:
+    if not hasattr(_local, "records"):
+        _local.records = []
+    return _local.records
+
+
+def reset():
+    _local.records = []
+
+
+def nbytes_of(obj) -> int:
+    """
+    Размер данных DataFrame / Series / массива / таблицы Arrow (без
+    содержимого object-ячеек), байтов и строк; у dict / list — размер
+    самого контейнера (ссылки на значения).
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=False))
+    if isinstance(obj, (np.ndarray, pa.Table)):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, str)):
+        return len(obj)
+    if isinstance(obj, (dict, list)):
+        return sys.getsizeof(obj)
+    return 0
+
+
+def record(label: str, obj):
+    """Отмечает копию obj под подписью label; возвращает obj без изменений."""
+    _records().append((label, nbytes_of(obj)))
+    return obj
+
+
+def total() -> int:
+    return sum(n for _, n in _records())
+
+
+def report() -> pd.DataFrame:
+    """Копии этого rerun: сколько раз и сколько байт по каждой подписи."""
+    frame = pd.DataFrame(_records(), columns=["copy", "bytes"])
+    return (
+        frame.groupby("copy", sort=False)["bytes"]
+        .agg(copies="count", bytes="sum")
+        .reset_index()
+    )
@@ -1,6 +1,10 @@
 from typing import List, Dict, Any, Tuple
+import numpy as np
 import pandas as pd
 
+from core import copy_stats
+from core.row_index import RowIndex, assign_row_ids
+
 
 # ============================================================
 #  УДАЛЕНИЕ СТРОК
@@ -65,3 +69,308 @@ def apply_cell_edits(
     df_after = df_after.reset_index(drop=True)
 
     return df_after, cell_changes
+
+
+# ============================================================
+#  OVERLAY ПРАВОК ПОВЕРХ РЕЗУЛЬТАТА СРАВНЕНИЯ
+# ============================================================
+class _Unset:
+    """Маркер «у ячейки нет правки» в патчах (переживает copy/pickle)."""
+
+    def __repr__(self):
+        return "UNSET"
+
+    def __reduce__(self):
+        return "UNSET"
+
+
+UNSET = _Unset()
+
+
+def merge_patches(patches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Склеивает обратные патчи нескольких правок одного действия:
+    для каждой ячейки / строки / столбца остаётся самое раннее значение.
+    """
+    merged = {"rows": {}, "cells": {}, "columns": {}}
+    for patch in patches:
+        for pos, value in patch["rows"].items():
+            merged["rows"].setdefault(pos, value)
+        for col, cells in patch["cells"].items():
+            target = merged["cells"].setdefault(col, {})
+            for pos, value in cells.items():
+                target.setdefault(pos, value)
+        for col, value in patch["columns"].items():
+            merged["columns"].setdefault(col, value)
+    return merged
+
+
+class EditOverlay:
+    """
+    Правки менеджера поверх неизменяемого результата сравнения (base):
+      - tombstones — bool-маска удалённых строк (по позициям base);
+      - patches    — правки ячеек по столбцам: {column: {позиция: value}};
+      - dropped    — удалённые столбцы.
+
+    Снаружи строки адресуются стабильными row id (core.row_index),
+    назначенными при создании overlay; позиция находится через хэш-индекс.
+
+    base не копируется и не меняется; каждая правка — O(k) по числу
+    изменений. Текущая таблица собирается лениво в materialize()
+    и кэшируется до следующей правки. Индекс в ней — row id, поэтому
+    _orig_index из грида указывает прямо на строку.
+    """
+
+    def __init__(self, base: pd.DataFrame, row_ids=None):
+        self.base = base
+        self.index = RowIndex(assign_row_ids(base) if row_ids is None else row_ids)
+        self.tombstones = np.zeros(len(base), dtype=bool)
+        self.patches: Dict[Any, Dict[int, Any]] = {}
+        self.dropped = set()
+        self.version = 0
+        self._view = None
+        # base с правками ячеек, без удаления строк; пересобираются только
+        # столбцы из _stale (см. materialize)
+        self._patched = None
+        self._stale = set()
+        self._recording = None
+
+    def __deepcopy__(self, memo):
+        # base и индекс общие и неизменяемые — копируется только состояние правок
+        clone = EditOverlay.__new__(EditOverlay)
+        clone.base = self.base
+        clone.index = self.index
+        clone.tombstones = self.tombstones.copy()
+        clone.patches = {col: dict(rows) for col, rows in self.patches.items()}
+        clone.dropped = set(self.dropped)
+        clone.version = self.version
+        clone._view = self._view
+        clone._patched = self._patched
+        clone._stale = set(self._stale)
+        clone._recording = None
+        return clone
+
+    def _touch(self, columns=(), structure: bool = False):
+        """columns — столбцы с изменёнными правками; structure — изменился набор столбцов."""
+        self.version += 1
+        self._view = None
+        if structure:
+            self._patched = None
+            self._stale.clear()
+        else:
+            self._stale.update(columns)
+
+    @property
+    def has_edits(self) -> bool:
+        return bool(self.tombstones.any() or self.patches or self.dropped)
+
+    def _live_position(self, row_id):
+        """Позиция неудалённой строки или None."""
+        pos = self.index.position(row_id)
+        if pos is None or self.tombstones[pos]:
+            return None
+        return pos
+
+    def __contains__(self, row_id) -> bool:
+        return self._live_position(row_id) is not None
+
+    def _get(self, pos: int, column):
+        patched = self.patches.get(column)
+        if patched is not None and pos in patched:
+            return patched[pos]
+        return self.base[column].iat[pos]
+
+    def get(self, row_id, column, default=None):
+        """Текущее значение ячейки (с учётом правок)."""
+        pos = self._live_position(row_id)
+        if pos is None or column not in self.base.columns or column in self.dropped:
+            return default
+        return self._get(pos, column)
+
+    def row_dict(self, row_id) -> Dict[str, Any]:
+        pos = self._live_position(row_id)
+        if pos is None:
+            return {}
+        return copy_stats.record(
+            "overlay: строка для лога",
+            {col: self._get(pos, col) for col in self.base.columns if col not in self.dropped},
+        )
+
+    # ---------------------------------------------------------
+    # патчи: всё изменение состояния идёт через apply_patch
+    # ---------------------------------------------------------
+    def apply_patch(self, patch: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Применяет патч и возвращает обратный к нему, O(размер патча):
+            rows    — {позиция: удалена ли строка}
+            cells   — {столбец: {позиция: значение или UNSET}}
+            columns — {столбец: удалён ли столбец}
+        """
+        inverse = {"rows": {}, "cells": {}, "columns": {}}
+
+        for pos, deleted in patch.get("rows", {}).items():
+            inverse["rows"][pos] = bool(self.tombstones[pos])
+            self.tombstones[pos] = deleted
+
+        for col, cells in patch.get("cells", {}).items():
+            col_patches = self.patches.setdefault(col, {})
+            inverse_cells = inverse["cells"].setdefault(col, {})
+            for pos, value in cells.items():
+                inverse_cells[pos] = col_patches.get(pos, UNSET)
+                if value is UNSET:
+                    col_patches.pop(pos, None)
+                else:
+                    col_patches[pos] = value
+            if not col_patches:
+                del self.patches[col]
+
+        for col, dropped in patch.get("columns", {}).items():
+            inverse["columns"][col] = col in self.dropped
+            if dropped:
+                self.dropped.add(col)
+            else:
+                self.dropped.discard(col)
+
+        if inverse["rows"] or inverse["cells"] or inverse["columns"]:
+            self._touch(columns=inverse["cells"], structure=bool(inverse["columns"]))
+            if self._recording is not None:
+                self._recording.append(inverse)
+        return inverse
+
+    def capture(self, patch: Dict[str, Any]) -> Dict[str, Any]:
+        """Патч с теми же ключами, что patch, но с текущими значениями."""
+        return {
+            "rows": {pos: bool(self.tombstones[pos]) for pos in patch["rows"]},
+            "cells": {
+                col: {pos: self.patches.get(col, {}).get(pos, UNSET) for pos in cells}
+                for col, cells in patch["cells"].items()
+            },
+            "columns": {col: col in self.dropped for col in patch["columns"]},
+        }
+
+    def state_patch(self) -> Dict[str, Any]:
+        """Патч, который из пустого overlay делает текущий."""
+        return {
+            "rows": {int(pos): True for pos in np.flatnonzero(self.tombstones)},
+            "cells": {col: dict(rows) for col, rows in self.patches.items()},
+            "columns": {col: True for col in self.dropped},
+        }
+
+    def start_recording(self):
+        """Начинает собирать обратные патчи (для core.undo_redo)."""
+        self._recording = []
+
+    def stop_recording(self):
+        """Обратный патч всех правок с start_recording() или None."""
+        recorded, self._recording = self._recording, None
+        return merge_patches(recorded) if recorded else None
+
+    # ---------------------------------------------------------
+    # правки
+    # ---------------------------------------------------------
+    def delete_rows(self, row_ids: List[int]) -> List[Dict[str, Any]]:
+        """Помечает строки удалёнными. Возвращает события для логов."""
+        events, rows = [], {}
+        for row_id in sorted(set(int(r) for r in row_ids)):
+            pos = self._live_position(row_id)
+            if pos is None:
+                continue
+            events.append({"row_index": row_id, "row_data": self.row_dict(row_id)})
+            rows[pos] = True
+
+        self.apply_patch({"rows": rows})
+        return events
+
+    def edit_cells(self, cell_changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Записывает правки ячеек (orig_index = row id). Возвращает применённые."""
+        applied, cells = [], {}
+        for change in cell_changes:
+            pos, col = self._live_position(change["orig_index"]), change["column"]
+            if pos is None or col not in self.base.columns or col in self.dropped:
+                continue
+            cells.setdefault(col, {})[pos] = change["new_value"]
+            applied.append(change)
+
+        self.apply_patch({"cells": cells})
+        return applied
+
+    def drop_columns(self, columns: List[str]) -> List[str]:
+        dropped = [c for c in columns if c in self.base.columns and c not in self.dropped]
+        self.apply_patch({"columns": {c: True for c in dropped}})
+        return dropped
+
+    # ---------------------------------------------------------
+    # сборка текущей таблицы
+    # ---------------------------------------------------------
+    def materialize(self) -> pd.DataFrame:
+        """
+        Текущая таблица (индекс — row id); пересобирается только после правок
+        и только в затронутых столбцах. Остальные столбцы — общие с base
+        (copy-on-write), копируются лишь столбцы с правками и, если есть
+        удалённые строки, итоговая выборка строк.
+        """
+        if self._view is not None:
+            return self._view
+
+        if self._patched is None:
+            columns = [c for c in self.base.columns if c not in self.dropped]
+            patched = self.base[columns].set_axis(pd.Index(self.index.ids), axis=0)
+            stale = set(self.patches)
+        else:
+            # копия без данных: столбцы подменяются только в ней
+            patched = self._patched.copy(deep=False)
+            stale = self._stale
+
+        for col in stale:
+            if col not in patched.columns:
+                continue
+            rows = self.patches.get(col)
+            if not rows:
+                # правок в столбце не осталось — снова столбец base
+                patched[col] = self.base[col].set_axis(patched.index)
+                continue
+            # новые массивы подменяют столбцы только в patched, base не трогаем
+            values = copy_stats.record(
+                "overlay: столбцы с правками",
+                self.base[col].to_numpy(dtype=object, copy=True),
+            )
+            values[list(rows.keys())] = list(rows.values())
+            patched[col] = values
+
+        self._patched, self._stale = patched, set()
+
+        view = patched
+        if self.tombstones.any():
+            view = copy_stats.record("overlay: удаление строк", patched[~self.tombstones])
+
+        self._view = view
+        return view
+
+    # ---------------------------------------------------------
+    # перенос правок на новый результат сравнения
+    # ---------------------------------------------------------
+    def rebase(self, base: pd.DataFrame) -> "EditOverlay":
+        """
+        Новый overlay поверх base с теми же правками: строки сопоставляются
+        по row id, так что порядок строк в base может быть другим.
+        Правки строк и столбцов, которых в base нет, отбрасываются.
+        """
+        fresh = EditOverlay(base)
+        if not self.has_edits:
+            return fresh
+
+        # позиция в self → позиция в fresh
+        moved = fresh.index.positions(self.index.ids)
+
+        deleted = moved[self.tombstones]
+        fresh.tombstones[deleted[deleted >= 0]] = True
+
+        for col, rows in self.patches.items():
+            if col not in base.columns:
+                continue
+            remapped = {int(moved[pos]): value for pos, value in rows.items() if moved[pos] >= 0}
+            if remapped:
+                fresh.patches[col] = remapped
+
+        fresh.dropped = {c for c in self.dropped if c in base.columns}
+        return fresh
@@ -0,0 +1,66 @@
+# core/fingerprint.py
+
+import numpy as np
+import pandas as pd
+
+from core.utils import normalize_compare_column
+
+
+# хэш для пустого значения — отличается от хэша любой строки
+# (кроме случайной 64-битной коллизии)
+NA_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+# ===================================================================
+# ХЭШИ ОТДЕЛЬНЫХ СТОЛБЦОВ
+# ===================================================================
+
+def hash_column(values: pd.Series) -> np.ndarray:
+    """
+    64-битный хэш каждой ячейки после той же нормализации,
+    что и в сравнении (str(x).strip(), пустые значения отдельно).
+    """
+
+    text, isna = normalize_compare_column(values)
+    hashes = pd.util.hash_array(text, categorize=False)
+    hashes[isna] = NA_HASH
+    return hashes
+
+
+def column_hashes(df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame той же формы, что df: uint64-хэш каждой ячейки."""
+    return pd.DataFrame(
+        {col: hash_column(df[col]) for col in df.columns},
+        index=df.index,
+    )
+
+
+# ===================================================================
+# ОТПЕЧАТОК СТРОКИ
+# ===================================================================
+
+def combine_hashes(arrays) -> np.ndarray:
+    """
+    Склеивает хэши нескольких столбцов в один отпечаток строки.
+    Порядок столбцов важен — обе стороны должны передавать их
+    в одном и том же порядке.
+    """
+
+    arrays = list(arrays)
+    if not arrays:
+        return np.zeros(0, dtype=np.uint64)
+
+    mult = np.uint64(1000003)
+    out = np.full(len(arrays[0]), 0x345678, dtype=np.uint64)
+    for i, a in enumerate(arrays):
+        inverse_i = len(arrays) - i
+        out ^= a
+        out *= mult
+        mult += np.uint64(82520 + inverse_i + inverse_i)
+
+    return out + np.uint64(97531)
+
+
+def row_fingerprints(hashes: pd.DataFrame, columns) -> np.ndarray:
+    """Отпечатки строк по заранее посчитанным хэшам столбцов."""
+    return combine_hashes(hashes[col].to_numpy() for col in columns)
@@ -0,0 +1,219 @@
+# core/incremental.py
+
+import numpy as np
+import pandas as pd
+
+from core.changeset import ChangeSet
+from core.mapping import mapped_column_names
+from core.normalize import canonical_changed, canonicalize_column, resolve_rule, rule_key
+from core.merge_compare import (
+    join_positions,
+    summarize_changes,
+    _take_rows,
+)
+
+
+KEY_COLUMN = "Activity Master Number"
+
+
+def _canonicalize(df, col, rule):
+    return canonicalize_column(df[col], rule)
+
+
+# ===================================================================
+# ИНКРЕМЕНТАЛЬНОЕ СРАВНЕНИЕ ПРИ ИЗМЕНЕНИИ СОПОСТАВЛЕНИЯ
+# ===================================================================
+
+class IncrementalComparer:
+    """
+    Помнит результат предыдущего сравнения и при изменении mapping
+    пересчитывает только затронутые пары столбцов.
+
+    Что кэшируется:
+      - join по ключу (позиции строк обеих таблиц) — зависит только от
+        таблиц и от того, какой старый столбец стал ключом;
+      - строки обеих таблиц, уже выровненные по join;
+      - вектор изменений для каждой пары (старый столбец, новый столбец,
+        правило сравнения);
+      - статусы и 'changed columns' предыдущего вызова.
+
+    Результат совпадает с
+        merge_and_compare(apply_column_mapping(df_old, mapping).add_prefix("old_"),
+                          df_new.add_prefix("new_"), return_changes=True)
+    """
+
+    def __init__(self, tie_breaker=None):
+        self.tie_breaker = tie_breaker
+        self.key_report = None
+        self._base_key = None
+        self._pair_changes = {}
+        self._last = None
+        self.last_stats = {}
+
+    # ---------------------------------------------------------------
+    # база: join по ключу + выровненные строки
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _frame_id(df: pd.DataFrame):
+        return df.attrs.get("ingest_key") or id(df)
+
+    def _ensure_base(self, df_old, df_new, old_names):
+        key_source = df_old.columns[old_names.index(KEY_COLUMN)]
+
+        # tie-breaker для дублей ключа задаётся по новому имени столбца
+        order_source = None
+        if self.tie_breaker is not None and self.tie_breaker in old_names:
+            order_source = df_old.columns[old_names.index(self.tie_breaker)]
+
+        base_key = (self._frame_id(df_old), self._frame_id(df_new), key_source, order_source)
+        if base_key == self._base_key:
+            return False
+
+        old_pos, new_pos, indicator, key_report = join_positions(
+            df_old[key_source],
+            df_new[KEY_COLUMN],
+            df_old[order_source] if order_source is not None else None,
+            df_new[self.tie_breaker] if order_source is not None else None,
+        )
+
+        self._base_key = base_key
+        self.key_report = key_report
+        self._old_pos = old_pos
+        self._new_pos = new_pos
+        self._indicator = indicator
+        self._both = (indicator == "both").to_numpy()
+        self._old_rows = _take_rows(df_old, old_pos)
+        self._new_rows = _take_rows(df_new, new_pos).add_prefix("new_")
+        self._pair_changes = {}
+        self._last = None
+        return True
+
+    # ---------------------------------------------------------------
+    # вектор изменений одной пары столбцов
+    # ---------------------------------------------------------------
+    def _pair_vector(self, pair, rule, df_old, df_new, old_hashes, new_hashes, canonical):
+        if pair in self._pair_changes:
+            return self._pair_changes[pair]
+
+        old_col, new_col, _ = pair
+        both = self._both
+        candidates = both.copy()
+
+        # сначала хэши ячеек: совпавшие ячейки точно не изменились
+        # (равный текст ⇒ равная каноническая форма при любом правиле)
+        if old_hashes is not None and new_hashes is not None:
+            h_old = old_hashes[old_col].to_numpy()
+            h_new = new_hashes[new_col].to_numpy()
+            candidates[both] = h_old[self._old_pos[both]] != h_new[self._new_pos[both]]
+
+        rows = np.flatnonzero(candidates)
+        vector = np.zeros(len(both), dtype=bool)
+        if len(rows):
+            # канонические формы посчитаны заранее по исходным таблицам —
+            # здесь только сравнение массивов по позициям join
+            vector[rows] = canonical_changed(
+                canonical(df_old, old_col, rule),
+                canonical(df_new, new_col, rule),
+                rule,
+                self._old_pos[rows],
+                self._new_pos[rows],
+            )
+
+        self._pair_changes[pair] = vector
+        return vector
+
+    # ---------------------------------------------------------------
+    # основной вызов
+    # ---------------------------------------------------------------
+    def compare(
+        self,
+        df_old,
+        df_new,
+        mapping,
+        old_hashes=None,
+        new_hashes=None,
+        rules=None,
+        canonical=None,
+    ):
+        """
+        df_old, df_new — очищенные таблицы (без префиксов и переименований)
+        mapping        — {old_col: new_col or None}
+        old_hashes, new_hashes — необязательные хэши ячеек (core.fingerprint)
+            с исходными именами столбцов
+        rules          — правила сравнения по столбцам (core.normalize),
+            ключи — имена столбцов новой таблицы
+        canonical      — функция (df, col, rule) → каноническая форма столбца;
+            например core.cache.canonical_column_cached
+
+        Возвращает (merged_df, ChangeSet).
+        """
+
+        if canonical is None:
+            canonical = _canonicalize
+
+        old_names = mapped_column_names(df_old.columns, mapping)
+        rebuilt = self._ensure_base(df_old, df_new, old_names)
+
+        # пары (исходный старый столбец, новый столбец, правило) в порядке common_cols
+        new_set = set(df_new.columns)
+        pairs, pair_rules = [], []
+        for src, name in zip(df_old.columns, old_names):
+            if name in new_set:
+                rule = resolve_rule(rules, name)
+                pairs.append((src, name, rule_key(rule)))
+                pair_rules.append(rule)
+        common_cols = [name for _, name, _ in pairs]
+
+        computed = sum(1 for p in pairs if p not in self._pair_changes)
+        vectors = [
+            self._pair_vector(pair, rule, df_old, df_new, old_hashes, new_hashes, canonical)
+            for pair, rule in zip(pairs, pair_rules)
+        ]
+
+        n_rows = len(self._indicator)
+        matrix = np.column_stack(vectors) if vectors else np.zeros((n_rows, 0), dtype=bool)
+
+        # статусы: патчим только строки, затронутые изменившимися парами
+        last = self._last
+        if last is None:
+            statuses, changed = summarize_changes(self._indicator, matrix, common_cols)
+            patched_rows = n_rows
+        else:
+            old_vectors = dict(zip(last["pairs"], last["vectors"]))
+            touched = np.zeros(n_rows, dtype=bool)
+            for p in set(old_vectors) ^ set(pairs):
+                touched |= old_vectors.get(p, self._pair_changes.get(p))
+
+            rows = np.flatnonzero(touched)
+            statuses = last["statuses"].copy()
+            changed = last["changed"].copy()
+            if len(rows):
+                statuses[rows], changed[rows] = summarize_changes(
+                    self._indicator.iloc[rows], matrix[rows], common_cols
+                )
+            patched_rows = len(rows)
+
+        self._last = {
+            "pairs": pairs,
+            "vectors": vectors,
+            "common_cols": common_cols,
+            "statuses": statuses,
+            "changed": changed,
+        }
+        self.last_stats = {
+            "rebuilt_join": rebuilt,
+            "pairs_total": len(pairs),
+            "pairs_recomputed": computed,
+            "rows_patched": patched_rows,
+        }
+
+        merged = pd.concat(
+            [self._old_rows.set_axis([f"old_{c}" for c in old_names], axis=1), self._new_rows],
+            axis=1,
+        )
+        merged.insert(0, "changed columns", changed)
+        merged.insert(0, "status", statuses)
+        merged.insert(1, "_merge", self._indicator)
+        merged.attrs["key_report"] = self.key_report
+
+        return merged, ChangeSet.from_matrix(matrix, common_cols)
@@ -0,0 +1,305 @@
+# core/journal.py
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from core import copy_stats
+from core.editing import UNSET
+
+
+# ===================================================================
+# НАСТРОЙКИ
+# ===================================================================
+
+JOURNAL_PATH = os.path.join("data", "journal", "journal.sqlite")
+
+# операции пишутся пачками: commit после BATCH_SIZE операций
+# или через FLUSH_INTERVAL секунд (и в конце каждого rerun — flush())
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 2.0
+
+_UNSET_JSON = {"$unset": True}
+
+
+def session_key(manager_id, *parts) -> str:
+    """
+    Ключ журнала: чьи операции (manager_id) и к какому результату
+    сравнения они относятся (файлы, сопоставление, правила). Тот же
+    менеджер с теми же входами — тот же ключ, в том числе после
+    перезапуска сервера; у разных менеджеров журналы не пересекаются.
+    """
+    parts = (str(manager_id),) + parts
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ===================================================================
+# ПАТЧИ OVERLAY ⇄ JSON (позиции строк → стабильные row id)
+# ===================================================================
+
+def _encode(value):
+    """
+    Значение → JSON с сохранением типа: numpy-скаляры — как числа / bool,
+    даты и пропуски — помеченными словарями ({"$ts": ...}, {"$nan": true}).
+    """
+    if value is UNSET:
+        return _UNSET_JSON
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if value is pd.NaT:
+        return {"$nat": True}
+    if value is pd.NA:
+        return {"$na": True}
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    elif isinstance(value, np.timedelta64):
+        value = pd.Timedelta(value)
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return {"$ts": pd.Timestamp(value).isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, (pd.Timedelta, timedelta)):
+        return {"$td": pd.Timedelta(value).isoformat()}
+    if isinstance(value, float):
+        if math.isnan(value):
+            return {"$nan": True}
+        if math.isinf(value):
+            return {"$inf": 1 if value > 0 else -1}
+        return value
+    if isinstance(value, int):
+        return value
+    # прочие типы (Decimal, bytes, ...) в таблицах из Excel не встречаются
+    return str(value)
+
+
+_DECODERS = {
+    "$unset": lambda _: UNSET,
+    "$nat": lambda _: pd.NaT,
+    "$na": lambda _: pd.NA,
+    "$nan": lambda _: float("nan"),
+    "$inf": lambda sign: float("inf") * sign,
+    "$ts": pd.Timestamp,
+    "$date": date.fromisoformat,
+    "$td": pd.Timedelta,
+}
+
+
+def _decode(value):
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            (tag, raw), = value.items()
+            if tag in _DECODERS:
+                return _DECODERS[tag](raw)
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+def patch_to_ids(patch: dict, row_ids) -> dict:
+    """Патч core.editing (по позициям) → патч по row id (значения кодирует Journal.record)."""
+    return {
+        "rows": [[int(row_ids[pos]), bool(v)] for pos, v in patch["rows"].items()],
+        "cells": {
+            str(col): [[int(row_ids[pos]), v] for pos, v in cells.items()]
+            for col, cells in patch["cells"].items()
+        },
+        "columns": [[str(col), bool(v)] for col, v in patch["columns"].items()],
+    }
+
+
+def patch_from_ids(patch: dict, index) -> dict:
+    """Обратно: row id → позиции в index (core.row_index.RowIndex); чужие ID пропускаются."""
+    def pos(row_id):
+        return index.position(row_id)
+
+    return {
+        "rows": {pos(r): v for r, v in patch["rows"] if pos(r) is not None},
+        "cells": {
+            col: {pos(r): v for r, v in cells if pos(r) is not None}
+            for col, cells in patch["cells"].items()
+        },
+        "columns": {col: v for col, v in patch["columns"]},
+    }
+
+
+# ===================================================================
+# ЖУРНАЛ (SQLite, WAL)
+# ===================================================================
+
+class Journal:
+    """
+    Журнал операций сессии в SQLite (режим WAL, synchronous=NORMAL:
+    fsync выполняется на контрольных точках WAL, а не на каждой записи).
+
+    Операция — одно действие над таблицей:
+        patch     — патч overlay по row id (что применить);
+        log_start — позиция в log_actions;
+        log_drop  — сколько записей с этой позиции убрать
+                    (нет — обрезать лог до log_start: снимок);
+        logs      — и вставить на их место эти записи;
+        log_tail  — записи лога вне undo, дописанные в конец до операции.
+    Повтор операций по порядку на свежем overlay восстанавливает
+    и таблицу, и лог действий.
+
+    Снимок (snapshot) — операция с base=1: полное состояние правок.
+    Старые операции не удаляются, восстановление начинается
+    с последнего снимка ключа.
+    """
+
+    def __init__(
+        self,
+        path: str = JOURNAL_PATH,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ops (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                base INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ops)")}
+        if "base" not in columns:
+            # журнал, созданный до появления снимков
+            self._conn.execute("ALTER TABLE ops ADD COLUMN base INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ops_session ON ops (session, seq)")
+        self._conn.commit()
+
+    # ---------------------------------------------------------
+    # запись
+    # ---------------------------------------------------------
+    def record(
+        self,
+        key: str,
+        patch: dict,
+        log_start: int,
+        logs: list,
+        base: bool = False,
+        log_drop: int = None,
+        log_tail: list = None,
+    ):
+        op = {"patch": patch, "log_start": log_start, "logs": logs, "base": base}
+        if log_drop is not None:
+            op["log_drop"] = log_drop
+        if log_tail:
+            op["log_tail"] = log_tail
+        payload = json.dumps(
+            _encode(op),
+            ensure_ascii=False,
+            allow_nan=False,
+        )
+        copy_stats.record("journal: операция (JSON)", payload)
+        with self._lock:
+            self._pending.append(
+                (key, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), payload, int(base))
+            )
+            due = (
+                base
+                or len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def snapshot(self, key: str, patch: dict, logs: list):
+        """
+        Снимок состояния ключа: полный патч правок и весь лог. Операции
+        до него остаются в журнале, но при восстановлении не повторяются.
+        """
+        self.record(key, patch, 0, logs, base=True)
+
+    def flush(self):
+        """Записывает накопленные операции одной транзакцией."""
+        with self._lock:
+            if self._pending:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO ops (session, ts, payload, base) VALUES (?, ?, ?, ?)",
+                        self._pending,
+                    )
+                self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    # ---------------------------------------------------------
+    # чтение / восстановление
+    # ---------------------------------------------------------
+    def operations(self, key: str) -> list:
+        """Операции ключа, начиная с последнего снимка."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT payload FROM ops
+                WHERE session = ? AND seq >= COALESCE(
+                    (SELECT MAX(seq) FROM ops WHERE session = ? AND base = 1), 0
+                )
+                ORDER BY seq
+                """,
+                (key, key),
+            ).fetchall()
+        return [_decode(json.loads(payload)) for (payload,) in rows]
+
+    def count(self, key: str) -> int:
+        return len(self.operations(key))
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def replay(operations: list, overlay, logs: list) -> int:
+    """
+    Повторяет операции журнала на overlay (core.editing.EditOverlay)
+    и списке log_actions. Возвращает число применённых операций
+    (пустой снимок не считается).
+    """
+    applied = 0
+    for op in operations:
+        patch = patch_from_ids(op["patch"], overlay.index)
+        # столбцов, которых нет в текущем результате сравнения, не трогаем
+        patch["cells"] = {c: v for c, v in patch["cells"].items() if c in overlay.base.columns}
+        overlay.apply_patch(patch)
+        logs.extend(op.get("log_tail", ()))
+        start, drop = op["log_start"], op.get("log_drop")
+        if drop is None:
+            del logs[start:]
+            logs.extend(op["logs"])
+        else:
+            logs[start:start + drop] = op["logs"]
+        empty = not (patch["rows"] or patch["cells"] or patch["columns"] or op["logs"])
+        if not (op.get("base") and empty):
+            applied += 1
+    return applied
@@ -5,9 +5,29 @@ import streamlit as st
 # ① ОТРИСОВКА UI для сопоставления колонок
 # ===================================================================
 
-def draw_column_mapping_ui(df_old, df_new):
+NO_MATCH = "— Нет соответствия —"
+
+
+def suggested_option(col, options, suggestions):
+    """
+    Индекс предложенного столбца в options и подпись с уверенностью.
+    suggestions: {old_col: (new_col, score) or None} (core.column_profile.best_mapping)
+    """
+
+    label = f"Старый столбец: **{col}**"
+    suggestion = (suggestions or {}).get(col)
+    if suggestion is None or suggestion[0] not in options:
+        return 0, label
+
+    new_col, score = suggestion
+    return options.index(new_col), f"{label} — предложено: *{new_col}* ({score:.0%})"
+
+
+def draw_column_mapping_ui(df_old, df_new, suggestions=None):
     """
     Показывает пользователю интерфейс сопоставления колонок.
+    suggestions — подсказки из core.column_profile.best_mapping:
+    выбор заранее выставляется на предложенный столбец.
     Возвращает dict: {old_col: new_col or None}
     """
 
@@ -24,13 +44,17 @@ def draw_column_mapping_ui(df_old, df_new):
     old_cols = list(df_old.columns)
     new_cols = list(df_new.columns)
 
+    options = [NO_MATCH] + new_cols
+
     for col in old_cols:
+        index, label = suggested_option(col, options, suggestions)
         choice = st.selectbox(
-            f"Старый столбец: **{col}**",
-            options=["— Нет соответствия —"] + new_cols,
+            label,
+            options=options,
+            index=index,
             key=f"map_{col}"
         )
-        mapping[col] = None if choice == "— Нет соответствия —" else choice
+        mapping[col] = None if choice == NO_MATCH else choice
 
     st.success("Сопоставление столбцов завершено!")
 
@@ -126,3 +150,13 @@ def apply_column_mapping(df_old, mapping):
     df = df.rename(columns=rename_map)
 
     return df
+
+
+def mapped_column_names(old_cols, mapping):
+    """
+    Имена столбцов старой таблицы после apply_column_mapping,
+    в том же порядке (без копирования самой таблицы).
+    """
+
+    rename_map = {old: new for old, new in mapping.items() if new is not None}
+    return [rename_map.get(col, col) for col in old_cols]
@@ -0,0 +1,166 @@
+# core/mapping_profiles.py
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from core.utils import file_slug
+
+
+# ===================================================================
+# НАСТРОЙКИ ХРАНИЛИЩА
+# ===================================================================
+
+MAPPING_DIR = os.path.join("data", "mapping_profiles")
+
+_FORMAT = "ajman_mapping_profiles"
+
+
+# ===================================================================
+# ОТПЕЧАТОК СХЕМЫ
+# ===================================================================
+
+def schema_fingerprint(old_cols, new_cols) -> str:
+    """
+    Отпечаток пары схем «старые столбцы → новые столбцы».
+    Порядок столбцов не важен — только их наборы.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    for side in (old_cols, new_cols):
+        for col in sorted(map(str, side)):
+            h.update(col.encode("utf-8") + b"\x00")
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+def _profiles_path(provider: str, root: str) -> str:
+    return os.path.join(root, file_slug(provider) + ".json")
+
+
+def _read_profiles(provider: str, root: str) -> dict:
+    path = _profiles_path(provider, root)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("profiles", {})
+
+
+def _write_profiles(provider: str, profiles: dict, root: str):
+    path = _profiles_path(provider, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"format": _FORMAT, "provider": provider, "profiles": profiles},
+            f, ensure_ascii=False, indent=2,
+        )
+    os.replace(tmp_path, path)
+
+
+# ===================================================================
+# СОХРАНЕНИЕ / ПОИСК
+# ===================================================================
+
+def save_mapping_profile(
+    provider: str,
+    old_cols,
+    new_cols,
+    mapping: dict,
+    root: str = MAPPING_DIR,
+) -> str:
+    """Сохраняет mapping {old_col: new_col or None} для этой пары схем."""
+
+    fingerprint = schema_fingerprint(old_cols, new_cols)
+    profiles = _read_profiles(provider, root)
+    profiles[fingerprint] = {
+        "old_columns": [str(c) for c in old_cols],
+        "new_columns": [str(c) for c in new_cols],
+        "mapping": {str(k): v for k, v in mapping.items()},
+        "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    _write_profiles(provider, profiles, root)
+    return fingerprint
+
+
+def load_mapping_profile(provider: str, old_cols, new_cols, root: str = MAPPING_DIR):
+    """
+    Сохранённый mapping для этой пары схем или None.
+    Профиль применяется, только если он покрывает все старые столбцы
+    и ссылается лишь на существующие новые.
+    """
+
+    profile = _read_profiles(provider, root).get(schema_fingerprint(old_cols, new_cols))
+    if profile is None:
+        return None
+
+    saved = profile["mapping"]
+    new_set = set(map(str, new_cols))
+    if set(saved) != set(map(str, old_cols)):
+        return None
+    if any(v is not None and v not in new_set for v in saved.values()):
+        return None
+
+    return {col: saved[str(col)] for col in old_cols}
+
+
+def delete_mapping_profile(provider: str, old_cols, new_cols, root: str = MAPPING_DIR) -> bool:
+    profiles = _read_profiles(provider, root)
+    if profiles.pop(schema_fingerprint(old_cols, new_cols), None) is None:
+        return False
+    _write_profiles(provider, profiles, root)
+    return True
+
+
+# ===================================================================
+# ЭКСПОРТ / ИМПОРТ
+# ===================================================================
+
+def export_mapping_profiles(provider: str, root: str = MAPPING_DIR) -> bytes:
+    """Все профили провайдера одним JSON-файлом (для download_button)."""
+    payload = {"format": _FORMAT, "provider": provider, "profiles": _read_profiles(provider, root)}
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _validate_profile(profile):
+    """Профиль из файла: словарь со списками столбцов и mapping {str: str | None}."""
+    if not isinstance(profile, dict):
+        raise ValueError("Профиль сопоставления должен быть объектом")
+    for key in ("old_columns", "new_columns"):
+        columns = profile.get(key)
+        if not isinstance(columns, list) or not all(isinstance(c, str) for c in columns):
+            raise ValueError(f"В профиле нет списка столбцов {key}")
+    mapping = profile.get("mapping")
+    if not isinstance(mapping, dict) or not all(
+        v is None or isinstance(v, str) for v in mapping.values()
+    ):
+        raise ValueError("В профиле нет корректного mapping")
+
+
+def import_mapping_profiles(provider: str, data: bytes, root: str = MAPPING_DIR) -> int:
+    """
+    Добавляет профили из файла export_mapping_profiles (одинаковые
+    отпечатки перезаписываются). Возвращает число импортированных профилей.
+    """
+
+    # битый JSON / не UTF-8 — тоже ValueError (JSONDecodeError, UnicodeDecodeError)
+    payload = json.loads(data.decode("utf-8"))
+    if not isinstance(payload, dict) or payload.get("format") != _FORMAT:
+        raise ValueError("Файл не является экспортом профилей сопоставления")
+
+    profiles_in = payload.get("profiles", {})
+    if not isinstance(profiles_in, dict):
+        raise ValueError("В файле нет списка профилей")
+
+    imported = {}
+    for profile in profiles_in.values():
+        _validate_profile(profile)
+        # отпечаток пересчитываем, а не доверяем файлу
+        fingerprint = schema_fingerprint(profile["old_columns"], profile["new_columns"])
+        imported[fingerprint] = profile
+
+    profiles = _read_profiles(provider, root)
+    profiles.update(imported)
+    _write_profiles(provider, profiles, root)
+    return len(imported)
@@ -1,6 +1,11 @@
 import pandas as pd
 import numpy as np
 
+from core.changeset import ChangeSet
+from core.fingerprint import column_hashes, row_fingerprints
+from core.normalize import canonical_changed, canonicalize_column, is_default_rule, resolve_rule
+from core.utils import normalize_compare_column
+
 
 # ===================================================================
 # ① Определение статуса строки + список изменённых колонок
@@ -47,16 +52,258 @@ def detect_row_changes(row, common_cols):
     return "not_changed", None
 
 
+# ===================================================================
+# ② Векторное сравнение: матрица изменений по столбцам
+# ===================================================================
+
+def compare_columns(old_values: pd.Series, new_values: pd.Series) -> np.ndarray:
+    """
+    Булев вектор «ячейка изменилась» для пары old_/new_ столбцов.
+    Семантика совпадает с safe_equals: два пустых значения равны,
+    иначе сравниваются str(x).strip().
+    """
+
+    old_text, old_na = normalize_compare_column(old_values)
+    new_text, new_na = normalize_compare_column(new_values)
+
+    return ~(old_na & new_na) & (old_text != new_text)
+
+
+def compute_change_matrix(merged: pd.DataFrame, common_cols, rows=None, rules=None) -> np.ndarray:
+    """
+    Матрица (строки × common_cols): True там, где значение изменилось.
+    Для строк, которые есть только в одной таблице, все значения False.
+
+    rows — позиции строк, которые нужно реально сравнить;
+    остальные строки считаются неизменёнными (см. отпечатки строк).
+    rules — правила сравнения по столбцам (core.normalize); без них
+    сравнение идёт по семантике safe_equals.
+    """
+
+    both = (merged["_merge"] == "both").to_numpy()
+    matrix = np.zeros((len(merged), len(common_cols)), dtype=bool)
+
+    if rows is None:
+        rows = np.arange(len(merged))
+    if len(rows) == 0:
+        return matrix
+
+    for j, col in enumerate(common_cols):
+        old_values = merged[f"old_{col}"].iloc[rows]
+        new_values = merged[f"new_{col}"].iloc[rows]
+
+        rule = resolve_rule(rules, col)
+        if is_default_rule(rule):
+            matrix[rows, j] = compare_columns(old_values, new_values)
+        else:
+            matrix[rows, j] = canonical_changed(
+                canonicalize_column(old_values, rule),
+                canonicalize_column(new_values, rule),
+                rule,
+            )
+
+    matrix &= both[:, None]
+    return matrix
+
+
+def summarize_changes(merge_indicator: pd.Series, change_matrix: np.ndarray, common_cols):
+    """
+    Из индикатора _merge и матрицы изменений строит:
+        statuses        — deleted / new / changed / not_changed
+        changed columns — имена изменённых столбцов через ", " или None
+    """
+
+    indicator = merge_indicator.to_numpy(dtype=object)
+    any_changed = change_matrix.any(axis=1)
+
+    statuses = np.select(
+        [indicator == "left_only", indicator == "right_only", any_changed],
+        ["deleted", "new", "changed"],
+        default="not_changed",
+    ).astype(object)
+
+    # склеиваем имена столбцов по столбцам, а не по строкам
+    joined = np.full(len(indicator), "", dtype=object)
+    for j, col in enumerate(common_cols):
+        mask = change_matrix[:, j]
+        if not mask.any():
+            continue
+        prefix = np.where(joined[mask] == "", "", ", ").astype(object)
+        joined[mask] = joined[mask] + prefix + str(col)
+
+    changed = np.where(any_changed, joined, None)
+
+    return statuses, changed
+
+
+# ===================================================================
+# ③ Объединение строк по ключу
+# ===================================================================
+
+OLD_KEY = "old_Activity Master Number"
+NEW_KEY = "new_Activity Master Number"
+
+
+def build_key_index(keys: pd.Series, order: pd.Series = None):
+    """
+    Индекс ключа за один хэш-проход (pd.factorize).
+
+    Возвращает:
+        occurrence — номер вхождения строки внутри своего ключа (0, 1, 2, ...);
+                     порядок — порядок строк в файле или, если задан order,
+                     порядок значений order (tie-breaker)
+        report     — dict: rows, unique_keys, null_keys,
+                     duplicate_keys, duplicate_rows, top_duplicates
+    """
+
+    n = len(keys)
+    codes, uniques = pd.factorize(keys.to_numpy(dtype=object))
+    null = codes == -1
+
+    counts = np.bincount(codes[~null], minlength=len(uniques))
+
+    # группируем строки по ключу (стабильно), внутри — по tie-breaker
+    if order is None:
+        perm = np.argsort(codes, kind="stable")
+    else:
+        order_rank, _ = pd.factorize(order.astype(str).to_numpy(dtype=object), sort=True)
+        perm = np.lexsort((order_rank, codes))
+
+    sorted_codes = codes[perm]
+    starts = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]] if n else np.zeros(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0)) if n else starts
+    occurrence = np.empty(n, dtype=np.int64)
+    occurrence[perm] = np.arange(n) - group_start
+
+    dup = np.flatnonzero(counts > 1)
+    top = dup[np.argsort(-counts[dup], kind="stable")][:10]
+
+    report = {
+        "rows": int(n),
+        "unique_keys": int(len(uniques)),
+        "null_keys": int(null.sum()),
+        "duplicate_keys": int(len(dup)),
+        "duplicate_rows": int(counts[dup].sum()),
+        "top_duplicates": [(uniques[i], int(counts[i])) for i in top],
+    }
+
+    return occurrence, report
+
+
+def join_positions(
+    old_keys: pd.Series,
+    new_keys: pd.Series,
+    old_order: pd.Series = None,
+    new_order: pd.Series = None,
+    match_null_keys: bool = False,
+):
+    """
+    Outer join один-к-одному только по ключам.
+
+    Повторяющиеся ключи сопоставляются по номеру вхождения
+    (1-е со 1-м, 2-е со 2-м, ...), а не декартовым произведением,
+    поэтому результат не длиннее len(old) + len(new).
+    Строки с пустым ключом по умолчанию ни с чем не сопоставляются
+    и попадают в конец как left_only / right_only.
+
+    Возвращает:
+        old_pos, new_pos — позиции строк в df_old / df_new (-1, если строки нет)
+        indicator        — категориальный _merge (left_only / right_only / both)
+        key_report       — {"old": report, "new": report} из build_key_index
+    Для уникальных ключей порядок строк такой же, как у DataFrame.merge(how="outer").
+    """
+
+    old_occ, old_report = build_key_index(old_keys, old_order)
+    new_occ, new_report = build_key_index(new_keys, new_order)
+
+    left = pd.DataFrame({
+        "key": old_keys.to_numpy(dtype=object),
+        "occ": old_occ,
+        "_old_pos": np.arange(len(old_keys)),
+    })
+    right = pd.DataFrame({
+        "key": new_keys.to_numpy(dtype=object),
+        "occ": new_occ,
+        "_new_pos": np.arange(len(new_keys)),
+    })
+
+    if match_null_keys:
+        left_null = right_null = None
+    else:
+        left_null = left[left["key"].isna()]
+        right_null = right[right["key"].isna()]
+        left = left[left["key"].notna()]
+        right = right[right["key"].notna()]
+
+    joined = left.merge(right, on=["key", "occ"], how="outer", indicator=True)
+
+    old_pos = joined["_old_pos"].fillna(-1).to_numpy(dtype=np.int64)
+    new_pos = joined["_new_pos"].fillna(-1).to_numpy(dtype=np.int64)
+    indicator = joined["_merge"].to_numpy(dtype=object)
+    categories = joined["_merge"].cat.categories
+
+    if left_null is not None:
+        old_pos = np.concatenate([
+            old_pos,
+            left_null["_old_pos"].to_numpy(),
+            np.full(len(right_null), -1),
+        ])
+        new_pos = np.concatenate([
+            new_pos,
+            np.full(len(left_null), -1),
+            right_null["_new_pos"].to_numpy(),
+        ])
+        indicator = np.concatenate([
+            indicator,
+            np.full(len(left_null), "left_only", dtype=object),
+            np.full(len(right_null), "right_only", dtype=object),
+        ])
+
+    indicator = pd.Series(pd.Categorical(indicator, categories=categories), name="_merge")
+
+    return old_pos, new_pos, indicator, {"old": old_report, "new": new_report}
+
+
+def _take_rows(df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    """Строки df по позициям; для -1 — строка из NaN (как в outer merge)."""
+    taken = df.reset_index(drop=True).reindex(positions)
+    taken.index = pd.RangeIndex(len(positions))
+    return taken
+
+
+def _side_fingerprints(df: pd.DataFrame, hashes, columns) -> np.ndarray:
+    if hashes is None or any(c not in hashes.columns for c in columns):
+        hashes = column_hashes(df[columns])
+    return row_fingerprints(hashes, columns)
+
 
 # ===================================================================
-# ② Основная функция: объединение + сравнение
+# ④ Основная функция: объединение + сравнение
 # ===================================================================
 
-def merge_and_compare(df_old, df_new):
+def merge_and_compare(
+    df_old,
+    df_new,
+    old_hashes=None,
+    new_hashes=None,
+    return_changes=False,
+    tie_breaker=None,
+    rules=None,
+):
     """
     Принимает:
         df_old — таблица со старым именованием столбцов (уже переименованная)
         df_new — таблица с новыми данными
+        old_hashes, new_hashes — (необязательно) заранее посчитанные
+            хэши ячеек (core.fingerprint.column_hashes) с теми же
+            именами столбцов, что и df_old / df_new. Например, хэши
+            старой версии, сохранённые вместе со снапшотом.
+        return_changes — вернуть ещё и core.changeset.ChangeSet
+        tie_breaker — столбец (без префикса), по которому упорядочиваются
+            строки с одинаковым Activity Master Number перед сопоставлением
+            один-к-одному; по умолчанию — порядок строк в файле
+        rules — правила сравнения по столбцам (core.normalize.resolve_rule):
+            регистр, пробелы, даты, числовой допуск
 
     Оба датафрейма должны быть подготовлены:
         df_old = df_old_renamed.add_prefix("old_")
@@ -69,19 +316,24 @@ def merge_and_compare(df_old, df_new):
             _merge
             old_*
             new_*
+        (merged_df, ChangeSet), если return_changes=True
+
+    Отчёт о дублях и пустых ключах лежит в merged_df.attrs["key_report"].
     """
 
     # ---------------------------------------------------
     # Объединение по Activity Master Number
     # ---------------------------------------------------
 
-    merged = df_old.merge(
-        df_new,
-        left_on="old_Activity Master Number",
-        right_on="new_Activity Master Number",
-        how="outer",
-        indicator=True
+    old_order = new_order = None
+    if tie_breaker is not None:
+        old_order, new_order = df_old[f"old_{tie_breaker}"], df_new[f"new_{tie_breaker}"]
+
+    old_pos, new_pos, indicator, key_report = join_positions(
+        df_old[OLD_KEY], df_new[NEW_KEY], old_order, new_order
     )
+    merged = pd.concat([_take_rows(df_old, old_pos), _take_rows(df_new, new_pos)], axis=1)
+    merged["_merge"] = indicator
 
     # ---------------------------------------------------
     # Список реально общих колонок (по смыслу)
@@ -96,16 +348,26 @@ def merge_and_compare(df_old, df_new):
     ]
 
     # ---------------------------------------------------
-    # Определяем статус строки + изменённые колонки
+    # Отпечатки строк: одинаковые строки сразу not_changed,
+    # по столбцам сравниваем только строки с разными отпечатками
     # ---------------------------------------------------
 
-    statuses = []
-    changed_list = []
+    fp_old = _side_fingerprints(df_old, old_hashes, [f"old_{c}" for c in common_cols])
+    fp_new = _side_fingerprints(df_new, new_hashes, [f"new_{c}" for c in common_cols])
 
-    for _, row in merged.iterrows():
-        s, ch = detect_row_changes(row, common_cols)
-        statuses.append(s)
-        changed_list.append(ch)
+    both = (indicator == "both").to_numpy()
+    candidates = both.copy()
+    candidates[both] = fp_old[old_pos[both]] != fp_new[new_pos[both]]
+
+    # ---------------------------------------------------
+    # Определяем статус строки + изменённые колонки
+    # (по столбцам целиком, без цикла по строкам)
+    # ---------------------------------------------------
+
+    change_matrix = compute_change_matrix(
+        merged, common_cols, rows=np.flatnonzero(candidates), rules=rules
+    )
+    statuses, changed_list = summarize_changes(merged["_merge"], change_matrix, common_cols)
 
     merged["status"] = statuses
     merged["changed columns"] = changed_list
@@ -122,4 +384,8 @@ def merge_and_compare(df_old, df_new):
     merged.insert(0, "status", status_col)
     merged.insert(1, "_merge", merge_col)
 
+    merged.attrs["key_report"] = key_report
+
+    if return_changes:
+        return merged, ChangeSet.from_matrix(change_matrix, common_cols)
     return merged
@@ -0,0 +1,122 @@
+# core/normalize.py
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from core.utils import normalize_compare_column
+
+
+# ===================================================================
+# ПРАВИЛА СРАВНЕНИЯ
+# ===================================================================
+
+# правило по умолчанию = текущая семантика safe_equals: str(x).strip()
+DEFAULT_RULE = {
+    "fold_whitespace": False,    # переносы строк и повторные пробелы → один пробел
+    "casefold": False,           # без учёта регистра
+    "dates": False,              # '2020-01-01', '01.01.2020', datetime → одна дата
+    "numeric_tolerance": None,   # 1 == 1.0; |a - b| <= tolerance
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def resolve_rule(rules, col) -> dict:
+    """
+    rules: {столбец: {...}, "*": {...}} — правило столбца дополняет "*",
+    а "*" дополняет DEFAULT_RULE.
+    """
+    rule = dict(DEFAULT_RULE)
+    if rules:
+        rule.update(rules.get("*", {}))
+        rule.update(rules.get(col, {}))
+    return rule
+
+
+def rule_key(rule: dict) -> tuple:
+    """Хэшируемый ключ правила (для кэшей)."""
+    return tuple(sorted(rule.items()))
+
+
+def is_default_rule(rule: dict) -> bool:
+    return rule_key(rule) == rule_key(DEFAULT_RULE)
+
+
+# ===================================================================
+# КАНОНИЧЕСКАЯ ФОРМА СТОЛБЦА
+# ===================================================================
+
+def canonicalize_column(values: pd.Series, rule: dict = None) -> dict:
+    """
+    Считает каноническую форму столбца один раз:
+        text — нормализованный текст (object ndarray)
+        isna — маска пустых значений
+        num  — float-значения для numeric_tolerance (иначе None)
+
+    Два значения равны, если оба пустые или совпадают их канонические
+    формы (см. canonical_changed). С DEFAULT_RULE это ровно safe_equals.
+    """
+
+    rule = rule or DEFAULT_RULE
+    text, isna = normalize_compare_column(values)
+
+    if rule["fold_whitespace"] or rule["casefold"] or rule["dates"]:
+        series = pd.Series(text, dtype=object)
+
+        if rule["fold_whitespace"]:
+            series = series.str.replace("\r", "", regex=False)
+            series = series.str.replace(_WHITESPACE_RE, " ", regex=True)
+
+        if rule["dates"]:
+            # ISO (2020-01-02) разбираем как есть, остальное — день первым (02.01.2020)
+            iso = series.str.match(r"^\d{4}-\d{2}-\d{2}").fillna(False).to_numpy(dtype=bool)
+            parsed = pd.to_datetime(series.where(iso), errors="coerce", format="mixed")
+            parsed = parsed.fillna(
+                pd.to_datetime(series.where(~iso), errors="coerce", format="mixed", dayfirst=True)
+            )
+            ok = parsed.notna().to_numpy() & ~isna
+            as_text = parsed.dt.strftime("%Y-%m-%d %H:%M:%S").str.replace(" 00:00:00", "", regex=False)
+            series = series.where(~ok, as_text)
+
+        if rule["casefold"]:
+            series = series.str.casefold()
+
+        text = series.to_numpy(dtype=object)
+
+    num = None
+    if rule["numeric_tolerance"] is not None:
+        num = pd.to_numeric(pd.Series(text, dtype=object), errors="coerce").to_numpy(dtype=float, copy=True)
+        num[isna] = np.nan
+
+    return {"text": text, "isna": isna, "num": num}
+
+
+def canonical_changed(old: dict, new: dict, rule: dict = None, old_idx=None, new_idx=None) -> np.ndarray:
+    """
+    Булев вектор «значение изменилось» по каноническим формам.
+    old_idx / new_idx — позиции строк (выравнивание по join);
+    по умолчанию сравниваются массивы целиком.
+    """
+
+    rule = rule or DEFAULT_RULE
+
+    def take(canon, idx, name):
+        arr = canon[name]
+        return arr if idx is None or arr is None else arr[idx]
+
+    old_text, new_text = take(old, old_idx, "text"), take(new, new_idx, "text")
+    old_na, new_na = take(old, old_idx, "isna"), take(new, new_idx, "isna")
+
+    changed = ~(old_na & new_na) & (old_text != new_text)
+
+    tolerance = rule["numeric_tolerance"]
+    if tolerance is not None:
+        old_num, new_num = take(old, old_idx, "num"), take(new, new_idx, "num")
+        numeric = ~np.isnan(old_num) & ~np.isnan(new_num)
+        close = np.zeros(len(changed), dtype=bool)
+        close[numeric] = np.abs(old_num[numeric] - new_num[numeric]) <= tolerance
+        changed &= ~close
+
+    return changed
@@ -0,0 +1,111 @@
+# core/parallel_compare.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.changeset import ChangeSet
+from core.merge_compare import NEW_KEY, OLD_KEY, merge_and_compare
+from core.streaming_compare import key_partitions
+
+
+# меньше этого числа строк (old + new) пул процессов не окупается:
+# передача частей в процессы дороже самого сравнения
+PARALLEL_MIN_ROWS = 50_000
+
+
+def _compare_partition(df_old, df_new, old_hashes, new_hashes, tie_breaker, rules):
+    return merge_and_compare(
+        df_old,
+        df_new,
+        old_hashes,
+        new_hashes,
+        return_changes=True,
+        tie_breaker=tie_breaker,
+        rules=rules,
+    )
+
+
+def _merge_key_reports(reports):
+    """Складывает отчёты build_key_index по частям (ключ живёт в одной части)."""
+    total = {
+        "rows": 0,
+        "unique_keys": 0,
+        "null_keys": 0,
+        "duplicate_keys": 0,
+        "duplicate_rows": 0,
+        "top_duplicates": [],
+    }
+    for rep in reports:
+        for name in ("rows", "unique_keys", "null_keys", "duplicate_keys", "duplicate_rows"):
+            total[name] += rep[name]
+        total["top_duplicates"].extend(rep["top_duplicates"])
+
+    total["top_duplicates"] = sorted(total["top_duplicates"], key=lambda kv: -kv[1])[:10]
+    return total
+
+
+def parallel_merge_and_compare(
+    df_old,
+    df_new,
+    old_hashes=None,
+    new_hashes=None,
+    return_changes=False,
+    tie_breaker=None,
+    rules=None,
+    workers: int = None,
+    min_rows: int = PARALLEL_MIN_ROWS,
+):
+    """
+    То же, что merge_and_compare, но части таблиц (по хэшу
+    Activity Master Number) сравниваются в ProcessPoolExecutor.
+
+    workers  — число процессов (по умолчанию os.cpu_count())
+    min_rows — для входа меньше этого размера сравнение идёт
+               в текущем процессе обычным merge_and_compare
+
+    Строки результата идут по частям (0, 1, ...), внутри части —
+    как у merge_and_compare. Порядок детерминирован, но отличается
+    от однопроцессного варианта.
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(df_old) + len(df_new) < min_rows:
+        return merge_and_compare(
+            df_old, df_new, old_hashes, new_hashes,
+            return_changes=return_changes, tie_breaker=tie_breaker, rules=rules,
+        )
+
+    n_partitions = workers
+    old_parts = key_partitions(df_old[OLD_KEY], n_partitions)
+    new_parts = key_partitions(df_new[NEW_KEY], n_partitions)
+
+    def _slice(df, parts, p):
+        return None if df is None else df[parts == p]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _compare_partition,
+                _slice(df_old, old_parts, p),
+                _slice(df_new, new_parts, p),
+                _slice(old_hashes, old_parts, p),
+                _slice(new_hashes, new_parts, p),
+                tie_breaker,
+                rules,
+            )
+            for p in range(n_partitions)
+        ]
+        results = [f.result() for f in futures]
+
+    merged = pd.concat([m for m, _ in results], ignore_index=True)
+    merged.attrs["key_report"] = {
+        side: _merge_key_reports(m.attrs["key_report"][side] for m, _ in results)
+        for side in ("old", "new")
+    }
+
+    if return_changes:
+        return merged, ChangeSet.concat(c for _, c in results)
+    return merged
@@ -0,0 +1,108 @@
+# core/pipeline.py
+
+import hashlib
+import time
+import uuid
+
+import pandas as pd
+
+
+# ===================================================================
+# ТОКЕНЫ ПАРАМЕТРОВ
+# ===================================================================
+
+def _freeze(obj):
+    """Параметры этапа → неизменяемая структура с устойчивым repr."""
+    if isinstance(obj, dict):
+        return tuple(sorted((repr(k), _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    if isinstance(obj, (set, frozenset)):
+        return tuple(sorted(repr(v) for v in obj))
+    return repr(obj)
+
+
+def _digest(*parts) -> str:
+    return hashlib.blake2b(repr(_freeze(parts)).encode("utf-8"), digest_size=12).hexdigest()
+
+
+# ===================================================================
+# МЕМОИЗИРОВАННЫЙ КОНВЕЙЕР
+# ===================================================================
+
+class Pipeline:
+    """
+    Явный конвейер этапов app.py поверх словаря в session_state.
+
+    У каждого этапа есть токен:
+      - source(name, fn): токен меняется, только когда fn вернула
+        другой объект (кэши отдают тот же объект — токен прежний);
+      - run(name, fn, deps, params): токен = хэш токенов зависимостей
+        и параметров. Если он совпал с прошлым запуском — fn не
+        вызывается, берётся сохранённое значение.
+
+    Изменение этапа меняет токены только у этапов ниже по течению,
+    поэтому, например, смена фильтра не пересчитывает сравнение.
+
+    Значения этапов нельзя изменять на месте — только заменять.
+    """
+
+    def __init__(self, store: dict):
+        # name → {"token", "value"}; по одной (последней) записи на этап
+        self._store = store
+        self._tokens = {}
+        self.records = []
+
+    def token(self, name) -> str:
+        return self._tokens[name]
+
+    def is_fresh(self, name) -> bool:
+        """Был ли этап пересчитан в этом запуске."""
+        for rec in reversed(self.records):
+            if rec["stage"] == name:
+                return not rec["cache_hit"]
+        return False
+
+    def _record(self, name, hit: bool, started: float):
+        self.records.append({
+            "stage": name,
+            "cache_hit": hit,
+            "seconds": round(time.perf_counter() - started, 4),
+            "token": self._tokens[name],
+        })
+
+    def source(self, name, fn):
+        """Входной этап: значение берётся всегда, токен — по его идентичности."""
+        started = time.perf_counter()
+        value = fn()
+
+        entry = self._store.get(name)
+        hit = entry is not None and entry["value"] is value
+        if not hit:
+            # прошлое значение держится в store, поэтому совпадение по `is`
+            # не может быть ложным из-за повторно выданного id
+            entry = {"token": uuid.uuid4().hex, "value": value}
+            self._store[name] = entry
+
+        self._tokens[name] = entry["token"]
+        self._record(name, hit, started)
+        return value
+
+    def run(self, name, fn, deps=(), params=None):
+        """Этап fn() — пересчитывается, только если изменились deps или params."""
+        started = time.perf_counter()
+        token = _digest(name, [self._tokens[d] for d in deps], params)
+
+        entry = self._store.get(name)
+        hit = entry is not None and entry["token"] == token
+        if not hit:
+            entry = {"token": token, "value": fn()}
+            self._store[name] = entry
+
+        self._tokens[name] = token
+        self._record(name, hit, started)
+        return entry["value"]
+
+    def report(self) -> pd.DataFrame:
+        """Этапы этого запуска: время и попадание в кэш."""
+        return pd.DataFrame(self.records, columns=["stage", "cache_hit", "seconds", "token"])
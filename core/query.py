@@ -0,0 +1,263 @@
+# core/query.py
+
+import numpy as np
+import pandas as pd
+
+from core import copy_stats
+
+
+STATUS_COL = "status"
+CHANGED_COL = "changed columns"
+
+# разделитель имён в "changed columns" (см. core.merge_compare.summarize_changes)
+_CHANGED_SEP = ", "
+
+# разделитель столбцов в тексте строки для поиска (в данных не встречается)
+_TEXT_SEP = "\x1f"
+
+
+# ===================================================================
+# ПРЕДСТАВЛЕНИЕ: СТРОКИ И СТОЛБЦЫ БЕЗ КОПИИ ТАБЛИЦЫ
+# ===================================================================
+
+class RowView:
+    """
+    Выборка из таблицы TableQuery: позиции строк и список столбцов.
+    Сама таблица не копируется — строки собираются только в frame()
+    и только те, что запрошены (например, одна страница грида).
+    """
+
+    def __init__(self, query: "TableQuery", positions: np.ndarray, columns=None):
+        self.query = query
+        self.positions = positions
+        self.columns = list(query.df.columns) if columns is None else list(columns)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def row_ids(self) -> pd.Index:
+        return self.query.df.index[self.positions]
+
+    def with_columns(self, columns) -> "RowView":
+        """Та же выборка строк, другие видимые столбцы (порядок — как в таблице)."""
+        wanted = set(columns)
+        return RowView(self.query, self.positions, [c for c in self.query.df.columns if c in wanted])
+
+    def frame(self, positions: np.ndarray = None) -> pd.DataFrame:
+        """
+        Строки выборки как DataFrame (индекс — row id).
+        positions — позиции в исходной таблице (по умолчанию все строки выборки).
+        """
+        df = self.query.df
+        positions = self.positions if positions is None else positions
+        return copy_stats.record(
+            "view: строки выборки", df.iloc[positions, df.columns.get_indexer(self.columns)]
+        )
+
+
+# ===================================================================
+# ИНДЕКСЫ ПО РЕЗУЛЬТАТУ СРАВНЕНИЯ
+# ===================================================================
+
+class TableQuery:
+    """
+    Серверные фильтры и сортировка по таблице (результат сравнения
+    с правками, индекс — row id).
+
+      - по статусу — позиции строк каждого статуса, считаются сразу;
+      - inverted index «значение → позиции» по столбцу, для
+        "changed columns" — по каждому имени из списка;
+      - сортировка — ранги значений столбца, сортировка выборки
+        сводится к argsort целых чисел;
+      - поиск — текст строк (без регистра) по набору столбцов.
+
+    Все индексы, кроме статусов, строятся лениво, при первом запросе
+    по столбцу, и живут, пока живёт таблица: новая версия таблицы —
+    новый TableQuery. Таблицу менять нельзя.
+
+    changed_columns — имена сравниваемых столбцов (ChangeSet.columns):
+    по ним "changed columns" разбирается на имена, даже если в имени
+    есть ", " ("Цена, руб"). Без списка строка просто делится по ", ".
+    """
+
+    def __init__(self, df: pd.DataFrame, changed_columns=None):
+        self.df = df
+        self._changed_columns = None if changed_columns is None else {str(c) for c in changed_columns}
+        self._all = np.arange(len(df))
+        self._inverted = {}
+        self._ranks = {}
+        self._text = {}
+
+        self._status = {}
+        if STATUS_COL in df.columns:
+            statuses = df[STATUS_COL].astype(object).to_numpy()
+            self._status = dict(pd.Series(statuses).groupby(statuses, sort=False).indices)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    # ---------------------------------------------------------
+    # статусы
+    # ---------------------------------------------------------
+    def status_rows(self, status) -> np.ndarray:
+        """Позиции строк статуса (status="all" или None — все строки)."""
+        if status in (None, "all"):
+            return self._all
+        return self._status.get(status, np.zeros(0, dtype=np.intp))
+
+    def status_counts(self) -> dict:
+        return {status: len(positions) for status, positions in self._status.items()}
+
+    # ---------------------------------------------------------
+    # inverted index
+    # ---------------------------------------------------------
+    def _changed_names(self, value: str) -> list:
+        """
+        "a, b" → ["a", "b"]. С известными столбцами части склеиваются
+        обратно в самое длинное известное имя ("Цена, руб, b" → ["Цена, руб", "b"]).
+        """
+        parts = value.split(_CHANGED_SEP)
+        known = self._changed_columns
+        if not known:
+            return parts
+        names, i = [], 0
+        while i < len(parts):
+            j = next(
+                (j for j in range(len(parts), i + 1, -1) if _CHANGED_SEP.join(parts[i:j]) in known),
+                i + 1,
+            )
+            names.append(_CHANGED_SEP.join(parts[i:j]))
+            i = j
+        return names
+
+    def _inverted_index(self, col) -> dict:
+        if col not in self._inverted:
+            values = self.df[col].astype(object).to_numpy()
+            if col == CHANGED_COL:
+                # многозначный столбец: "a, b" → строка попадает и в a, и в b;
+                # различных строк мало — каждая разбирается один раз
+                parsed = {}
+                for v in pd.unique(values):
+                    parsed[v] = self._changed_names(v) if isinstance(v, str) and v else []
+                lists = [parsed.get(v, []) for v in values]
+                lengths = np.fromiter((len(x) for x in lists), dtype=np.intp, count=len(lists))
+                positions = np.repeat(self._all, lengths)
+                flat = np.array([name for x in lists for name in x], dtype=object)
+            else:
+                notna = ~pd.isna(values)
+                positions, flat = self._all[notna], values[notna]
+            # значения столбца могут быть разных типов (числа, даты, текст) —
+            # группируем без сравнения значений, а упорядочиваем по тексту
+            codes, uniques = pd.factorize(flat)
+            perm = np.argsort(codes, kind="stable")
+            bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+            groups = np.split(positions[perm], bounds)
+            order = sorted(range(len(uniques)), key=lambda i: str(uniques[i]))
+            self._inverted[col] = {uniques[i]: groups[i] for i in order}
+        return self._inverted[col]
+
+    def values(self, col) -> list:
+        """Значения столбца, по которым можно фильтровать (для "changed columns" — имена)."""
+        if col not in self.df.columns:
+            return []
+        return list(self._inverted_index(col))
+
+    def rows_with(self, col, values) -> np.ndarray:
+        """Позиции строк, где в столбце col есть любое из values (по возрастанию)."""
+        if col not in self.df.columns:
+            return np.zeros(0, dtype=np.intp)
+        index = self._inverted_index(col)
+        parts = [index[v] for v in values if v in index]
+        if not parts:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(parts))
+
+    # ---------------------------------------------------------
+    # поиск
+    # ---------------------------------------------------------
+    def _row_text(self, columns) -> np.ndarray:
+        key = tuple(columns)
+        if key not in self._text:
+            parts = []
+            for col in columns:
+                values = self.df[col]
+                text = values.astype(object).map(str).to_numpy(dtype=object)
+                text[values.isna().to_numpy()] = ""
+                parts.append(text)
+            if parts:
+                joined = parts[0]
+                for text in parts[1:]:
+                    joined = joined + _TEXT_SEP + text
+                joined = pd.Series(joined, dtype=object).str.casefold().to_numpy(dtype=object)
+            else:
+                joined = np.full(len(self.df), "", dtype=object)
+            # держим текст только для последнего набора столбцов
+            self._text = {key: joined}
+        return self._text[key]
+
+    def search(self, text: str, positions: np.ndarray = None, columns=None) -> np.ndarray:
+        """Позиции (из positions), где text — подстрока (без регистра) хоть одного столбца."""
+        positions = self._all if positions is None else positions
+        if not text:
+            return positions
+        needle = text.casefold()
+        if _TEXT_SEP in needle:
+            return positions[:0]
+        columns = list(self.df.columns) if columns is None else list(columns)
+        row_text = self._row_text(columns)[positions]
+        mask = np.fromiter((needle in t for t in row_text), dtype=bool, count=len(row_text))
+        return positions[mask]
+
+    # ---------------------------------------------------------
+    # сортировка
+    # ---------------------------------------------------------
+    def _rank(self, col) -> np.ndarray:
+        """Плотные ранги значений столбца; пустые — NaN."""
+        if col not in self._ranks:
+            values = self.df[col]
+            num = pd.to_numeric(values, errors="coerce")
+            # числа сортируем как числа, всё остальное — как текст без регистра
+            if num.notna().sum() == values.notna().sum():
+                keys = num
+            else:
+                keys = values.astype(object).map(lambda v: v if pd.isna(v) else str(v).casefold())
+            self._ranks[col] = keys.rank(method="dense").to_numpy(dtype=float)
+        return self._ranks[col]
+
+    def sort(self, positions: np.ndarray, col, descending: bool = False) -> np.ndarray:
+        """positions, упорядоченные по столбцу col (стабильно, пустые — в конце)."""
+        if col is None or col not in self.df.columns:
+            return positions
+        rank = self._rank(col)[positions]
+        key = -rank if descending else rank
+        key = np.where(np.isnan(key), np.inf, key)
+        return positions[np.argsort(key, kind="stable")]
+
+    # ---------------------------------------------------------
+    # комбинированный запрос
+    # ---------------------------------------------------------
+    def select(
+        self,
+        status=None,
+        changed_in=(),
+        text: str = "",
+        sort_col=None,
+        descending: bool = False,
+        columns=None,
+    ) -> RowView:
+        """
+        Строки, удовлетворяющие всем условиям сразу:
+            status     — статус строки ("all" / None — любой);
+            changed_in — в "changed columns" есть любой из этих столбцов;
+            text       — подстрока в любом из columns.
+        Возвращает RowView (позиции + столбцы), таблица не копируется.
+        """
+        positions = self.status_rows(status)
+        if changed_in:
+            positions = np.intersect1d(
+                positions, self.rows_with(CHANGED_COL, changed_in), assume_unique=True
+            )
+        positions = self.search(text, positions, columns)
+        positions = self.sort(positions, sort_col, descending)
+        return RowView(self, positions, columns)
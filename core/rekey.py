@@ -0,0 +1,157 @@
+# core/rekey.py
+
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from core.utils import normalize_compare_column
+
+
+# столбцы, по которым ищем «ту же активность под новым номером»
+TEXT_COLUMN_HINTS = ("name", "description", "наименование", "название", "описание")
+
+# токен, который встречается у большего числа строк, в блокировке не участвует
+MAX_BLOCK_SIZE = 200
+
+# сколько кандидатов на строку считаем честной метрикой
+MAX_CANDIDATES = 20
+
+MIN_SCORE = 0.6
+
+_TOKEN_RE = re.compile(r"\w{2,}", re.UNICODE)
+
+
+# ===================================================================
+# ТЕКСТ И ТОКЕНЫ
+# ===================================================================
+
+def default_text_columns(common_cols):
+    """Общие столбцы, похожие на название / описание активности."""
+    return [
+        c for c in common_cols
+        if any(hint in str(c).lower() for hint in TEXT_COLUMN_HINTS)
+    ]
+
+
+def _row_texts(frame: pd.DataFrame, columns) -> np.ndarray:
+    """Склеенный нормализованный текст строк (по столбцам, без цикла по строкам)."""
+    joined = None
+    for col in columns:
+        text, isna = normalize_compare_column(frame[col])
+        text = pd.Series(np.where(isna, "", text), dtype=object).str.casefold()
+        joined = text if joined is None else joined + " " + text
+    if joined is None:
+        return np.full(len(frame), "", dtype=object)
+    return joined.to_numpy(dtype=object)
+
+
+def _trigrams(text: str) -> set:
+    text = " ".join(text.split())
+    return {text[i:i + 3] for i in range(max(len(text) - 2, 0))}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ===================================================================
+# ПОИСК ПЕРЕНУМЕРОВАННЫХ СТРОК
+# ===================================================================
+
+def find_rekeyed_pairs(
+    merged_df: pd.DataFrame,
+    text_columns=None,
+    min_score: float = MIN_SCORE,
+    max_block_size: int = MAX_BLOCK_SIZE,
+) -> pd.DataFrame:
+    """
+    Ищет пары «deleted ↔ new», которые на самом деле одна и та же
+    активность с изменённым Activity Master Number.
+
+    1. Для new-строк строится блокирующий индекс: токен → строки.
+       Слишком частые токены (> max_block_size строк) отбрасываются.
+    2. Каждая deleted-строка сравнивается только с new-строками,
+       у которых есть общий токен (до MAX_CANDIDATES лучших по числу
+       общих токенов), по сходству Жаккара на символьных 3-граммах.
+    3. Пары со score >= min_score назначаются жадно один-к-одному.
+
+    Возвращает DataFrame:
+        old_row, new_row — позиции строк в merged_df
+        old_key, new_key — Activity Master Number
+        score            — сходство 0..1
+    """
+
+    columns = ["old_row", "new_row", "old_key", "new_key", "score"]
+
+    if text_columns is None:
+        common = [
+            c[len("old_"):] for c in merged_df.columns
+            if c.startswith("old_") and f"new_{c[len('old_'):]}" in merged_df.columns
+        ]
+        text_columns = default_text_columns(common)
+    if not text_columns:
+        return pd.DataFrame(columns=columns)
+
+    status = merged_df["status"].to_numpy(dtype=object)
+    deleted_rows = np.flatnonzero(status == "deleted")
+    new_rows = np.flatnonzero(status == "new")
+    if len(deleted_rows) == 0 or len(new_rows) == 0:
+        return pd.DataFrame(columns=columns)
+
+    old_texts = _row_texts(merged_df.iloc[deleted_rows], [f"old_{c}" for c in text_columns])
+    new_texts = _row_texts(merged_df.iloc[new_rows], [f"new_{c}" for c in text_columns])
+
+    # ---------------------------------------------------
+    # блокирующий индекс по new-строкам
+    # ---------------------------------------------------
+    index = defaultdict(list)
+    for j, text in enumerate(new_texts):
+        for token in set(_TOKEN_RE.findall(text)):
+            index[token].append(j)
+
+    new_grams = {}
+    scored = []
+
+    for i, text in enumerate(old_texts):
+        shared = defaultdict(int)
+        for token in set(_TOKEN_RE.findall(text)):
+            block = index.get(token)
+            if block is None or len(block) > max_block_size:
+                continue
+            for j in block:
+                shared[j] += 1
+        if not shared:
+            continue
+
+        old_grams = _trigrams(text)
+        best = sorted(shared, key=shared.get, reverse=True)[:MAX_CANDIDATES]
+        for j in best:
+            if j not in new_grams:
+                new_grams[j] = _trigrams(new_texts[j])
+            score = _jaccard(old_grams, new_grams[j])
+            if score >= min_score:
+                scored.append((score, i, j))
+
+    # ---------------------------------------------------
+    # жадное назначение один-к-одному
+    # ---------------------------------------------------
+    used_old, used_new, pairs = set(), set(), []
+    for score, i, j in sorted(scored, key=lambda t: -t[0]):
+        if i in used_old or j in used_new:
+            continue
+        used_old.add(i)
+        used_new.add(j)
+        old_row, new_row = deleted_rows[i], new_rows[j]
+        pairs.append({
+            "old_row": int(old_row),
+            "new_row": int(new_row),
+            "old_key": merged_df["old_Activity Master Number"].iat[old_row],
+            "new_key": merged_df["new_Activity Master Number"].iat[new_row],
+            "score": round(score, 3),
+        })
+
+    return pd.DataFrame(pairs, columns=columns)
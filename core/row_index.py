@@ -0,0 +1,86 @@
+# core/row_index.py
+
+import numpy as np
+import pandas as pd
+
+from core.merge_compare import OLD_KEY, NEW_KEY
+
+
+# row id должен без потерь пройти через JS (AG Grid): не больше 2**53
+_ID_MASK = np.uint64(2**53 - 1)
+
+
+# ===================================================================
+# СТАБИЛЬНЫЕ ID СТРОК
+# ===================================================================
+
+def _side_tokens(keys: pd.Series, tag: str) -> np.ndarray:
+    """'tag|ключ|номер повтора ключа' — уникально внутри одной стороны."""
+    text = keys.astype(object).map(str).to_numpy(dtype=object)
+    occurrence = pd.Series(text).groupby(text, sort=False).cumcount().to_numpy()
+    return np.array([f"{tag}|{k}|{o}" for k, o in zip(text, occurrence)], dtype=object)
+
+
+def assign_row_ids(merged: pd.DataFrame) -> np.ndarray:
+    """
+    ID строк результата сравнения (int64), назначаются один раз.
+
+    Строка со старой стороной получает ID от старого ключа и номера
+    его повтора, строка только из новой таблицы — от нового ключа.
+    Поэтому пересчёт сравнения (другое сопоставление столбцов, другие
+    правила) даёт тем же строкам те же ID, даже если порядок строк
+    изменился. При коллизии хэшей — просто позиции строк.
+    """
+
+    n = len(merged)
+    if n == 0 or OLD_KEY not in merged.columns or NEW_KEY not in merged.columns:
+        return np.arange(n, dtype=np.int64)
+
+    if "_merge" in merged.columns:
+        has_old = (merged["_merge"].astype(object) != "right_only").to_numpy()
+    else:
+        has_old = merged[OLD_KEY].notna().to_numpy()
+
+    tokens = np.empty(n, dtype=object)
+    tokens[has_old] = _side_tokens(merged[OLD_KEY][has_old], "o")
+    tokens[~has_old] = _side_tokens(merged[NEW_KEY][~has_old], "n")
+
+    ids = (pd.util.hash_array(tokens, categorize=False) & _ID_MASK).astype(np.int64)
+    if len(pd.unique(ids)) != n:
+        return np.arange(n, dtype=np.int64)
+    return ids
+
+
+# ===================================================================
+# ИНДЕКС row id → ПОЗИЦИЯ
+# ===================================================================
+
+class RowIndex:
+    """
+    Хэш-индекс «row id → позиция строки» поверх pd.Index.
+    Строится один раз; поиск — O(1) на ID, без сканирования таблицы.
+    """
+
+    def __init__(self, row_ids):
+        self.ids = np.asarray(row_ids, dtype=np.int64)
+        self._index = pd.Index(self.ids)
+        if not self._index.is_unique:
+            raise ValueError("row id должны быть уникальными")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, row_id) -> bool:
+        return self.position(row_id) is not None
+
+    def position(self, row_id):
+        """Позиция строки или None, если такого ID нет."""
+        try:
+            return int(self._index.get_loc(int(row_id)))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return None
+
+    def positions(self, row_ids) -> np.ndarray:
+        """Позиции для набора ID (−1 — ID не найден)."""
+        ids = np.asarray(list(row_ids), dtype=np.int64)
+        return self._index.get_indexer(ids)
@@ -0,0 +1,434 @@
+# core/snapshots.py
+
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core.fingerprint import column_hashes
+from core.utils import file_slug
+
+
+# ===================================================================
+# НАСТРОЙКИ ХРАНИЛИЩА
+# ===================================================================
+
+SNAPSHOT_DIR = os.path.join("data", "snapshots")
+
+# сколько последних версий одного провайдера храним по умолчанию
+RETENTION_KEEP = 10
+
+# размер record batch в файле снапшота (для чтения по частям)
+SNAPSHOT_BATCH_ROWS = 50_000
+
+_META_KEY = b"ajman_snapshot"
+
+
+# ===================================================================
+# DataFrame ⇄ Arrow
+# ===================================================================
+
+# смешанный столбец хранится как dense union: у каждого значения свой тег,
+# дочерний массив на каждый тип; теги и их преобразования — здесь
+def _value_tag(value) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, np.integer)):
+        return "int" if -2**63 <= value < 2**63 else "bigint"
+    if isinstance(value, (float, np.floating)):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (pd.Timestamp, datetime, np.datetime64)):
+        return "timestamp"
+    if isinstance(value, date):
+        return "date"
+    if isinstance(value, (pd.Timedelta, timedelta, np.timedelta64)):
+        return "timedelta"
+    return "repr"
+
+
+_TAG_ENCODE = {
+    "bool": lambda vs: pa.array([bool(v) for v in vs], type=pa.bool_()),
+    "int": lambda vs: pa.array([int(v) for v in vs], type=pa.int64()),
+    "bigint": lambda vs: pa.array([str(int(v)) for v in vs], type=pa.string()),
+    "float": lambda vs: pa.array([float(v) for v in vs], type=pa.float64()),
+    "str": lambda vs: pa.array(vs, type=pa.string()),
+    "timestamp": lambda vs: pa.array([pd.Timestamp(v).isoformat() for v in vs], type=pa.string()),
+    "date": lambda vs: pa.array(vs, type=pa.date32()),
+    "timedelta": lambda vs: pa.array([pd.Timedelta(v).value for v in vs], type=pa.int64()),
+    "repr": lambda vs: pa.array([str(v) for v in vs], type=pa.string()),
+}
+
+_TAG_DECODE = {
+    "bigint": int,
+    "timestamp": pd.Timestamp,
+    "timedelta": pd.Timedelta,
+}
+
+
+def _tagged_array(values: pd.Series) -> pa.Array:
+    """Значения разных типов → dense union (пропуски — null в первом дочернем массиве)."""
+    values = values.to_numpy(dtype=object)
+    tags = ["null" if pd.isna(v) else _value_tag(v) for v in values]
+    names = list(dict.fromkeys(t for t in tags if t != "null")) or ["str"]
+    code = {name: i for i, name in enumerate(names)}
+
+    buckets = {name: [] for name in names}
+    type_ids = np.zeros(len(values), dtype=np.int8)
+    offsets = np.zeros(len(values), dtype=np.int32)
+    for i, (tag, v) in enumerate(zip(tags, values)):
+        if tag != "null":
+            type_ids[i], offsets[i] = code[tag], len(buckets[tag])
+            buckets[tag].append(v)
+
+    children = [_TAG_ENCODE[name](buckets[name]) for name in names]
+    is_null = np.array([t == "null" for t in tags], dtype=bool)
+    if is_null.any():
+        # пропуски — null-элементы в хвосте первого дочернего массива
+        first = children[0]
+        children[0] = pa.concat_arrays([first, pa.nulls(int(is_null.sum()), type=first.type)])
+        offsets[is_null] = len(first) + np.arange(is_null.sum(), dtype=np.int32)
+    return pa.UnionArray.from_dense(
+        pa.array(type_ids, type=pa.int8()),
+        pa.array(offsets, type=pa.int32()),
+        children,
+        names,
+    )
+
+
+def _untagged_values(column) -> list:
+    """dense union → список значений с исходными типами."""
+    names = [column.type.field(i).name for i in range(column.type.num_fields)]
+    decoded = []
+    for chunk in column.chunks if isinstance(column, pa.ChunkedArray) else [column]:
+        type_ids = chunk.type_codes.to_numpy(zero_copy_only=False)
+        for type_id, value in zip(type_ids, chunk.to_pylist()):
+            name = names[chunk.type.type_codes.index(type_id)]
+            if value is None:
+                decoded.append(np.nan)
+            elif name in _TAG_DECODE:
+                decoded.append(_TAG_DECODE[name](value))
+            else:
+                decoded.append(value)
+    return decoded
+
+
+def _name_tag(name):
+    """Имя столбца в метаданных: [тег, текст] — чтобы 2024 не вернулся как "2024"."""
+    tag = _value_tag(name)
+    if tag in ("str", "repr"):
+        return ["str", str(name)]
+    return [tag, str(name) if tag != "timestamp" else pd.Timestamp(name).isoformat()]
+
+
+_NAME_DECODE = {
+    "str": str,
+    "bool": lambda v: v == "True",
+    "int": int,
+    "bigint": int,
+    "float": float,
+    "timestamp": pd.Timestamp,
+    "date": date.fromisoformat,
+    "timedelta": pd.Timedelta,
+}
+
+
+def _restore_names(df: pd.DataFrame, meta: dict) -> pd.DataFrame:
+    names = meta.get("column_names")
+    if names and len(names) == len(df.columns):
+        df.columns = [_NAME_DECODE.get(tag, str)(text) for tag, text in names]
+    return df
+
+
+def dataframe_to_arrow(df: pd.DataFrame, meta: dict = None) -> pa.Table:
+    """
+    Переводит очищенную таблицу (dtype=object) в Arrow без потери типов.
+
+    Однотипные столбцы сохраняются в «родном» типе Arrow.
+    Столбцы со смешанными типами (например ключ int + str) —
+    dense union: каждое значение со своим тегом типа, поэтому
+    101 и "101" после чтения остаются разными значениями.
+    Имена столбцов с типами записываются в метаданные.
+    """
+
+    arrays = []
+
+    for col in df.columns:
+        values = df[col]
+        non_null = values[values.notna()]
+        kinds = set(map(type, non_null))
+
+        array = None
+        if len(kinds) <= 1:
+            try:
+                array = pa.array(values, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, OverflowError):
+                # например, int больше int64 — такой столбец тоже пишем с тегами
+                array = None
+
+        if array is None:
+            array = _tagged_array(values)
+
+        arrays.append(array)
+
+    meta = dict(meta or {})
+    meta["column_names"] = [_name_tag(c) for c in df.columns]
+
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+    return table.replace_schema_metadata({_META_KEY: json.dumps(meta).encode("utf-8")})
+
+
+def arrow_to_dataframe(table: pa.Table) -> pd.DataFrame:
+    """Обратное преобразование: все столбцы object, пропуски → NaN, имена — с типами."""
+    columns = {}
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if pa.types.is_union(field.type):
+            values = pd.Series(_untagged_values(column), dtype=object)
+        else:
+            values = column.to_pandas(integer_object_nulls=True, date_as_object=True).astype(object)
+            values = values.where(values.notna(), np.nan)
+        columns[i] = values
+
+    df = pd.DataFrame(columns, index=pd.RangeIndex(table.num_rows))
+    df.columns = table.schema.names
+    return _restore_names(df, read_arrow_meta(table))
+
+
+def read_arrow_meta(table_or_schema) -> dict:
+    schema = getattr(table_or_schema, "schema", table_or_schema)
+    raw = (schema.metadata or {}).get(_META_KEY)
+    return json.loads(raw) if raw else {}
+
+
+# ===================================================================
+# ПУТИ
+# ===================================================================
+
+def _provider_dir(provider: str, root: str) -> str:
+    return os.path.join(root, file_slug(provider))
+
+
+def snapshot_path(provider: str, version: str, root: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(_provider_dir(provider, root), file_slug(version) + ".arrow")
+
+
+def hashes_path(provider: str, version: str, root: str = SNAPSHOT_DIR) -> str:
+    """Файл рядом со снапшотом: хэши ячеек (core.fingerprint) по столбцам."""
+    return os.path.join(_provider_dir(provider, root), file_slug(version) + ".fp.arrow")
+
+
+def _write_arrow(table: pa.Table, path: str):
+    # пишем во временный файл и переименовываем — без «полузаписанных» файлов
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=SNAPSHOT_BATCH_ROWS)
+    os.replace(tmp_path, path)
+
+
+# ===================================================================
+# СОХРАНЕНИЕ / ЗАГРУЗКА
+# ===================================================================
+
+def has_snapshot(provider: str, version: str, root: str = SNAPSHOT_DIR, source_key: str = None) -> bool:
+    """
+    Есть ли снапшот версии. С source_key (ключ содержимого файла,
+    df.attrs["ingest_key"]) — есть ли снапшот именно этого содержимого:
+    другой файл под тем же именем считается новой версией.
+    """
+    path = snapshot_path(provider, version, root)
+    if not os.path.exists(path):
+        return False
+    if source_key is None:
+        return True
+    try:
+        with pa.memory_map(path, "r") as source:
+            meta = read_arrow_meta(pa.ipc.open_file(source).schema)
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return meta.get("source_key") == source_key
+
+
+def save_snapshot(
+    df: pd.DataFrame,
+    provider: str,
+    version: str,
+    root: str = SNAPSHOT_DIR,
+    overwrite: bool = False,
+) -> str:
+    """
+    Сохраняет очищенную таблицу как Arrow IPC (без сжатия — чтобы
+    файл можно было открыть через memory map).
+    Если такая версия уже есть и overwrite=False — ничего не делает.
+    """
+
+    path = snapshot_path(provider, version, root)
+    if os.path.exists(path) and not overwrite:
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    table = dataframe_to_arrow(
+        df,
+        meta={
+            "provider": provider,
+            "version": version,
+            "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "rows": int(df.shape[0]),
+            "columns": int(df.shape[1]),
+            "source_key": df.attrs.get("ingest_key"),
+        },
+    )
+
+    # хэши ячеек сохраняются вместе со снапшотом, чтобы следующие
+    # сравнения с этой версией не считали их заново
+    hashes = column_hashes(df)
+    hashes_table = pa.Table.from_arrays(
+        [pa.array(hashes[c].to_numpy()) for c in hashes.columns],
+        names=[str(c) for c in hashes.columns],
+    ).replace_schema_metadata({
+        _META_KEY: json.dumps({"column_names": [_name_tag(c) for c in hashes.columns]}).encode("utf-8")
+    })
+
+    _write_arrow(hashes_table, hashes_path(provider, version, root))
+    _write_arrow(table, path)
+
+    return path
+
+
+def load_snapshot(provider: str, version: str, root: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """Открывает снапшот через memory map и возвращает DataFrame."""
+    path = snapshot_path(provider, version, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Снапшот не найден: {provider} / {version}")
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        return arrow_to_dataframe(table)
+
+
+def iter_snapshot_batches(provider: str, version: str, root: str = SNAPSHOT_DIR):
+    """
+    Читает снапшот по частям (по SNAPSHOT_BATCH_ROWS строк) через memory map —
+    в памяти одновременно только одна часть в виде DataFrame.
+    """
+
+    path = snapshot_path(provider, version, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Снапшот не найден: {provider} / {version}")
+
+    with pa.memory_map(path, "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield arrow_to_dataframe(pa.Table.from_batches([reader.get_batch(i)]))
+
+
+def load_snapshot_hashes(provider: str, version: str, root: str = SNAPSHOT_DIR):
+    """Хэши ячеек снапшота (uint64 по столбцам) или None, если их нет."""
+    path = hashes_path(provider, version, root)
+    if not os.path.exists(path):
+        return None
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        return _restore_names(table.to_pandas(), read_arrow_meta(table))
+
+
+def delete_snapshot(provider: str, version: str, root: str = SNAPSHOT_DIR) -> bool:
+    path = snapshot_path(provider, version, root)
+    if not os.path.exists(path):
+        return False
+    _remove_files(path)
+    return True
+
+
+def _remove_files(path: str):
+    os.remove(path)
+    fp_path = path[: -len(".arrow")] + ".fp.arrow"
+    if os.path.exists(fp_path):
+        os.remove(fp_path)
+
+
+# ===================================================================
+# СПИСОК ВЕРСИЙ
+# ===================================================================
+
+def list_snapshots(provider: str, root: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Возвращает DataFrame с колонками:
+        provider, version, saved_at, rows, columns, size_bytes, path
+    Отсортировано от новых к старым. Читается только footer/schema файлов.
+    """
+
+    columns = ["provider", "version", "saved_at", "rows", "columns", "size_bytes", "path"]
+    folder = _provider_dir(provider, root)
+    if not os.path.isdir(folder):
+        return pd.DataFrame(columns=columns)
+
+    records = []
+    for name in os.listdir(folder):
+        if not name.endswith(".arrow") or name.endswith(".fp.arrow"):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            with pa.memory_map(path, "r") as source:
+                meta = read_arrow_meta(pa.ipc.open_file(source).schema)
+        except (OSError, pa.ArrowInvalid):
+            continue
+
+        records.append({
+            "provider": meta.get("provider", provider),
+            "version": meta.get("version", name),
+            "saved_at": meta.get("saved_at"),
+            "rows": meta.get("rows"),
+            "columns": meta.get("columns"),
+            "size_bytes": os.path.getsize(path),
+            "path": path,
+        })
+
+    df = pd.DataFrame(records, columns=columns)
+    return df.sort_values("saved_at", ascending=False, ignore_index=True)
+
+
+# ===================================================================
+# ПОЛИТИКА ХРАНЕНИЯ
+# ===================================================================
+
+def apply_retention(
+    provider: str,
+    keep_last: int = RETENTION_KEEP,
+    max_age_days: int = None,
+    root: str = SNAPSHOT_DIR,
+    protect: tuple = (),
+) -> list:
+    """
+    Удаляет старые снапшоты провайдера:
+      - всё, что не входит в keep_last последних версий;
+      - всё, что старше max_age_days (если задано).
+    Версии из protect не удаляются никогда.
+    Возвращает список удалённых версий.
+    """
+
+    listing = list_snapshots(provider, root)
+    if listing.empty:
+        return []
+
+    drop = listing.index >= keep_last
+    if max_age_days is not None:
+        saved = pd.to_datetime(listing["saved_at"], errors="coerce")
+        cutoff = pd.Timestamp.now() - pd.Timedelta(days=max_age_days)
+        drop |= (saved < cutoff).to_numpy()
+
+    removed = []
+    for _, rec in listing[drop].iterrows():
+        if rec["version"] in protect:
+            continue
+        _remove_files(rec["path"])
+        removed.append(rec["version"])
+
+    return removed
@@ -0,0 +1,198 @@
+# core/streaming_compare.py
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core.merge_compare import NEW_KEY, OLD_KEY, merge_and_compare
+from core.snapshots import arrow_to_dataframe, dataframe_to_arrow
+
+
+# на сколько частей по хэшу ключа делим обе таблицы
+N_PARTITIONS = 64
+
+# размер части при чтении DataFrame «кусками»
+CHUNK_ROWS = 50_000
+
+
+# ===================================================================
+# ЧТЕНИЕ ПО ЧАСТЯМ
+# ===================================================================
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS):
+    """Режет DataFrame на последовательные части по chunk_rows строк."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _canonical_key(value):
+    """
+    Ключ в одном представлении для разбивки: равные при join значения
+    (101, 101.0, np.int64(101)) дают одну строку, независимо от того,
+    какие ещё типы оказались в том же chunk.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        value = int(value)
+    if isinstance(value, (int, float, np.number)) and not pd.isna(value):
+        if float(value).is_integer():
+            return str(int(value))
+        return repr(float(value))
+    if isinstance(value, (pd.Timestamp, datetime, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    return None if pd.isna(value) else str(value)
+
+
+def key_partitions(keys: pd.Series, n_partitions: int) -> np.ndarray:
+    """
+    Номер части для каждой строки по хэшу Activity Master Number.
+    Одинаковые ключи всегда попадают в одну часть: хэшируется
+    каноническое представление ключа (_canonical_key), а не сами
+    значения — хэш pandas зависит от набора типов в массиве.
+    """
+    canonical = np.array([_canonical_key(v) for v in keys.to_numpy(dtype=object)], dtype=object)
+    hashes = pd.util.hash_array(canonical, categorize=True)
+    return (hashes % np.uint64(n_partitions)).astype(np.int64)
+
+
+# ===================================================================
+# ШАГ 1: РАЗБИВКА НА ДИСКЕ
+# ===================================================================
+
+def _spill_partitions(chunks, key_col, side, workdir, n_partitions):
+    """
+    Пишет каждую часть каждого chunk в отдельный Arrow-файл:
+        {workdir}/{side}_{partition}_{chunk}.arrow
+    Возвращает (список файлов по частям, список столбцов).
+    """
+
+    files = [[] for _ in range(n_partitions)]
+    columns = None
+
+    for chunk_no, chunk in enumerate(chunks):
+        if columns is None:
+            columns = list(chunk.columns)
+
+        parts = key_partitions(chunk[key_col], n_partitions)
+        for p in np.unique(parts):
+            path = os.path.join(workdir, f"{side}_{p}_{chunk_no}.arrow")
+            table = dataframe_to_arrow(chunk[parts == p].reset_index(drop=True))
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            files[p].append(path)
+
+    return files, columns or []
+
+
+def _load_partition(paths, columns) -> pd.DataFrame:
+    if not paths:
+        return pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+
+    frames = []
+    for path in paths:
+        with pa.memory_map(path, "r") as source:
+            frames.append(arrow_to_dataframe(pa.ipc.open_file(source).read_all()))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ===================================================================
+# ШАГ 2: СРАВНЕНИЕ ПО ЧАСТЯМ + ЗАПИСЬ РЕЗУЛЬТАТА
+# ===================================================================
+
+def _to_output_batch(merged: pd.DataFrame, schema: pa.Schema) -> pa.RecordBatch:
+    """Все столбцы результата пишутся строками (str(value) / null)."""
+    arrays = []
+    for field in schema:
+        values = merged[field.name] if field.name in merged.columns else None
+        if values is None:
+            arrays.append(pa.nulls(len(merged), type=pa.string()))
+            continue
+        arrays.append(pa.array(
+            [None if pd.isna(v) else str(v) for v in values.astype(object)],
+            type=pa.string(),
+        ))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def streaming_compare(
+    old_chunks,
+    new_chunks,
+    output_path: str,
+    n_partitions: int = N_PARTITIONS,
+    workdir: str = None,
+    tie_breaker=None,
+) -> dict:
+    """
+    Сравнение больших таблиц с ограниченной памятью.
+
+    old_chunks, new_chunks — итерируемые части таблиц, подготовленные так же,
+        как для merge_and_compare (префиксы old_ / new_, переименование);
+        например iter_chunks(df) или core.snapshots.iter_snapshot_batches
+    output_path — Arrow IPC файл с результатом (status, _merge,
+        changed columns, old_*, new_*); значения записываются строками
+
+    Обе таблицы раскладываются по хэшу Activity Master Number на
+    n_partitions частей на диске, затем каждая пара частей сравнивается
+    через merge_and_compare. В памяти одновременно — одна часть.
+
+    Возвращает сводку: rows, status_counts, column_change_counts.
+    """
+
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="ajman_compare_")
+    os.makedirs(workdir, exist_ok=True)
+
+    try:
+        old_files, old_cols = _spill_partitions(old_chunks, OLD_KEY, "old", workdir, n_partitions)
+        new_files, new_cols = _spill_partitions(new_chunks, NEW_KEY, "new", workdir, n_partitions)
+
+        out_columns = ["status", "_merge", "changed columns"] + old_cols + new_cols
+        schema = pa.schema([(str(c), pa.string()) for c in out_columns])
+
+        status_counts = {}
+        column_counts = None
+        rows = 0
+
+        with pa.OSFile(output_path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for p in range(n_partitions):
+                    if not old_files[p] and not new_files[p]:
+                        continue
+
+                    old_part = _load_partition(old_files[p], old_cols)
+                    new_part = _load_partition(new_files[p], new_cols)
+
+                    merged, changes = merge_and_compare(
+                        old_part, new_part, return_changes=True, tie_breaker=tie_breaker
+                    )
+
+                    writer.write_batch(_to_output_batch(merged, schema))
+
+                    rows += len(merged)
+                    for status, count in merged["status"].value_counts().items():
+                        status_counts[status] = status_counts.get(status, 0) + int(count)
+                    counts = changes.column_change_counts()
+                    column_counts = counts if column_counts is None else column_counts.add(counts, fill_value=0)
+
+                    # освобождаем часть до чтения следующей
+                    del old_part, new_part, merged, changes
+
+                    for path in old_files[p] + new_files[p]:
+                        os.remove(path)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "rows": rows,
+        "status_counts": status_counts,
+        "column_change_counts": (
+            column_counts.astype(np.int64) if column_counts is not None else pd.Series(dtype=np.int64)
+        ),
+        "output_path": output_path,
+    }
@@ -1,13 +1,28 @@
 from typing import Dict, Any, List
+import math
+
+import numpy as np
 import pandas as pd
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
-from st_aggrid.shared import JsCode
+import streamlit as st
+from st_aggrid import AgGrid, GridUpdateMode
+
+from core import copy_stats
+from core.aggrid_config import build_grid_options
+from core.query import RowView, TableQuery
+
+
+# сколько строк отдаём в браузер за раз в постраничном режиме
+PAGE_SIZE = 500
+
+# служебные колонки грида — скрыты и в сравнение до/после не входят
+_SERVICE_COLUMNS = ("_orig_index", "_rid")
 
 
 def render_editable_table(
     df: pd.DataFrame,
     grid_key: str = "main_grid",
     height: int = 650,
+    page_size: int = None,
 ) -> Dict[str, Any]:
     """
     Рендерит редактируемую таблицу AG-Grid и возвращает:
@@ -24,12 +39,43 @@ def render_editable_table(
             ...
         ]
       }
+
+    df — DataFrame или core.query.RowView (выборка строк без копии таблицы).
+
+    page_size — постраничный режим: вся таблица остаётся на сервере,
+    в грид уходит только текущая страница. Поиск, сортировка и
+    выделение считаются по всей таблице (см. _render_paged).
     """
 
+    if isinstance(df, RowView):
+        if page_size is not None:
+            return _render_paged(df, grid_key, height, page_size)
+        df = df.frame()
+    elif page_size is not None:
+        return _render_paged(TableQuery(df).select(), grid_key, height, page_size)
+
+    df_view, grid_response = _render_grid(df, grid_key, height)
+    df_after = _grid_data(df_view, grid_response)
+
+    return {
+        "df_after": df_after,
+        "selected_orig_indices": _selected_indices(grid_response, df_view),
+        # без ответа браузера правок нет — сверять нечего
+        "cell_changes": _cell_changes(df_view, df_after) if _answered(grid_response) else [],
+    }
+
+
+# ===================================================================
+# ГРИД
+# ===================================================================
+
+def _render_grid(df: pd.DataFrame, grid_key: str, height: int, pre_selected: List[str] = None):
     # ---------------------------------------------------------
     # 1. Подготовка данных: добавляем служебный индекс
     # ---------------------------------------------------------
-    df_view = df.copy()
+    # копия без данных (copy-on-write): служебные столбцы добавляются
+    # только в df_view, данные страницы не копируются
+    df_view = df.copy(deep=False)
 
     # _orig_index должен связывать строки view_df с merged_df
     if "_orig_index" not in df_view.columns:
@@ -38,59 +84,30 @@ def render_editable_table(
     # Дополнительный ID строки для AG Grid (строковый)
     df_view["_rid"] = df_view["_orig_index"].astype(str)
 
+    # в браузер уходит только видимая проекция: столбцы таблицы + _rid
+    # (по нему getRowId и обратная привязка к _orig_index);
+    # индекс не нужен — RangeIndex в Arrow почти ничего не весит
+    payload = df_view.drop(columns="_orig_index").reset_index(drop=True)
+
     # ---------------------------------------------------------
-    # 2. Настройка GridOptions
+    # 2. GridOptions — кэшируются по схеме таблицы (core.aggrid_config)
     # ---------------------------------------------------------
-    gb = GridOptionsBuilder.from_dataframe(df_view)
-
-    gb.configure_default_column(
-        editable=True,
-        filter=True,
-        sortable=True,
-        resizable=True,
-        wrapText=True,
-        autoHeight=True,
-    )
-
-    # выбор строк как в Google Sheets — чекбоксы
-    gb.configure_selection("multiple", use_checkbox=True)
-
-    gb.configure_grid_options(
-        rowSelection="multiple",
-        suppressRowClickSelection=True,
-        enableRangeSelection=True,
+    grid_options = build_grid_options(
+        payload,
+        enable_sidebar=False,
+        hidden_cols=_SERVICE_COLUMNS,
+        row_id_col="_rid",
     )
 
-    # чекбокс в заголовке (select all по текущему фильтру)
-    first_col = df_view.columns[0]
-    gb.configure_column(
-        first_col,
-        headerCheckboxSelection=True,
-        headerCheckboxSelectionFilteredOnly=True,
-        checkboxSelection=True,
-    )
-
-    # служебные колонки скрываем, но они остаются в data
-    gb.configure_column("_orig_index", hide=True)
-    gb.configure_column("_rid", hide=True)
-
-    # getRowId — обязательный JS, чтобы AG Grid знал стабильный ID строки
-    get_row_id = JsCode(
-        """
-        function(params) {
-            return params.data._rid;
-        }
-        """
-    )
-
-    grid_options = gb.build()
-    grid_options["getRowId"] = get_row_id
+    # выбор строк как в Google Sheets — чекбоксы; выделенные заранее — по _rid
+    if pre_selected:
+        grid_options.setdefault("initialState", {})["rowSelection"] = pre_selected
 
     # ---------------------------------------------------------
     # 3. Рендер AG-Grid
     # ---------------------------------------------------------
     grid_response = AgGrid(
-        df_view,
+        payload,
         gridOptions=grid_options,
         update_mode=GridUpdateMode.VALUE_CHANGED | GridUpdateMode.SELECTION_CHANGED,
         data_return_mode="AS_INPUT",
@@ -101,57 +118,108 @@ def render_editable_table(
         key=grid_key,
     )
 
-    df_after = pd.DataFrame(grid_response["data"])
+    return df_view, grid_response
 
-    # selected_rows может отсутствовать → берём безопасно
-    # safe extract selected rows
-    selected_rows_raw = grid_response.get("selected_rows", [])
 
-    # st_aggrid иногда отдаёт selected_rows как DataFrame, а иногда как list[dict]
-    if isinstance(selected_rows_raw, pd.DataFrame):
-        selected_rows = selected_rows_raw.to_dict(orient="records")
-    elif selected_rows_raw is None:
-        selected_rows = []
+def _answered(grid_response) -> bool:
+    """Ответил ли грид из браузера (до ответа st_aggrid отдаёт наш же payload)."""
+    return bool(getattr(grid_response, "grid_response", grid_response))
+
+
+def _grid_data(df_view: pd.DataFrame, grid_response) -> pd.DataFrame:
+    """
+    Таблица грида. После ответа браузера st_aggrid собирает новый
+    DataFrame из вернувшихся строк — это копия страницы, её и считаем.
+    """
+    data = grid_response["data"]
+    if _answered(grid_response):
+        copy_stats.record("grid: ответ браузера", data)
+    return _grid_frame(df_view, data)
+
+
+def _grid_frame(df_view: pd.DataFrame, records) -> pd.DataFrame:
+    """Данные из грида → DataFrame с восстановленным по _rid столбцом _orig_index."""
+    if isinstance(records, pd.DataFrame):
+        df_after = records.copy(deep=False)
     else:
-        selected_rows = selected_rows_raw  # обычно list[dict]
+        df_after = pd.DataFrame(records)
+    if "_rid" not in df_after.columns:
+        return df_after
+
+    rid_index = pd.Index(df_view["_rid"])
+    positions = rid_index.get_indexer(df_after["_rid"].astype(str))
+    if (positions < 0).any():
+        df_after = df_after[positions >= 0]
+        positions = positions[positions >= 0]
+    df_after["_orig_index"] = df_view["_orig_index"].to_numpy()[positions]
+    return df_after
+
 
+def _cell_changes(df_view: pd.DataFrame, df_after: pd.DataFrame) -> List[Dict[str, Any]]:
     # ---------------------------------------------------------
     # 4. Вычисляем изменённые ячейки (до/после)
     # ---------------------------------------------------------
-    # индексация по _orig_index, чтобы привязать к merged_df
+    # сравнение целыми массивами: строки after выравниваются по
+    # _orig_index на строки before, ячейки равны, если обе пустые
+    # или совпадают как строки (как и раньше, str(old) == str(new))
+    if df_after.empty or "_orig_index" not in df_after.columns:
+        return []
+
+    # сверяются все вернувшиеся строки: флаг правки из onCellValueChanged
+    # не подходит — st_aggrid собирает строки раньше, чем он выставлен
     before_df = df_view.set_index("_orig_index")
     after_df = df_after.set_index("_orig_index")
 
-    cell_changes: List[Dict[str, Any]] = []
+    # строки, которых нет в before, пропускаем
+    after_df = after_df[after_df.index.isin(before_df.index)]
+    columns = [c for c in after_df.columns if c not in _SERVICE_COLUMNS and c in before_df.columns]
+    if after_df.empty or not columns:
+        return []
 
-    # проходим по всем строкам и колонкам (кроме служебных)
-    for orig_idx in after_df.index:
-        if orig_idx not in before_df.index:
-            continue
+    old = before_df.loc[after_df.index, columns].to_numpy(dtype=object)
+    new = after_df[columns].to_numpy(dtype=object)
+    copy_stats.record("diff: ячейки до/после", old)
+    copy_stats.record("diff: ячейки до/после", new)
 
-        for col in after_df.columns:
-            if col in ["_orig_index", "_rid"]:
-                continue
+    both_na = pd.isna(old) & pd.isna(new)
+    changed = ~both_na & (old != new)
+    if changed.any():
+        # где значения не равны напрямую — сверяем текстом (1 и "1" — одно и то же)
+        rows, cols = np.nonzero(changed)
+        same_text = old[rows, cols].astype(str) == new[rows, cols].astype(str)
+        changed[rows[same_text], cols[same_text]] = False
 
-            old_val = before_df.loc[orig_idx, col]
-            new_val = after_df.loc[orig_idx, col]
+    # порядок записей прежний: по строкам, внутри строки — по столбцам
+    rows, cols = np.nonzero(changed)
+    index = after_df.index
+    return [
+        {
+            "orig_index": int(index[r]),
+            "column": columns[c],
+            "old_value": old[r, c],
+            "new_value": new[r, c],
+        }
+        for r, c in zip(rows, cols)
+    ]
 
-            # одинаковые пропускаем
-            if (pd.isna(old_val) and pd.isna(new_val)) or str(old_val) == str(new_val):
-                continue
 
-            cell_changes.append(
-                {
-                    "orig_index": int(orig_idx),
-                    "column": col,
-                    "old_value": old_val,
-                    "new_value": new_val,
-                }
-            )
+def _selected_indices(grid_response, df_view: pd.DataFrame) -> List[int]:
+    # selected_rows может отсутствовать → берём безопасно
+    selected_rows_raw = grid_response.get("selected_rows", [])
+
+    # st_aggrid иногда отдаёт selected_rows как DataFrame, а иногда как list[dict]
+    if isinstance(selected_rows_raw, pd.DataFrame):
+        selected_rows = selected_rows_raw.to_dict(orient="records")
+    elif selected_rows_raw is None:
+        selected_rows = []
+    else:
+        selected_rows = selected_rows_raw  # обычно list[dict]
 
     # ---------------------------------------------------------
-    # 5. Индексы выделенных строк (по _orig_index)
+    # 5. Индексы выделенных строк (по _orig_index, восстановленному из _rid)
     # ---------------------------------------------------------
+    selected_rows = _grid_frame(df_view, selected_rows).to_dict(orient="records")
+
     selected_orig_indices: List[int] = []
     for row in selected_rows:
         if "_orig_index" in row:
@@ -160,13 +228,85 @@ def render_editable_table(
             except Exception:
                 continue
 
-    selected_orig_indices = sorted(set(selected_orig_indices))
+    return sorted(set(selected_orig_indices))
+
+
+# ===================================================================
+# ПОСТРАНИЧНЫЙ РЕЖИМ
+# ===================================================================
+
+def _render_paged(view: RowView, grid_key: str, height: int, page_size: int) -> Dict[str, Any]:
+    """
+    Постраничный грид: поиск и сортировка — на сервере по всей выборке
+    (индексы core.query.TableQuery), в браузер уходит только страница.
+    Выделение хранится на сервере (по _orig_index) и переживает смену
+    страницы / поиска.
+    """
+
+    paging = st.session_state.setdefault(
+        f"{grid_key}_paging", {"selected": set(), "selection_version": 0, "cache": None}
+    )
+
+    c_query, c_sort, c_desc, c_page = st.columns([3, 2, 1, 1])
+    query = c_query.text_input("Поиск по таблице", key=f"{grid_key}_query")
+    sort_col = c_sort.selectbox(
+        "Сортировка", ["—"] + view.columns, key=f"{grid_key}_sort"
+    )
+    descending = c_desc.checkbox("По убыванию", key=f"{grid_key}_desc")
+    sort_col = None if sort_col == "—" else sort_col
+
+    # порядок строк кэшируется, пока не изменились выборка, поиск или сортировка
+    params = (query, sort_col, descending)
+    cache = paging["cache"]
+    if cache is None or cache["view"] is not view or cache["params"] != params:
+        table = view.query
+        order = table.search(query, view.positions, view.columns)
+        order = table.sort(order, sort_col, descending)
+        cache = {"view": view, "params": params, "order": order}
+        paging["cache"] = cache
+    order = cache["order"]
+
+    n_pages = max(1, math.ceil(len(order) / page_size))
+    page_key = f"{grid_key}_page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = 1
+    page = int(c_page.number_input("Страница", min_value=1, max_value=n_pages, step=1, key=page_key))
+
+    # order — позиции в таблице; собираем только строки страницы
+    page_df = view.frame(order[(page - 1) * page_size: page * page_size])
+
+    # удалённые (и не попавшие в выборку) строки из выделения выпадают
+    selected = paging["selected"]
+    if selected:
+        selected.intersection_update(view.row_ids)
+
+    pre_selected = [str(i) for i in page_df.index if i in selected]
+    view_key = f"{grid_key}_{page}_{hash(params)}_{paging['selection_version']}"
+    df_view, grid_response = _render_grid(page_df, view_key, height, pre_selected)
+    df_after = _grid_data(df_view, grid_response)
+
+    # выделение на странице заменяет прежнее выделение строк этой страницы;
+    # пока новый грид не ответил из браузера, его (пустой) ответ не считаем
+    if _answered(grid_response):
+        selected.difference_update(page_df.index)
+        selected.update(_selected_indices(grid_response, df_view))
+
+    c_info, c_all, c_none = st.columns([4, 2, 2])
+    c_info.caption(
+        f"Найдено строк: {len(order)} из {len(view)} · страница {page} из {n_pages} · "
+        f"выделено: {len(selected)}. Несохранённые правки страницы теряются при смене страницы."
+    )
+    if c_all.button(f"Выделить все найденные ({len(order)})", key=f"{grid_key}_select_all"):
+        selected.update(view.query.df.index[order])
+        paging["selection_version"] += 1
+        st.rerun()
+    if c_none.button("Снять выделение", key=f"{grid_key}_select_none"):
+        selected.clear()
+        paging["selection_version"] += 1
+        st.rerun()
 
-    # ---------------------------------------------------------
-    # 6. Возвращаем результат в формате, который ждёт app.py
-    # ---------------------------------------------------------
     return {
         "df_after": df_after,
-        "selected_orig_indices": selected_orig_indices,
-        "cell_changes": cell_changes,
+        "selected_orig_indices": sorted(selected),
+        "cell_changes": _cell_changes(df_view, df_after) if _answered(grid_response) else [],
     }
@@ -1,45 +1,267 @@
 # core/undo_redo.py
-import pandas as pd
-from copy import deepcopy
+import sys
+from contextlib import contextmanager
 
+from core import copy_stats
+from core.checkpoints import CheckpointStore
+from core.journal import patch_to_ids
 
-def init_undo_redo(state):
+
+# что именно откатывается: overlay правок (core.editing.EditOverlay)
+UNDO_TARGET = "edit_overlay"
+
+# сколько памяти (примерно) может занимать история по умолчанию
+HISTORY_BUDGET_BYTES = 32 * 1024 * 1024
+
+# массовое действие: удаление столбцов или патч больше стольких строк / ячеек;
+# его undo-запись хранится сжатой в хранилище чекпоинтов (core.checkpoints)
+BULK_PATCH_ITEMS = 1000
+
+
+def init_undo_redo(state, budget_bytes: int = HISTORY_BUDGET_BYTES):
     """Инициализация стеков undo/redo."""
     if "undo_stack" not in state:
         state["undo_stack"] = []
     if "redo_stack" not in state:
         state["redo_stack"] = []
+    if "checkpoints" not in state:
+        # сжатые версии таблицы («сохранить версию») и undo-записи
+        # массовых действий (core.checkpoints)
+        state["checkpoints"] = CheckpointStore()
+    state["undo_budget"] = budget_bytes
 
 
-def push_undo_state(state, df, logs):
-    """Сохраняет текущее состояние перед изменением."""
-    state["undo_stack"].append((deepcopy(df), deepcopy(logs)))
-    state["redo_stack"].clear()
+# ===================================================================
+# ЗАПИСЬ ИСТОРИИ
+# ===================================================================
+# Запись истории — не копия таблицы и логов, а «команда»:
+#   patch     — патч overlay, который откатывает / повторяет действие;
+#   log_start — позиция записей действия в log_actions;
+#   logs      — записи лога, добавленные действием;
+#   nbytes    — оценка размера записи.
+# У массового действия patch и logs лежат сжатыми в state["checkpoints"],
+# а в стеке — только ссылка на них (checkpoint).
 
+def _entry_nbytes(patch: dict, logs: list) -> int:
+    size = 64 * len(patch["rows"]) + 64 * len(patch["columns"])
+    for cells in patch["cells"].values():
+        size += sum(64 + sys.getsizeof(v) for v in cells.values())
+    for rec in logs:
+        size += sys.getsizeof(rec) + sum(sys.getsizeof(v) for v in rec.values())
+    return size
 
-def undo(state):
-    """Возврат к предыдущему состоянию."""
-    if not state["undo_stack"]:
+
+def _is_bulk(patch: dict) -> bool:
+    items = len(patch["rows"]) + sum(len(cells) for cells in patch["cells"].values())
+    return bool(patch["columns"]) or items > BULK_PATCH_ITEMS
+
+
+def _make_entry(state, patch: dict, log_start: int, logs: list, label: str = None) -> dict:
+    store = state.get("checkpoints")
+    if store is not None and _is_bulk(patch):
+        cid = store.add_record({"patch": patch, "logs": logs}, label=label)
+        return {"checkpoint": cid, "log_start": log_start, "label": label, "nbytes": 64}
+    return {
+        "patch": patch,
+        "log_start": log_start,
+        "logs": logs,
+        "label": label,
+        "nbytes": _entry_nbytes(patch, logs),
+    }
+
+
+def _load_entry(state, entry: dict):
+    """Запись с patch и logs (для массовой — из хранилища) или None, если она вытеснена."""
+    if "checkpoint" not in entry:
+        return entry
+    try:
+        record = state["checkpoints"].get_record(entry["checkpoint"])
+    except KeyError:
         return None
+    state["checkpoints"].discard(entry["checkpoint"])
+    return {**entry, **record}
 
-    prev_df, prev_logs = state["undo_stack"].pop()
-    state["redo_stack"].append((deepcopy(state["merged_df"]), deepcopy(state["log_actions"])))
 
-    state["merged_df"] = deepcopy(prev_df)
-    state["log_actions"] = deepcopy(prev_logs)
+def _drop_entry(state, entry: dict):
+    if "checkpoint" in entry and state.get("checkpoints") is not None:
+        state["checkpoints"].discard(entry["checkpoint"])
 
-    return prev_df
 
+def _enforce_budget(state):
+    """Вытесняет самые старые шаги undo, пока история не влезет в бюджет."""
+    budget = state.get("undo_budget", HISTORY_BUDGET_BYTES)
+    undo_stack = state["undo_stack"]
+    total = history_nbytes(state)
+    while undo_stack and total > budget:
+        entry = undo_stack.pop(0)
+        _drop_entry(state, entry)
+        total -= entry["nbytes"]
 
-def redo(state):
-    """Повтор действия."""
-    if not state["redo_stack"]:
+
+def clear_history(state):
+    """Очищает undo/redo вместе с их сжатыми записями в хранилище."""
+    for stack in ("undo_stack", "redo_stack"):
+        for entry in state[stack]:
+            _drop_entry(state, entry)
+        state[stack].clear()
+
+
+def history_nbytes(state) -> int:
+    return sum(e["nbytes"] for e in state["undo_stack"]) + sum(
+        e["nbytes"] for e in state["redo_stack"]
+    )
+
+
+def history_report(state) -> dict:
+    """Сколько памяти сейчас занимает история: шаги undo/redo и чекпоинты."""
+    report = {
+        "undo_entries": len(state["undo_stack"]),
+        "redo_entries": len(state["redo_stack"]),
+        "undo_bytes": history_nbytes(state),
+        "undo_budget": state.get("undo_budget", HISTORY_BUDGET_BYTES),
+    }
+    store = state.get("checkpoints")
+    if store is not None:
+        report.update({f"checkpoint_{k}": v for k, v in store.report().items()})
+    return report
+
+
+def journal_synced(state):
+    """Отмечает, что лог действий целиком в журнале (после снимка или восстановления)."""
+    state["journal_log_len"] = len(state["log_actions"])
+
+
+def _unjournaled_logs(state) -> list:
+    """
+    Записи, дописанные в конец log_actions в обход undo (например,
+    core.logging.log_undo) после последней операции журнала.
+    """
+    logs = state["log_actions"]
+    return logs[min(state.get("journal_log_len", len(logs)), len(logs)):]
+
+
+def journal_action(
+    state, patch: dict, log_start: int, logs: list, log_drop: int = 0, log_tail: list = ()
+):
+    """
+    Пишет действие в журнал сессии (core.journal), если он подключён:
+    state["journal"] — Journal, state["journal_key"] — ключ сравнения.
+    log_tail — записи лога вне undo, дописанные до действия.
+    """
+    journal, key = state.get("journal"), state.get("journal_key")
+    if journal is None or key is None:
+        return
+    journal.record(
+        key,
+        patch_to_ids(patch, state[UNDO_TARGET].index.ids),
+        log_start,
+        logs,
+        log_drop=log_drop,
+        log_tail=list(log_tail),
+    )
+    journal_synced(state)
+
+
+def add_checkpoint(state, label: str = None):
+    """
+    Сохраняет текущую таблицу overlay в хранилище чекпоинтов — явно,
+    по кнопке «сохранить версию»: снимок сериализует всю таблицу.
+    """
+    store = state.get("checkpoints")
+    if store is None:
         return None
+    return store.add(state[UNDO_TARGET].materialize(), label=label)
+
+
+@contextmanager
+def undoable(state, label: str = None):
+    """
+    Всё, что сделано с overlay и log_actions внутри блока, —
+    одно действие для undo:
+
+        with undoable(st.session_state, label="удаление строк"):
+            overlay.delete_rows(...)
+            log_delete_row(...)
+
+    Undo-запись массового действия (см. BULK_PATCH_ITEMS) хранится
+    сжатой в хранилище чекпоинтов под подписью label.
+    """
 
-    next_df, next_logs = state["redo_stack"].pop()
-    state["undo_stack"].append((deepcopy(state["merged_df"]), deepcopy(state["log_actions"])))
+    overlay = state[UNDO_TARGET]
+    log_tail = _unjournaled_logs(state)
+    log_start = len(state["log_actions"])
+    overlay.start_recording()
+    try:
+        yield
+    finally:
+        patch = overlay.stop_recording()
 
-    state["merged_df"] = deepcopy(next_df)
-    state["log_actions"] = deepcopy(next_logs)
+    # срез — единственная копия записей лога: её хранит undo и пишет журнал
+    logs = copy_stats.record("undo: записи лога действия", state["log_actions"][log_start:])
+    if patch is None and not logs:
+        return
+
+    if patch is None:
+        patch = {"rows": {}, "cells": {}, "columns": {}}
+    state["undo_stack"].append(_make_entry(state, patch, log_start, logs, label))
+    for entry in state["redo_stack"]:
+        _drop_entry(state, entry)
+    state["redo_stack"].clear()
+    _enforce_budget(state)
+    journal_action(state, overlay.capture(patch), log_start, logs, log_tail=log_tail)
+
+
+# ===================================================================
+# UNDO / REDO
+# ===================================================================
+
+def _replay(state, from_stack: str, to_stack: str, forward: bool):
+    if not state[from_stack]:
+        return None
 
-    return next_df
+    entry = _load_entry(state, state[from_stack].pop())
+    if entry is None:
+        # запись массового действия вытеснена из хранилища — дальше
+        # по этому стеку идти нельзя, остальные шаги зависят от неё
+        for rest in state[from_stack]:
+            _drop_entry(state, rest)
+        state[from_stack].clear()
+        return None
+
+    reverse_patch = state[UNDO_TARGET].apply_patch(entry["patch"])
+
+    log_tail = _unjournaled_logs(state)
+    logs = state["log_actions"]
+    if forward:
+        # повтор дописывает записи в конец — с этого места их и снимет undo
+        log_start, log_drop = len(logs), 0
+        logs.extend(entry["logs"])
+    else:
+        # убираем только записи самого действия: после них в логе могут
+        # стоять записи вне undo (например, core.logging.log_undo)
+        log_start, log_drop = entry["log_start"], len(entry["logs"])
+        del logs[log_start:log_start + log_drop]
+
+    state[to_stack].append(
+        _make_entry(state, reverse_patch, log_start, entry["logs"], entry.get("label"))
+    )
+    _enforce_budget(state)
+    journal_action(
+        state,
+        entry["patch"],
+        log_start,
+        entry["logs"] if forward else [],
+        log_drop,
+        log_tail,
+    )
+    return entry
+
+
+def undo(state):
+    """Возврат к предыдущему состоянию."""
+    return _replay(state, "undo_stack", "redo_stack", forward=False)
+
+
+def redo(state):
+    """Повтор действия."""
+    return _replay(state, "redo_stack", "undo_stack", forward=True)
@@ -1,4 +1,7 @@
 # core/utils.py
+import hashlib
+import re
+
 import pandas as pd
 import numpy as np
 from copy import deepcopy
@@ -13,6 +16,16 @@ def now_ts():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+# ============================================================
+# 🌟 ИМЯ ФАЙЛА ИЗ ПРОИЗВОЛЬНОЙ СТРОКИ
+# ============================================================
+def file_slug(value: str) -> str:
+    """Безопасное имя файла + короткий хэш, чтобы разные имена не слиплись."""
+    text = re.sub(r"[^0-9A-Za-z._-]+", "_", str(value)).strip("._") or "v"
+    digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=4).hexdigest()
+    return f"{text}-{digest}"
+
+
 # ============================================================
 # 🌟 БЕЗОПАСНОЕ СРАВНЕНИЕ ЯЧЕЕК
 # ============================================================
@@ -27,6 +40,19 @@ def safe_not_equals(a, b):
     return not safe_equals(a, b)
 
 
+def normalize_compare_column(values: pd.Series):
+    """
+    Нормализует столбец целиком так же, как safe_equals
+    нормализует одну ячейку. Возвращает два массива:
+        text — str(x).strip() для каждого значения
+        isna — маска пустых значений
+    """
+
+    isna = values.isna().to_numpy()
+    text = values.astype(object).map(str).str.strip().to_numpy(dtype=object)
+    return text, isna
+
+
 # ============================================================
 # 🌟 НОРМАЛИЗАЦИЯ ТЕКСТА
 # ============================================================
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from core.checkpoints import CheckpointStore
+
+
+def _table(n_rows: int = 200) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"key": [101, "A-2"] * (n_rows // 2), "v": [f"value {i}" for i in range(n_rows)]},
+        dtype=object,
+    )
+
+
+def test_versions_restore_mixed_types():
+    store = CheckpointStore()
+    df = _table()
+    full = store.add(df)
+    edited = df.copy()
+    edited.loc[3, "v"] = 7
+    delta = store.add(edited)
+
+    assert store.get(full).equals(df)
+    restored = store.get(delta)
+    assert restored.equals(edited)
+    assert type(restored.loc[0, "key"]) is int and type(restored.loc[3, "v"]) is int
+
+
+def test_budget_without_spill_is_enforced_with_interleaved_records():
+    store = CheckpointStore(spill=False, full_every=3)
+    df = _table()
+    store.add(df)
+    store.add_record({"patch": list(range(1000))})
+    edited = df.copy()
+    edited.loc[0, "v"] = "changed"
+    store.add(edited)
+
+    # бюджет меньше всего, что лежит в памяти: старая группа и запись уходят
+    store.budget_bytes = store.report()["bytes_in_memory"] - 1
+    store.add(edited.assign(v=np.arange(len(edited))))
+    assert store.report()["bytes_in_memory"] <= store.budget_bytes
+    assert store.report()["bytes_on_disk"] == 0
@@ -0,0 +1,29 @@
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+
+from core.cleaning import NA_STRINGS, clean_excel_table
+
+
+def _workbook(rows) -> io.BytesIO:
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+def test_stream_reads_na_strings_like_read_excel():
+    literals = sorted(NA_STRINGS - {""})
+    rows = [["отчёт"], ["Activity Master Number", "Value"]]
+    rows += [[f"A-{i}", value] for i, value in enumerate(literals + ["N/A ", "none", "0"])]
+    data = _workbook(rows).getvalue()
+
+    stream = clean_excel_table(io.BytesIO(data), mode="stream")
+    two_pass = clean_excel_table(io.BytesIO(data), mode="two_pass")
+
+    pd.testing.assert_frame_equal(stream, two_pass)
+    assert stream["Value"].isna().sum() == len(literals)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from core.column_profile import (
+    MINHASH_CHUNK,
+    best_mapping,
+    minhash,
+    profile_table,
+    suggest_mapping,
+)
+
+
+def test_minhash_covers_all_values_beyond_one_chunk():
+    head = np.array([f"v{i}" for i in range(MINHASH_CHUNK)], dtype=object)
+    tail = np.array([f"w{i}" for i in range(MINHASH_CHUNK)], dtype=object)
+
+    full = minhash(np.concatenate([head, tail]))
+    # подпись объединения — поэлементный минимум подписей частей
+    assert (full == np.minimum(minhash(head), minhash(tail))).all()
+    # значения после первого блока тоже влияют на подпись
+    assert (full != minhash(head)).any()
+
+
+def test_renamed_columns_are_matched_by_values():
+    n = 300
+    old = pd.DataFrame({
+        "Activity ID": [f"A-{i}" for i in range(n)],
+        "Start": pd.date_range("2024-01-01", periods=n).astype(str),
+        "Qty": range(n),
+    })
+    new = pd.DataFrame({
+        "Кол-во": range(n),
+        "Activity Code": [f"A-{i}" for i in range(n)],
+        "Start Date": pd.date_range("2024-01-01", periods=n).astype(str),
+    })
+
+    suggestions = suggest_mapping(profile_table(old), profile_table(new))
+    assert [c for c, _ in suggestions["Qty"]][0] == "Кол-во"
+    assert all(len(ranked) == 3 for ranked in suggestions.values())
+
+    chosen = best_mapping(suggestions)
+    assert {old_col: pair[0] for old_col, pair in chosen.items()} == {
+        "Activity ID": "Activity Code",
+        "Start": "Start Date",
+        "Qty": "Кол-во",
+    }
+
+
+def test_best_mapping_uses_each_new_column_once_and_respects_threshold():
+    suggestions = {
+        "a": [("x", 0.9), ("y", 0.6)],
+        "b": [("x", 0.8), ("y", 0.7)],
+        "c": [("z", 0.3)],
+    }
+    assert best_mapping(suggestions) == {"a": ("x", 0.9), "b": ("y", 0.7), "c": None}
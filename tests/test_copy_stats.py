@@ -0,0 +1,26 @@
+import warnings
+
+import pandas as pd
+
+from core import copy_stats
+from core.checkpoints import CheckpointStore
+from core.journal import Journal
+
+
+def test_enable_copy_on_write_is_silent():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        copy_stats.enable_copy_on_write()
+
+
+def test_checkpoint_and_journal_copies_are_counted(tmp_path):
+    copy_stats.reset()
+    CheckpointStore().add(pd.DataFrame({"a": range(100)}))
+    journal = Journal(str(tmp_path / "j.sqlite"))
+    journal.record("k", {"rows": [], "cells": {}, "columns": []}, 0, [{"row": 1}])
+    journal.close()
+
+    labels = set(copy_stats.report()["copy"])
+    assert {"checkpoint: таблица → Arrow", "checkpoint: сжатые байты"} <= labels
+    assert "journal: операция (JSON)" in labels
+    assert copy_stats.total() > 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.fingerprint import column_hashes
+from core.incremental import KEY_COLUMN, IncrementalComparer
+from core.mapping import apply_column_mapping
+from core.merge_compare import merge_and_compare
+
+
+OLD_COLS = ["a", "b", "c", "d"]
+NEW_COLS = ["x", "y", "z", "w"]
+
+
+def _tables(seed: int, n_rows: int = 120):
+    rng = np.random.default_rng(seed)
+    keys = [f"AMN-{i:04d}" for i in range(n_rows)]
+    old_keys = [k for k in keys if rng.random() < 0.9]
+    new_keys = [k for k in keys if rng.random() < 0.9]
+
+    def column(n):
+        return rng.choice(["1", "2", " 2", "3", None], size=n).tolist()
+
+    old = pd.DataFrame({KEY_COLUMN: old_keys, **{c: column(len(old_keys)) for c in OLD_COLS}}, dtype=object)
+    new = pd.DataFrame({KEY_COLUMN: new_keys, **{c: column(len(new_keys)) for c in NEW_COLS}}, dtype=object)
+    return old, new
+
+
+def _random_mapping(rng) -> dict:
+    # каждый старый столбец — в свой новый или без соответствия (без дублей имён)
+    targets = rng.permutation(NEW_COLS + [None] * len(OLD_COLS))[: len(OLD_COLS)]
+    mapping = {KEY_COLUMN: KEY_COLUMN}
+    mapping.update({old: (None if new is None else str(new)) for old, new in zip(OLD_COLS, targets)})
+    return mapping
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("with_hashes", [False, True])
+def test_incremental_matches_full_compare_over_remaps(seed, with_hashes):
+    rng = np.random.default_rng(seed)
+    old, new = _tables(seed)
+    hashes = (column_hashes(old), column_hashes(new)) if with_hashes else (None, None)
+    comparer = IncrementalComparer()
+
+    for _ in range(10):
+        mapping = _random_mapping(rng)
+        merged, changes = comparer.compare(old, new, mapping, old_hashes=hashes[0], new_hashes=hashes[1])
+        expected, expected_changes = merge_and_compare(
+            apply_column_mapping(old, mapping).add_prefix("old_"),
+            new.add_prefix("new_"),
+            return_changes=True,
+        )
+
+        assert list(merged.columns) == list(expected.columns)
+        for col in ("status", "_merge", "changed columns"):
+            assert merged[col].astype(object).tolist() == expected[col].astype(object).tolist()
+        assert changes.columns == expected_changes.columns
+        assert changes.row_ids.tolist() == expected_changes.row_ids.tolist()
+        assert (changes.bits == expected_changes.bits).all()
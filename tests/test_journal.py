@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from core.editing import UNSET, EditOverlay
+from core.journal import Journal, patch_to_ids, replay, session_key
+
+
+def _overlay() -> EditOverlay:
+    return EditOverlay(pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}, dtype=object))
+
+
+def test_session_key_depends_on_manager():
+    assert session_key("anna", "file", 1) == session_key("anna", "file", 1)
+    assert session_key("anna", "file", 1) != session_key("boris", "file", 1)
+
+
+def test_values_keep_their_types(tmp_path):
+    journal = Journal(str(tmp_path / "j.sqlite"))
+    logs = [{
+        "ts": pd.Timestamp("2024-05-01 10:30"),
+        "n": np.int64(7),
+        "x": np.float32(0.5),
+        "flag": np.bool_(True),
+        "nan": float("nan"),
+        "nat": pd.NaT,
+        "none": None,
+    }]
+    patch = {"rows": [], "cells": {"a": [[1, UNSET], [2, np.int64(5)]]}, "columns": []}
+    journal.record("k", patch, 0, logs)
+
+    (op,) = journal.operations("k")
+    entry = op["logs"][0]
+    assert entry["ts"] == pd.Timestamp("2024-05-01 10:30")
+    assert entry["n"] == 7 and type(entry["n"]) is int
+    assert entry["x"] == 0.5 and entry["flag"] is True
+    assert math.isnan(entry["nan"]) and entry["nat"] is pd.NaT and entry["none"] is None
+    assert op["patch"]["cells"]["a"] == [[1, UNSET], [2, 5]]
+    journal.close()
+
+
+def test_snapshot_keeps_old_operations_and_replay_starts_from_it(tmp_path):
+    journal = Journal(str(tmp_path / "j.sqlite"))
+    overlay = _overlay()
+    ids = overlay.index.ids
+
+    overlay.delete_rows([ids[0]])
+    journal.record("k", patch_to_ids(overlay.state_patch(), ids), 0, ["delete"])
+    journal.record("other", patch_to_ids(overlay.state_patch(), ids), 0, ["delete"])
+
+    # новое сравнение: правок нет, журнал продолжается снимком
+    journal.snapshot("k", patch_to_ids(_overlay().state_patch(), ids), [])
+    assert len(journal.operations("k")) == 1
+    assert len(journal.operations("other")) == 1
+
+    fresh, logs = _overlay(), ["stale"]
+    assert replay(journal.operations("k"), fresh, logs) == 0
+    assert len(fresh.materialize()) == 3 and logs == []
+
+    (count,) = journal._conn.execute("SELECT COUNT(*) FROM ops WHERE session = 'k'").fetchone()
+    assert count == 2
+    journal.close()
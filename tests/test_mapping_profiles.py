@@ -0,0 +1,37 @@
+# tests/test_mapping_profiles.py
+
+import pytest
+
+from core.mapping_profiles import (
+    export_mapping_profiles,
+    import_mapping_profiles,
+    load_mapping_profile,
+    save_mapping_profile,
+)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"[1, 2]",
+        b"not json",
+        b"\xff",
+        b'{"format": "other", "profiles": {}}',
+        b'{"format": "ajman_mapping_profiles", "profiles": [1]}',
+        b'{"format": "ajman_mapping_profiles", "profiles": {"a": [1]}}',
+        b'{"format": "ajman_mapping_profiles", "profiles": {"a": {"old_columns": ["x"]}}}',
+        b'{"format": "ajman_mapping_profiles", "profiles": {"a": '
+        b'{"old_columns": ["x"], "new_columns": ["y"], "mapping": {"x": 1}}}}',
+    ],
+)
+def test_import_rejects_malformed_files(tmp_path, data):
+    with pytest.raises(ValueError):
+        import_mapping_profiles("p", data, root=str(tmp_path))
+
+
+def test_export_import_roundtrip(tmp_path):
+    src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+    save_mapping_profile("p", ["a", "b"], ["A"], {"a": "A", "b": None}, root=src)
+
+    assert import_mapping_profiles("q", export_mapping_profiles("p", root=src), root=dst) == 1
+    assert load_mapping_profile("q", ["a", "b"], ["A"], root=dst) == {"a": "A", "b": None}
@@ -0,0 +1,111 @@
+# tests/test_merge_compare_parity.py
+"""
+Паритет векторного merge_and_compare с эталонным построчным путём:
+outer merge + построчный detect_row_changes (как было в app.py).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.merge_compare import NEW_KEY, OLD_KEY, detect_row_changes, merge_and_compare
+
+
+KEY = "Activity Master Number"
+
+# значения, на которых проще всего разойтись со str(x).strip():
+# пропуски разных видов, пробелы по краям, 1 / 1.0 / "1", литералы "nan" / "None"
+VALUES = [
+    np.nan, None, pd.NaT,
+    "a", " a", "a ", "A",
+    1, 1.0, "1", " 1 ", 2.5, "2.5",
+    "nan", "None", "NaN", "NaT", "",
+]
+
+
+def _random_tables(seed: int, n_rows: int = 200, n_cols: int = 5):
+    rng = np.random.default_rng(seed)
+    cols = [f"c{j}" for j in range(n_cols)]
+
+    keys = [f"AMN-{i:04d}" for i in range(n_rows)]
+    old_keys = [k for k in keys if rng.random() < 0.85]
+    new_keys = [k for k in keys if rng.random() < 0.85]
+
+    def cell():
+        return VALUES[rng.integers(len(VALUES))]
+
+    old = pd.DataFrame({KEY: old_keys, **{c: [cell() for _ in old_keys] for c in cols}}, dtype=object)
+    new = pd.DataFrame({KEY: new_keys, **{c: [cell() for _ in new_keys] for c in cols}}, dtype=object)
+
+    # часть строк новой таблицы — копии старых, чтобы были и not_changed
+    same = [k for k in new_keys if k in set(old_keys) and rng.random() < 0.3]
+    for k in same:
+        new.loc[new[KEY] == k, cols] = old.loc[old[KEY] == k, cols].to_numpy()
+
+    # лишний столбец с каждой стороны — не общий, в сравнение не входит
+    old["only_old"] = "x"
+    new["only_new"] = "y"
+    return old, new, cols
+
+
+def _reference(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
+    """Эталон: ключ → (status, changed columns)."""
+    merged = df_old.merge(df_new, left_on=OLD_KEY, right_on=NEW_KEY, how="outer", indicator=True)
+    common_cols = [
+        c.replace("old_", "")
+        for c in df_old.columns
+        if c.replace("old_", "") in [x.replace("new_", "") for x in df_new.columns]
+    ]
+    result = {}
+    # строки берём через iloc, а не iterrows: в pandas 3 iterrows выводит
+    # для строки dtype str и превращает None в NaN (эталон бы «поплыл»)
+    for i in range(len(merged)):
+        row = merged.iloc[i]
+        key = row[OLD_KEY] if row["_merge"] != "right_only" else row[NEW_KEY]
+        result[key] = detect_row_changes(row, common_cols)
+    return result
+
+
+def _vectorized(df_old: pd.DataFrame, df_new: pd.DataFrame) -> dict:
+    merged = merge_and_compare(df_old, df_new)
+    keys = merged[OLD_KEY].where(merged["_merge"].astype(object) != "right_only", merged[NEW_KEY])
+    changed = merged["changed columns"].astype(object)
+    return {
+        key: (status, None if pd.isna(ch) else ch)
+        for key, status, ch in zip(keys, merged["status"].astype(object), changed)
+    }
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_parity_on_random_tables(seed):
+    old, new, _ = _random_tables(seed)
+    df_old, df_new = old.add_prefix("old_"), new.add_prefix("new_")
+
+    assert _vectorized(df_old, df_new) == _reference(df_old, df_new)
+
+
+@pytest.mark.parametrize(
+    "old_value, new_value, changed",
+    [
+        (np.nan, None, False),
+        (None, pd.NaT, False),
+        (np.nan, pd.NaT, False),
+        ("a", " a ", False),
+        (1, 1.0, True),
+        (1, "1", False),
+        (1, " 1", False),
+        (1.0, "1.0", False),
+        (np.nan, "nan", False),
+        (None, "None", False),
+        (pd.NaT, "NaT", False),
+        (np.nan, "", True),
+        ("a", "A", True),
+    ],
+)
+def test_single_cell_cases(old_value, new_value, changed):
+    old = pd.DataFrame({KEY: ["k"], "v": [old_value]}, dtype=object).add_prefix("old_")
+    new = pd.DataFrame({KEY: ["k"], "v": [new_value]}, dtype=object).add_prefix("new_")
+
+    expected = _reference(old, new)["k"]
+    assert expected == (("changed", "v") if changed else ("not_changed", None))
+    assert _vectorized(old, new)["k"] == expected
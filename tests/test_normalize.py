@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.merge_compare import merge_and_compare
+from core.normalize import DEFAULT_RULE, canonical_changed, canonicalize_column, resolve_rule
+
+
+KEY = "Activity Master Number"
+
+
+def _changed(old, new, **rule_options) -> list:
+    rule = {**DEFAULT_RULE, **rule_options}
+    old_canon = canonicalize_column(pd.Series(old, dtype=object), rule)
+    new_canon = canonicalize_column(pd.Series(new, dtype=object), rule)
+    return canonical_changed(old_canon, new_canon, rule).tolist()
+
+
+def test_default_rule_is_strip_only():
+    assert _changed([" a ", "a", "A", None], ["a", "a  b", "a", np.nan]) == [False, True, True, False]
+
+
+def test_fold_whitespace():
+    old = ["a  b", "a\r\nb", "a\tb", "ab"]
+    new = ["a b", "a b", "a b", "a b"]
+    assert _changed(old, new) == [True, True, True, True]
+    assert _changed(old, new, fold_whitespace=True) == [False, False, False, True]
+
+
+def test_casefold():
+    assert _changed(["Straße", "ABC"], ["STRASSE", "abd"], casefold=True) == [False, True]
+    assert _changed(["ABC"], ["abc"]) == [True]
+
+
+@pytest.mark.parametrize(
+    "old, new, changed",
+    [
+        ("2020-01-02", "02.01.2020", False),   # ISO против «день первым»
+        ("2020-01-02", "01.02.2020", True),    # 1 февраля, а не 2 января
+        ("2020-02-01", "01/02/2020", False),
+        (pd.Timestamp("2020-01-02"), "02.01.2020", False),
+        ("2020-01-02 10:30:00", "02.01.2020 10:30", False),
+        ("not a date", "not a date", False),
+    ],
+)
+def test_dates_iso_and_dayfirst(old, new, changed):
+    assert _changed([old], [new], dates=True) == [changed]
+
+
+def test_numeric_tolerance():
+    old = ["1", "1.0", "10", "abc", None]
+    new = ["1.0", "1.04", "10.2", "abc", "0"]
+    assert _changed(old, new, numeric_tolerance=0) == [False, True, True, False, True]
+    assert _changed(old, new, numeric_tolerance=0.05) == [False, False, True, False, True]
+
+
+def test_column_rule_extends_star_rule():
+    rules = {"*": {"casefold": True}, "price": {"numeric_tolerance": 0.5}}
+    rule = resolve_rule(rules, "price")
+    assert rule["casefold"] and rule["numeric_tolerance"] == 0.5
+    assert resolve_rule(rules, "name")["numeric_tolerance"] is None
+
+
+def test_merge_and_compare_with_rules():
+    old = pd.DataFrame(
+        {KEY: ["k1", "k2", "k3"], "name": ["Foo  Bar", "x", "y"], "date": ["2020-01-02", "2020-01-02", None],
+         "price": ["10", "10", "10"]},
+        dtype=object,
+    ).add_prefix("old_")
+    new = pd.DataFrame(
+        {KEY: ["k1", "k2", "k3"], "name": ["foo bar", "x", "y"], "date": ["02.01.2020", "03.01.2020", None],
+         "price": ["10.01", "10", "11"]},
+        dtype=object,
+    ).add_prefix("new_")
+    rules = {
+        "name": {"fold_whitespace": True, "casefold": True},
+        "date": {"dates": True},
+        "price": {"numeric_tolerance": 0.1},
+    }
+
+    merged = merge_and_compare(old, new, rules=rules)
+    changed = [None if pd.isna(c) else c for c in merged["changed columns"].astype(object)]
+    result = dict(zip(merged[f"old_{KEY}"], zip(merged["status"].astype(object), changed)))
+    assert result["k1"] == ("not_changed", None)
+    assert result["k2"] == ("changed", "date")
+    assert result["k3"] == ("changed", "price")
+
+    # без правил те же строки различаются
+    plain = merge_and_compare(old, new)
+    assert (plain["status"].astype(object) == "changed").all()
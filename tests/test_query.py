@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from core.query import CHANGED_COL, STATUS_COL, TableQuery
+
+
+def _table() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            STATUS_COL: ["changed", "changed", "changed", "not_changed"],
+            CHANGED_COL: ["Цена, руб", "Цена, руб, Кол-во", "Кол-во", None],
+            "Цена, руб": [1, 2, 3, 4],
+            "Кол-во": [5, 6, 7, 8],
+        },
+        dtype=object,
+    )
+
+
+def test_changed_filter_handles_names_with_separator():
+    query = TableQuery(_table(), changed_columns=["Цена, руб", "Кол-во"])
+    assert sorted(query.values(CHANGED_COL)) == ["Кол-во", "Цена, руб"]
+    assert query.rows_with(CHANGED_COL, ["Цена, руб"]).tolist() == [0, 1]
+    assert query.rows_with(CHANGED_COL, ["Кол-во"]).tolist() == [1, 2]
+
+
+def test_changed_filter_without_known_columns_splits_on_separator():
+    query = TableQuery(_table())
+    assert "руб" in query.values(CHANGED_COL)
+
+
+def test_select_combines_status_and_changed():
+    query = TableQuery(_table(), changed_columns=["Цена, руб", "Кол-во"])
+    view = query.select(status="changed", changed_in=["Цена, руб"])
+    np.testing.assert_array_equal(view.positions, [0, 1])
+
+
+def test_mixed_type_column_can_be_filtered():
+    df = pd.DataFrame({"v": [1.5, pd.Timestamp("2024-01-01"), "x", None, 1.5]}, dtype=object)
+    query = TableQuery(df)
+    assert len(query.values("v")) == 3
+    assert query.rows_with("v", [1.5]).tolist() == [0, 4]
+    assert query.rows_with("v", [pd.Timestamp("2024-01-01"), "x"]).tolist() == [1, 2]
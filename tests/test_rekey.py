@@ -0,0 +1,49 @@
+import pandas as pd
+
+from core.merge_compare import merge_and_compare
+from core.rekey import find_rekeyed_pairs
+
+
+KEY = "Activity Master Number"
+
+
+def _merged(old_rows, new_rows) -> pd.DataFrame:
+    old = pd.DataFrame(old_rows, columns=[KEY, "Activity Name"], dtype=object).add_prefix("old_")
+    new = pd.DataFrame(new_rows, columns=[KEY, "Activity Name"], dtype=object).add_prefix("new_")
+    return merge_and_compare(old, new)
+
+
+def test_true_rekey_pair_is_found():
+    merged = _merged(
+        [("A-1", "Concrete pouring for foundation block B"), ("A-2", "Site fencing")],
+        [("B-7", "Concrete pouring for foundation block B"), ("A-2", "Site fencing")],
+    )
+    pairs = find_rekeyed_pairs(merged)
+    assert pairs[["old_key", "new_key"]].values.tolist() == [["A-1", "B-7"]]
+    assert pairs["score"].iloc[0] == 1.0
+
+
+def test_near_miss_below_threshold_is_not_paired():
+    merged = _merged(
+        [("A-1", "Concrete pouring for foundation block B")],
+        [("B-7", "Concrete removal and site cleanup")],
+    )
+    # общий токен есть (concrete) — кандидат находится, но сходство ниже порога
+    assert find_rekeyed_pairs(merged).empty
+    assert len(find_rekeyed_pairs(merged, min_score=0.0)) == 1
+
+
+def test_two_candidates_compete_for_one_target():
+    merged = _merged(
+        [("A-1", "Install steel roof trusses level 3"), ("A-2", "Install steel roof trusses level 2")],
+        [("B-1", "Install steel roof trusses level 3")],
+    )
+    pairs = find_rekeyed_pairs(merged)
+    # цель одна — достаётся лучшему кандидату, второй остаётся без пары
+    assert pairs[["old_key", "new_key"]].values.tolist() == [["A-1", "B-1"]]
+
+
+def test_no_text_columns_means_no_pairs():
+    old = pd.DataFrame({KEY: ["A-1"], "qty": ["1"]}, dtype=object).add_prefix("old_")
+    new = pd.DataFrame({KEY: ["B-1"], "qty": ["1"]}, dtype=object).add_prefix("new_")
+    assert find_rekeyed_pairs(merge_and_compare(old, new)).empty
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from core import row_index
+from core.editing import EditOverlay
+from core.merge_compare import OLD_KEY, merge_and_compare
+from core.row_index import RowIndex, assign_row_ids
+
+
+KEY = "Activity Master Number"
+
+
+def _merged(old_keys, new_keys, value="v") -> pd.DataFrame:
+    old = pd.DataFrame({KEY: old_keys, value: "x"}, dtype=object).add_prefix("old_")
+    new = pd.DataFrame({KEY: new_keys, value: "y"}, dtype=object).add_prefix("new_")
+    return merge_and_compare(old, new)
+
+
+def test_ids_follow_keys_not_positions():
+    first = _merged(["a", "b", "b", "c"], ["b", "d"])
+    second = _merged(["c", "b", "a", "b"], ["d", "b"])
+    ids_first = dict(zip(zip(first[OLD_KEY].astype(object), first["_merge"].astype(object)), assign_row_ids(first)))
+    ids_second = dict(zip(zip(second[OLD_KEY].astype(object), second["_merge"].astype(object)), assign_row_ids(second)))
+    # та же строка (a; c; строка только из новой таблицы d) — тот же id
+    for key in [("a", "left_only"), ("c", "left_only")]:
+        assert ids_first[key] == ids_second[key]
+    assert set(assign_row_ids(first)) == set(assign_row_ids(second))
+    assert (assign_row_ids(first) < 2**53).all()
+
+
+def test_hash_collision_falls_back_to_positions(monkeypatch):
+    merged = _merged(["a", "b", "c"], ["a"])
+    monkeypatch.setattr(
+        row_index.pd.util, "hash_array", lambda values, categorize=False: np.zeros(len(values), dtype=np.uint64)
+    )
+    np.testing.assert_array_equal(assign_row_ids(merged), np.arange(len(merged)))
+
+
+def test_rebase_keeps_edits_on_the_same_rows():
+    overlay = EditOverlay(_merged(["a", "b", "c"], ["a", "b", "c"]))
+    ids = dict(zip(overlay.base[OLD_KEY], overlay.index.ids))
+    overlay.delete_rows([ids["b"]])
+    overlay.edit_cells([{"orig_index": ids["c"], "column": "old_v", "new_value": "edited"}])
+
+    # новый результат сравнения: другой порядок строк и лишняя строка
+    rebased = overlay.rebase(_merged(["d", "c", "b", "a"], ["a", "b", "c"]))
+    new_ids = dict(zip(rebased.base[OLD_KEY], rebased.index.ids))
+    assert new_ids["c"] == ids["c"] and new_ids["b"] == ids["b"]
+
+    view = rebased.materialize()
+    assert ids["b"] not in view.index
+    assert view.loc[ids["c"], "old_v"] == "edited"
+    assert view.loc[new_ids["d"], "old_v"] == "x"
+
+
+def test_row_index_lookup():
+    index = RowIndex([7, 3, 11])
+    assert index.position(3) == 1 and index.position(5) is None
+    assert index.positions([11, 5]).tolist() == [2, -1]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from core.merge_compare import merge_and_compare
+from core.snapshots import (
+    arrow_to_dataframe,
+    dataframe_to_arrow,
+    has_snapshot,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+KEY = "Activity Master Number"
+
+
+def _types(values) -> list:
+    return [type(v).__name__ for v in values]
+
+
+def test_mixed_types_and_column_names_round_trip():
+    df = pd.DataFrame(
+        {
+            KEY: [101, "A-2", 103, None, 2**70],
+            2024: [1.5, np.nan, "x", pd.Timestamp("2024-01-02 03:04"), True],
+            "text": ["a", "b", None, "d", "e"],
+        },
+        dtype=object,
+    )
+    back = arrow_to_dataframe(dataframe_to_arrow(df))
+
+    assert list(back.columns) == [KEY, 2024, "text"]
+    assert _types(back[KEY]) == ["int", "str", "int", "float", "int"]
+    assert back[KEY].iloc[4] == 2**70
+    assert _types(back[2024]) == ["float", "float", "str", "Timestamp", "bool"]
+    assert back.equals(df)
+
+
+def test_snapshot_side_joins_like_a_fresh_file(tmp_path):
+    old = pd.DataFrame({KEY: [101, "A-2", 103], "v": ["a", "b", "c"]}, dtype=object)
+    save_snapshot(old, "p", "v1", root=str(tmp_path))
+    from_snapshot = load_snapshot("p", "v1", root=str(tmp_path))
+
+    merged = merge_and_compare(from_snapshot.add_prefix("old_"), old.add_prefix("new_"))
+    assert merged["status"].astype(object).tolist() == ["not_changed"] * 3
+
+
+def test_same_name_with_other_content_is_a_new_version(tmp_path):
+    root = str(tmp_path)
+    first = pd.DataFrame({KEY: [1]}, dtype=object)
+    first.attrs["ingest_key"] = "content-1"
+    save_snapshot(first, "p", "file.xlsx", root=root)
+    assert has_snapshot("p", "file.xlsx", root=root, source_key="content-1")
+
+    second = pd.DataFrame({KEY: [2]}, dtype=object)
+    second.attrs["ingest_key"] = "content-2"
+    assert not has_snapshot("p", "file.xlsx", root=root, source_key="content-2")
+    save_snapshot(second, "p", "file.xlsx", root=root, overwrite=True)
+    assert load_snapshot("p", "file.xlsx", root=root)[KEY].tolist() == [2]
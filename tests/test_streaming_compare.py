@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from core.merge_compare import NEW_KEY, OLD_KEY, merge_and_compare
+from core.streaming_compare import iter_chunks, streaming_compare
+
+
+KEY = "Activity Master Number"
+
+# ключи разных типов: join должен вести себя так же, как в памяти
+KEYS = [101, "101", "A-2", 103, 104.0, np.int64(105), "x", 106.5, None]
+
+
+def _tables(seed: int):
+    rng = np.random.default_rng(seed)
+    old_keys = [k for k in KEYS if rng.random() < 0.9]
+    new_keys = [k for k in KEYS if rng.random() < 0.9]
+    # тот же ключ с другой стороны может прийти другим типом (104 / 104.0)
+    new_keys = [104 if k == 104.0 and rng.random() < 0.5 else k for k in new_keys]
+    old = pd.DataFrame({KEY: old_keys, "v": rng.integers(0, 2, len(old_keys))}, dtype=object)
+    new = pd.DataFrame({KEY: new_keys, "v": rng.integers(0, 2, len(new_keys))}, dtype=object)
+    old = old.sample(frac=1, random_state=seed).reset_index(drop=True)
+    new = new.sample(frac=1, random_state=seed + 1).reset_index(drop=True)
+    return old.add_prefix("old_"), new.add_prefix("new_")
+
+
+def _rows(merged: pd.DataFrame) -> list:
+    """(ключ, статус, changed columns) строками — как их пишет streaming_compare."""
+    def text(v):
+        return None if pd.isna(v) else str(v)
+
+    return sorted(
+        (
+            (text(o), text(n), text(s), text(c))
+            for o, n, s, c in zip(
+                merged[OLD_KEY].astype(object),
+                merged[NEW_KEY].astype(object),
+                merged["status"].astype(object),
+                merged["changed columns"].astype(object),
+            )
+        ),
+        key=repr,
+    )
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("old_chunk, new_chunk", [(1, 4), (2, 3), (5, 1)])
+def test_streaming_matches_in_memory(tmp_path, seed, old_chunk, new_chunk):
+    df_old, df_new = _tables(seed)
+    expected = merge_and_compare(df_old, df_new)
+
+    out = str(tmp_path / "out.arrow")
+    summary = streaming_compare(
+        iter_chunks(df_old, old_chunk), iter_chunks(df_new, new_chunk), out, n_partitions=4
+    )
+    with pa.memory_map(out, "r") as source:
+        streamed = pa.ipc.open_file(source).read_all().to_pandas()
+
+    assert summary["status_counts"] == expected["status"].value_counts().to_dict()
+    assert _rows(streamed) == _rows(expected)
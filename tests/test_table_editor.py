@@ -0,0 +1,48 @@
+import pandas as pd
+
+from core import copy_stats
+from core.table_editor import _cell_changes, _grid_data, _grid_frame
+
+
+def _view() -> pd.DataFrame:
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}, dtype=object, index=[10, 20, 30])
+    view = df.copy()
+    view["_orig_index"] = view.index
+    view["_rid"] = view["_orig_index"].astype(str)
+    return view
+
+
+def test_first_edit_of_a_row_is_detected():
+    view = _view()
+    # ответ грида: строки как их собрал st_aggrid, без служебных флагов
+    answer = view.drop(columns="_orig_index").reset_index(drop=True)
+    answer.loc[1, "b"] = "new"
+    changes = _cell_changes(view, _grid_frame(view, answer))
+    assert changes == [{"orig_index": 20, "column": "b", "old_value": "y", "new_value": "new"}]
+
+
+def test_unchanged_rows_and_text_equal_values_are_ignored():
+    view = _view()
+    answer = view.drop(columns="_orig_index").reset_index(drop=True)
+    answer["a"] = answer["a"].astype(str)
+    assert _cell_changes(view, _grid_frame(view, answer)) == []
+
+
+class _Response(dict):
+    """Как st_aggrid.AgGridReturn: grid_response пуст, пока браузер не ответил."""
+
+    def __init__(self, data, answer):
+        super().__init__(data=data)
+        self.grid_response = answer
+
+
+def test_browser_answer_is_counted_as_a_copy():
+    view = _view()
+    payload = view.drop(columns="_orig_index").reset_index(drop=True)
+
+    copy_stats.reset()
+    _grid_data(view, _Response(payload, {}))
+    assert copy_stats.total() == 0
+
+    _grid_data(view, _Response(payload.copy(), {"nodes": []}))
+    assert list(copy_stats.report()["copy"]) == ["grid: ответ браузера"]
@@ -0,0 +1,99 @@
+import pandas as pd
+
+from core.editing import EditOverlay
+from core.journal import Journal, replay
+from core.undo_redo import (
+    BULK_PATCH_ITEMS,
+    add_checkpoint,
+    clear_history,
+    init_undo_redo,
+    redo,
+    undo,
+    undoable,
+)
+
+
+def _state(n_rows: int) -> dict:
+    df = pd.DataFrame({"a": range(n_rows), "b": [f"v{i}" for i in range(n_rows)]})
+    state = {"edit_overlay": EditOverlay(df), "log_actions": []}
+    init_undo_redo(state)
+    return state
+
+
+def test_small_action_makes_no_checkpoint():
+    state = _state(10)
+    overlay = state["edit_overlay"]
+    with undoable(state, label="удаление"):
+        overlay.delete_rows(list(overlay.index.ids[:2]))
+    assert state["checkpoints"].report()["checkpoints"] == 0
+    assert "patch" in state["undo_stack"][-1]
+
+
+def test_bulk_action_is_stored_as_compressed_record():
+    n_rows = BULK_PATCH_ITEMS + 10
+    state = _state(n_rows)
+    overlay = state["edit_overlay"]
+    with undoable(state, label="массовое удаление"):
+        overlay.delete_rows(list(overlay.index.ids))
+    report = state["checkpoints"].report()
+    assert report["records"] == 1 and report["full"] == 0
+    assert "checkpoint" in state["undo_stack"][-1]
+
+    undo(state)
+    assert len(overlay.materialize()) == n_rows
+    redo(state)
+    assert len(overlay.materialize()) == 0
+    # запись переезжает между стеками, а не копится в хранилище
+    assert state["checkpoints"].report()["records"] == 1
+
+    clear_history(state)
+    assert state["checkpoints"].report()["records"] == 0
+
+
+def test_evicted_bulk_record_clears_stack():
+    state = _state(BULK_PATCH_ITEMS + 10)
+    overlay = state["edit_overlay"]
+    with undoable(state):
+        overlay.drop_columns(["b"])
+    state["checkpoints"].discard(state["undo_stack"][-1]["checkpoint"])
+    assert undo(state) is None
+    assert state["undo_stack"] == []
+
+
+def test_explicit_save_version():
+    state = _state(10)
+    cid = add_checkpoint(state, label="версия")
+    assert state["checkpoints"].get(cid).shape[0] == 10
+
+
+def test_undo_keeps_log_records_written_outside_undo(tmp_path):
+    state = _state(10)
+    state["journal"], state["journal_key"] = Journal(str(tmp_path / "j.sqlite")), "k"
+    overlay = state["edit_overlay"]
+    logs = state["log_actions"]
+
+    with undoable(state):
+        overlay.delete_rows([overlay.index.ids[0]])
+        logs.append({"action": "delete_row"})
+    with undoable(state):
+        overlay.delete_rows([overlay.index.ids[1]])
+        logs.append({"action": "delete_row", "n": 2})
+
+    undo(state)
+    logs.append({"action": "undo_action"})
+    undo(state)
+    logs.append({"action": "undo_action"})
+    assert [r["action"] for r in logs] == ["undo_action", "undo_action"]
+
+    redo(state)
+    logs.append({"action": "redo_action"})
+    assert [r["action"] for r in logs] == ["undo_action", "undo_action", "delete_row", "redo_action"]
+    undo(state)
+    assert [r["action"] for r in logs] == ["undo_action", "undo_action", "redo_action"]
+    assert len(overlay.materialize()) == 10
+
+    # журнал восстанавливает тот же лог, включая записи вне undo
+    fresh, replayed = EditOverlay(overlay.base), []
+    replay(state["journal"].operations("k"), fresh, replayed)
+    assert replayed == logs and len(fresh.materialize()) == 10
+    state["journal"].close()